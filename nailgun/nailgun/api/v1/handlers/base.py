@@ -16,12 +16,14 @@
 
 from datetime import datetime
 from decorator import decorator
+import types
 
 from sqlalchemy import exc as sa_exc
 import web
 
 from nailgun.api.v1.validators.base import BasicValidator
 from nailgun.db import db
+from nailgun.db import versioned_identity as db_versioned_identity
 
 from nailgun.objects.serializers.base import BasicSerializer
 
@@ -59,9 +61,19 @@ def load_db_driver(handler):
     only HTTPError should be rised up from this function. All another
     possible errors should be handle.
     """
+    streaming = False
     try:
         # execute handler and commit changes if all is ok
         response = handler()
+        if isinstance(response, types.GeneratorType):
+            # first chunk executes the query, so errors raised by it
+            # are handled here rather than after headers are sent
+            first_chunk = next(response, '')
+            # the rest is serialized after handler returns, so
+            # transaction has to live until response is sent: commit
+            # would invalidate server side cursor of yield_per() query
+            streaming = True
+            return _remove_db_after(first_chunk, response)
         db.commit()
         return response
 
@@ -83,6 +95,20 @@ def load_db_driver(handler):
         db.rollback()
         raise
 
+    finally:
+        if not streaming:
+            db.remove()
+
+
+def _remove_db_after(first_chunk, response):
+    try:
+        yield first_chunk
+        for chunk in response:
+            yield chunk
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.remove()
 
@@ -102,6 +128,15 @@ def content_json(func, *args, **kwargs):
     return build_json_response(data)
 
 
+@decorator
+def versioned_identity(func, *args, **kwargs):
+    """Objects which rows weren't changed since they were loaded
+    aren't refreshed by queries of decorated handler method
+    """
+    with db_versioned_identity():
+        return func(*args, **kwargs)
+
+
 def build_json_response(data):
     web.header('Content-Type', 'application/json')
     if type(data) in (dict, list):
@@ -306,7 +341,7 @@ class CollectionHandler(BaseHandler):
         :http: * 200 (OK)
         """
         q = self.collection.eager(None, self.eager)
-        return self.collection.to_json(q)
+        return self.collection.to_json_stream(q)
 
     @content_json
     def POST(self):
@@ -34,40 +34,14 @@ from nailgun.api.v1.handlers.base import content_json
 from nailgun.openstack.common import jsonutils
 from nailgun.settings import settings
 from nailgun.task.manager import DumpTaskManager
+from nailgun.utils.logs import get_reader
+from nailgun.utils.logs import LogWatcher
 
 
 logger = logging.getLogger(__name__)
 
-
-def read_backwards(file, bufsize=4096):
-    buf = ""
-    try:
-        file.seek(-1, 1)
-    except IOError:
-        return
-    trailing_newline = False
-    if file.read(1) == "\n":
-        trailing_newline = True
-        file.seek(-1, 1)
-
-    while True:
-        newline_pos = buf.rfind("\n")
-        pos = file.tell()
-        if newline_pos != -1:
-            line = buf[newline_pos + 1:]
-            buf = buf[:newline_pos]
-            if pos or newline_pos or trailing_newline:
-                line += "\n"
-            yield line
-        elif pos:
-            toread = min(bufsize, pos)
-            file.seek(-toread, 1)
-            buf = file.read(toread) + buf
-            file.seek(-toread, 1)
-            if pos == toread:
-                buf = "\n" + buf
-        else:
-            return
+log_watcher = LogWatcher(settings.LOG_FOLLOW_INTERVAL,
+                         settings.LOG_FOLLOW_IDLE_TIMEOUT)
 
 
 class LogEntryCollectionHandler(BaseHandler):
@@ -122,6 +96,49 @@ class LogEntryCollectionHandler(BaseHandler):
                 raise self.http(400, "Invalid 'date_after' value")
         truncate_log = bool(user_data.get('truncate_log'))
 
+        log_config = self.get_log_config(user_data)
+        log_file = self.get_log_file(log_config, user_data)
+        allowed_levels = self.get_allowed_levels(log_config, user_data)
+
+        to_byte = None
+        try:
+            to_byte = int(user_data.get('to', 0))
+        except ValueError:
+            logger.debug("Invalid 'to' value: %d", to_byte)
+            raise self.http(400, "Invalid 'to' value")
+
+        log_file_size = os.stat(log_file).st_size
+        if to_byte >= log_file_size:
+            return jsonutils.dumps({
+                'entries': [],
+                'to': log_file_size,
+                'has_more': False,
+            })
+
+        try:
+            max_entries = int(user_data.get('max_entries',
+                                            settings.TRUNCATE_LOG_ENTRIES))
+        except ValueError:
+            logger.debug("Invalid 'max_entries' value: %d", max_entries)
+            raise self.http(400, "Invalid 'max_entries' value")
+
+        reader = get_reader(log_file, log_config, settings.LOG_INDEX_DIR)
+        entries, has_more = reader.read(
+            size=log_file_size,
+            to_byte=to_byte,
+            truncate=truncate_log,
+            max_entries=max_entries,
+            levels=allowed_levels,
+            date_after=date_after,
+            date_before=date_before
+        )
+        return {
+            'entries': self.format_entries(entries),
+            'to': log_file_size,
+            'has_more': has_more,
+        }
+
+    def get_log_config(self, user_data):
         if not user_data.get('source'):
             logger.debug("'source' must be specified")
             raise self.http(400, "'source' must be specified")
@@ -136,6 +153,15 @@ class LogEntryCollectionHandler(BaseHandler):
             raise self.http(404, "Log source not found")
         log_config = log_config[0]
 
+        try:
+            re.compile(log_config['regexp'])
+        except re.error as e:
+            logger.error('Invalid regular expression for file %r: %s',
+                         log_config['id'], e)
+            raise self.http(500, "Invalid regular expression in config")
+        return log_config
+
+    def get_log_file(self, log_config, user_data):
         # If it is 'remote' and not 'fake' log source then calculate log file
         # path by base dir, node IP and relative path to file.
         # Otherwise return absolute path.
@@ -172,102 +198,94 @@ class LogEntryCollectionHandler(BaseHandler):
             else:
                 logger.debug("Log file %r not found", log_file)
             raise self.http(404, "Log file not found")
+        return log_file
 
+    def get_allowed_levels(self, log_config, user_data):
+        """:returns: list of levels not lower than requested one
+            or None if level isn't specified
+        """
         level = user_data.get('level')
-        allowed_levels = log_config['levels']
-        if level is not None:
-            if not (level in log_config['levels']):
-                raise self.http(400, "Invalid level")
-            allowed_levels = [l for l in dropwhile(lambda l: l != level,
-                                                   log_config['levels'])]
-        try:
-            regexp = re.compile(log_config['regexp'])
-        except re.error as e:
-            logger.error('Invalid regular expression for file %r: %s',
-                         log_config['id'], e)
-            raise self.http(500, "Invalid regular expression in config")
+        if level is not None and not (level in log_config['levels']):
+            raise self.http(400, "Invalid level")
+        if not level:
+            return None
+        return [l for l in dropwhile(lambda l: l != level,
+                                     log_config['levels'])]
+
+    def format_entries(self, entries):
+        return [
+            [time.strftime(settings.UI_LOG_DATE_FORMAT, entry_date),
+             entry_level, entry_text]
+            for entry_date, entry_level, entry_text in entries
+        ]
+
+
+class LogEntryFollowHandler(LogEntryCollectionHandler):
+    """Log entry follow handler. Long-polls log file for entries
+    appended after given offset.
+    """
+
+    @content_json
+    def GET(self):
+        """Receives following parameters:
+
+        - *source* - source of logs
+        - *node* - node id (for getting node logs)
+        - *level* - log level (all levels showed by default)
+        - *to* - offset in log file returned by previous request
+        - *timeout* - max number of seconds to wait for new entries
+
+        :returns: Collection of log entries appended after *to* offset
+            and new offset.
+        :http:
+            * 200 (OK)
+            * 400 (invalid *source* value)
+            * 400 (invalid *node* value)
+            * 400 (invalid *level* value)
+            * 400 (invalid *to* value)
+            * 400 (invalid *timeout* value)
+            * 404 (log file not found)
+            * 404 (log files dir not found)
+            * 404 (node not found)
+            * 500 (node has no assigned ip)
+            * 500 (invalid regular expression in config)
+        """
+        user_data = web.input()
+        log_config = self.get_log_config(user_data)
+        log_file = self.get_log_file(log_config, user_data)
+        allowed_levels = self.get_allowed_levels(log_config, user_data)
 
-        entries = []
-        to_byte = None
         try:
             to_byte = int(user_data.get('to', 0))
         except ValueError:
-            logger.debug("Invalid 'to' value: %d", to_byte)
             raise self.http(400, "Invalid 'to' value")
-
-        log_file_size = os.stat(log_file).st_size
-        if to_byte >= log_file_size:
-            return jsonutils.dumps({
-                'entries': [],
-                'to': log_file_size,
-                'has_more': False,
-            })
-
         try:
-            max_entries = int(user_data.get('max_entries',
-                                            settings.TRUNCATE_LOG_ENTRIES))
+            timeout = float(user_data.get('timeout',
+                                          settings.LOG_FOLLOW_TIMEOUT))
         except ValueError:
-            logger.debug("Invalid 'max_entries' value: %d", max_entries)
-            raise self.http(400, "Invalid 'max_entries' value")
-
-        has_more = False
-        with open(log_file, 'r') as f:
-            f.seek(0, 2)
-            # we need to calculate current position manually instead of using
-            # tell() because read_backwards uses buffering
-            pos = f.tell()
-            multilinebuf = []
-            for line in read_backwards(f):
-                pos -= len(line)
-                if not truncate_log and pos < to_byte:
-                    has_more = pos > 0
-                    break
-                entry = line.rstrip('\n')
-                if not len(entry):
-                    continue
-                if 'skip_regexp' in log_config and \
-                        re.match(log_config['skip_regexp'], entry):
-                    continue
-                m = regexp.match(entry)
-                if m is None:
-                    if log_config.get('multiline'):
-                        #  Add next multiline part to last entry if it exist.
-                        multilinebuf.append(entry)
-                    else:
-                        logger.debug("Unable to parse log entry '%s' from %s",
-                                     entry, log_file)
-                    continue
-                entry_text = m.group('text')
-                if len(multilinebuf):
-                    multilinebuf.reverse()
-                    entry_text += '\n' + '\n'.join(multilinebuf)
-                    multilinebuf = []
-                entry_level = m.group('level').upper() or 'INFO'
-                if level and not (entry_level in allowed_levels):
-                    continue
-                try:
-                    entry_date = time.strptime(m.group('date'),
-                                               log_config['date_format'])
-                except ValueError:
-                    logger.debug("Unable to parse date from log entry."
-                                 " Date format: %r, date part of entry: %r",
-                                 log_config['date_format'],
-                                 m.group('date'))
-                    continue
-
-                entries.append([
-                    time.strftime(settings.UI_LOG_DATE_FORMAT, entry_date),
-                    entry_level,
-                    entry_text
-                ])
-                if truncate_log and len(entries) >= max_entries:
-                    has_more = True
-                    break
+            raise self.http(400, "Invalid 'timeout' value")
+        timeout = max(0, min(timeout, settings.LOG_FOLLOW_TIMEOUT))
+
+        tail = log_watcher.get_tail(log_file, log_config,
+                                    settings.LOG_INDEX_DIR)
+        if to_byte > tail.size:
+            # log file was rotated
+            to_byte = 0
+        result = tail.wait(to_byte, timeout)
+        if result is None:
+            # requested entries aren't buffered by shared reader anymore
+            log_file_size = tail.size
+            reader = get_reader(log_file, log_config, settings.LOG_INDEX_DIR)
+            entries, _ = reader.read(size=log_file_size, to_byte=to_byte)
+        else:
+            entries, log_file_size = result
 
+        if allowed_levels is not None:
+            entries = [e for e in entries if e[1] in allowed_levels]
         return {
-            'entries': entries,
+            'entries': self.format_entries(entries),
             'to': log_file_size,
-            'has_more': has_more,
+            'has_more': False,
         }
 
 
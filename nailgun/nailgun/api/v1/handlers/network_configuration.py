@@ -24,6 +24,7 @@ import web
 
 from nailgun.api.v1.handlers.base import BaseHandler
 from nailgun.api.v1.handlers.base import content_json
+from nailgun.api.v1.handlers.base import versioned_identity
 
 from nailgun.objects.serializers.network_configuration \
     import NeutronNetworkConfigurationSerializer
@@ -72,6 +73,7 @@ class NovaNetworkConfigurationHandler(ProviderHandler):
     provider = "nova_network"
 
     @content_json
+    @versioned_identity
     def GET(self, cluster_id):
         """:returns: JSONized network configuration for cluster.
         :http: * 200 (OK)
@@ -137,6 +139,7 @@ class NeutronNetworkConfigurationHandler(ProviderHandler):
     provider = "neutron"
 
     @content_json
+    @versioned_identity
     def GET(self, cluster_id):
         """:returns: JSONized network configuration for cluster.
         :http: * 200 (OK)
@@ -41,6 +41,8 @@ from nailgun.db.sqlalchemy.models import NodeNICInterface
 
 from nailgun.logger import logger
 from nailgun import notifier
+from nailgun.openstack.common import jsonutils
+from nailgun.utils.heartbeats import heartbeats
 
 
 class NodeHandler(SingleHandler):
@@ -77,7 +79,7 @@ class NodeCollectionHandler(CollectionHandler):
         elif cluster_id:
             nodes = nodes.filter_by(cluster_id=cluster_id)
 
-        return self.collection.to_json(nodes)
+        return self.collection.to_json_stream(nodes)
 
     @content_json
     def PUT(self):
@@ -120,16 +122,35 @@ class NodeAgentHandler(BaseHandler):
                * 400 (invalid nodes data specified)
                * 404 (node not found)
         """
+        data = web.data()
+        try:
+            node_id = heartbeats.register(jsonutils.loads(data))
+        except ValueError:
+            node_id = None
+        if node_id is not None:
+            return {'id': node_id, 'cached': True}
+
         nd = self.checked_data(
             self.validator.validate_collection_update,
-            data=u'[{0}]'.format(web.data()))[0]
+            data=u'[{0}]'.format(data))[0]
 
         node = self.collection.single.get_by_meta(nd)
 
         if not node:
             raise self.http(404, "Can't find node: {0}".format(nd))
+        heartbeats.remember_node(node.mac, node.id)
+
+        cached = 'agent_checksum' in nd and (
+            node.agent_checksum == nd['agent_checksum']
+        )
+        if cached and node.online:
+            # only timestamp of node would be updated, it's written
+            # later along with timestamps of other nodes
+            heartbeats.add(node.id, datetime.now())
+        else:
+            heartbeats.discard(node.id)
+            node.timestamp = datetime.now()
 
-        node.timestamp = datetime.now()
         if not node.online:
             node.online = True
             msg = u"Node '{0}' is back online".format(node.human_readable_name)
@@ -137,9 +158,7 @@ class NodeAgentHandler(BaseHandler):
             notifier.notify("discover", msg, node_id=node.id)
         db().flush()
 
-        if 'agent_checksum' in nd and (
-            node.agent_checksum == nd['agent_checksum']
-        ):
+        if cached:
             return {'id': node.id, 'cached': True}
 
         self.collection.single.update_by_agent(node, nd)
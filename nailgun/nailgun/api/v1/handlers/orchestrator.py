@@ -20,6 +20,7 @@ import web
 
 from nailgun.api.v1.handlers.base import BaseHandler
 from nailgun.api.v1.handlers.base import content_json
+from nailgun.api.v1.handlers.base import versioned_identity
 from nailgun.api.v1.validators.node import NodesFilterValidator
 
 from nailgun.logger import logger
@@ -68,6 +69,7 @@ class DefaultOrchestratorInfo(NodesFilterMixin, BaseHandler):
     _serializer = None
 
     @content_json
+    @versioned_identity
     def GET(self, cluster_id):
         """:returns: JSONized default data which will be passed to orchestrator
         :http: * 200 (OK)
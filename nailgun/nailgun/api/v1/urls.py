@@ -37,6 +37,7 @@ from nailgun.api.v1.handlers.disks import NodeDisksHandler
 from nailgun.api.v1.handlers.disks import NodeVolumesInformationHandler
 
 from nailgun.api.v1.handlers.logs import LogEntryCollectionHandler
+from nailgun.api.v1.handlers.logs import LogEntryFollowHandler
 from nailgun.api.v1.handlers.logs import LogPackageHandler
 from nailgun.api.v1.handlers.logs import LogSourceByNodeCollectionHandler
 from nailgun.api.v1.handlers.logs import LogSourceCollectionHandler
@@ -170,6 +171,8 @@ urls = (
 
     r'/logs/?$',
     LogEntryCollectionHandler,
+    r'/logs/follow/?$',
+    LogEntryFollowHandler,
     r'/logs/package/?$',
     LogPackageHandler,
     r'/logs/sources/?$',
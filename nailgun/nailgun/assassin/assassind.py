@@ -23,30 +23,43 @@ import time
 
 from datetime import datetime
 from datetime import timedelta
-from sqlalchemy.sql import not_
-
-from nailgun import notifier
+from sqlalchemy import and_
 
+from nailgun import consts
 from nailgun.db import db
 from nailgun.db.sqlalchemy.models import Node
 from nailgun.logger import logger
+from nailgun import objects
 from nailgun.settings import settings
 
 
 def update_nodes_status(timeout):
-    to_update = db().query(Node).filter(
-        not_(Node.status == 'provisioning')
-    ).filter(
-        datetime.now() > (Node.timestamp + timedelta(seconds=timeout))
-    ).filter_by(online=True)
-    for node_db in to_update:
-        notifier.notify(
-            "error",
-            u"Node '{0}' has gone away".format(
-                node_db.human_readable_name),
-            node_id=node_db.id
-        )
-    to_update.update({"online": False})
+    """Switches nodes without updates from agents to offline
+    and notifies about them, both by one statement
+    """
+    nodes = Node.__table__
+    # timestamp is compared with constant, so index on it can be used
+    gone_away = db().execute(
+        nodes.update().where(and_(
+            nodes.c.online.is_(True),
+            nodes.c.status != consts.NODE_STATUSES.provisioning,
+            nodes.c.timestamp < datetime.now() - timedelta(seconds=timeout)
+        )).values(
+            online=False
+        ).returning(nodes.c.id, nodes.c.name, nodes.c.mac)
+    ).fetchall()
+
+    if gone_away:
+        now = datetime.now()
+        objects.NotificationCollection.create_many([
+            {'topic': consts.NOTIFICATION_TOPICS.error,
+             'message': u"Node '{0}' has gone away".format(name or mac),
+             'node_id': node_id,
+             'datetime': now}
+            for node_id, name, mac in gone_away
+        ])
+        logger.info(u"%d nodes have gone away: %s", len(gone_away),
+                    u", ".join(name or mac for _, name, mac in gone_away))
     db().commit()
 
 
@@ -20,3 +20,4 @@ from nailgun.db.sqlalchemy import engine
 from nailgun.db.sqlalchemy import flush
 from nailgun.db.sqlalchemy import NoCacheQuery
 from nailgun.db.sqlalchemy import syncdb
+from nailgun.db.sqlalchemy import versioned_identity
@@ -23,6 +23,9 @@ ALLOWED_LOCKS_CHAINS = [
     ('tasks', 'clusters'),
     ('tasks', 'clusters', 'nodes'),
     ('tasks', 'nodes'),
+    ('clusters', 'network_groups'),
+    ('nodes', 'network_groups'),
+    ('tasks', 'network_groups'),
 ]
 
 
@@ -52,6 +52,14 @@ def upgrade_schema():
             server_default='true',
         )
     )
+    op.create_index('ix_nodes_timestamp', 'nodes', ['timestamp'])
+    op.add_column(
+        'notifications',
+        sa.Column('dedup_key', sa.String(length=40), nullable=True)
+    )
+    op.create_index(
+        'ix_notifications_dedup_key', 'notifications', ['dedup_key'],
+        unique=True)
 
 
 def upgrade_data():
@@ -63,6 +71,9 @@ def upgrade_data():
 
 
 def downgrade_schema():
+    op.drop_index('ix_notifications_dedup_key', 'notifications')
+    op.drop_column('notifications', 'dedup_key')
+    op.drop_index('ix_nodes_timestamp', 'nodes')
     op.drop_column('releases', 'is_deployable')
 
 
@@ -86,6 +86,21 @@ db = scoped_session(
 )
 
 
+@contextlib.contextmanager
+def versioned_identity(session=None):
+    """Within this block queries don't refresh objects of versioned
+    models (see VersionedMixin) which rows weren't changed since they
+    were loaded into the session.
+    """
+    session = session or db()
+    previous = session.info.get('versioned_identity', False)
+    session.info['versioned_identity'] = True
+    try:
+        yield session
+    finally:
+        session.info['versioned_identity'] = previous
+
+
 def syncdb():
     from nailgun.db.migration import do_upgrade_head
     do_upgrade_head()
@@ -18,9 +18,15 @@ from datetime import datetime
 
 from sqlalchemy import Column
 from sqlalchemy import DateTime
+from sqlalchemy import event
+from sqlalchemy import FetchedValue
 from sqlalchemy import Integer
+from sqlalchemy import String
 
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm.interfaces import EXT_CONTINUE
+from sqlalchemy.orm.interfaces import EXT_STOP
+from sqlalchemy.orm.properties import RelationshipProperty
 
 from nailgun.db.sqlalchemy.models.fields import JSON
 
@@ -30,6 +36,88 @@ from nailgun.openstack.common.db.sqlalchemy import models
 Base = declarative_base(cls=models.ModelBase)
 
 
+class VersionedMixin(object):
+    """Model which rows are versioned by PostgreSQL xmin system column,
+    it is changed by every update of row.
+
+    NoCacheQuery refreshes every loaded object from every query. If
+    session has 'versioned_identity' flag set in its info (see
+    nailgun.db.versioned_identity), objects which rows weren't changed
+    since they were loaded aren't refreshed: their attributes (including
+    JSON ones) aren't populated from row again and only loaded lazy
+    collections are expired to be reloaded on access.
+    """
+
+    xmin = Column(String, system=True,
+                  server_default=FetchedValue(),
+                  server_onupdate=FetchedValue())
+
+    @classmethod
+    def __declare_last__(cls):
+        # listener is set for every mapped class, events held for
+        # unmapped mixin don't support retval
+        event.listen(cls, 'populate_instance', skip_unchanged_instance,
+                     raw=True, retval=True)
+
+
+EAGER_STRATEGIES = ('joined', 'subquery', 'immediate', False)
+
+
+def _eager_loads_collections(context, mapper):
+    """Whether query populates collections of mapper from its rows,
+    such objects are always refreshed
+    """
+    key = ('versioned_identity', mapper)
+    if key in context.attributes:
+        return context.attributes[key]
+
+    eager = any(
+        prop.uselist and prop.lazy in EAGER_STRATEGIES
+        for prop in mapper.relationships
+    )
+    for loader_key, loader in context.attributes.items():
+        if eager:
+            break
+        if loader_key[0] != 'loader' or \
+                dict(getattr(loader, 'strategy', None) or ()).get('lazy') \
+                not in EAGER_STRATEGIES:
+            continue
+        eager = any(
+            isinstance(prop, RelationshipProperty) and prop.uselist and
+            mapper.isa(prop.parent)
+            for prop in loader_key[1]
+        )
+    context.attributes[key] = eager
+    return eager
+
+
+def skip_unchanged_instance(mapper, context, row, state, **flags):
+    if not context.session.info.get('versioned_identity') or \
+            not flags.get('isnew') or state.expired or state.modified:
+        return EXT_CONTINUE
+
+    dict_ = state.dict
+    version = dict_.get('xmin')
+    if version is None:
+        return EXT_CONTINUE
+    try:
+        if version != row[mapper.c.xmin]:
+            return EXT_CONTINUE
+    except KeyError:
+        # entity is loaded from aliased columns
+        return EXT_CONTINUE
+    if _eager_loads_collections(context, mapper):
+        return EXT_CONTINUE
+
+    loaded_collections = [
+        prop.key for prop in mapper.relationships
+        if prop.uselist and prop.key in dict_
+    ]
+    if loaded_collections:
+        context.session.expire(state.obj(), loaded_collections)
+    return EXT_STOP
+
+
 class CapacityLog(Base):
     __tablename__ = 'capacity_log'
 
@@ -29,6 +29,7 @@ from nailgun import consts
 
 from nailgun.db import db
 from nailgun.db.sqlalchemy.models.base import Base
+from nailgun.db.sqlalchemy.models.base import VersionedMixin
 from nailgun.db.sqlalchemy.models.fields import JSON
 from nailgun.db.sqlalchemy.models.node import Node
 
@@ -44,7 +45,7 @@ class ClusterChanges(Base):
     )
 
 
-class Cluster(Base):
+class Cluster(VersionedMixin, Base):
     __tablename__ = 'clusters'
     id = Column(Integer, primary_key=True)
     mode = Column(
@@ -129,7 +130,7 @@ class Cluster(Base):
         return True
 
 
-class Attributes(Base):
+class Attributes(VersionedMixin, Base):
     __tablename__ = 'attributes'
     id = Column(Integer, primary_key=True)
     cluster_id = Column(Integer, ForeignKey('clusters.id'))
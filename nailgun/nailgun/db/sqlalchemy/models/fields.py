@@ -14,11 +14,77 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import OrderedDict
+import hashlib
+import marshal
+import threading
+
 import sqlalchemy.types as types
 
 from nailgun.openstack.common import jsonutils
 
 
+class JSONCache(object):
+    """LRU cache of decoded JSON values keyed by digest of JSON text.
+
+    Values are kept marshalled: every load gets its own copy of value,
+    so callers can't mutate cached one, and unmarshalling is several
+    times cheaper than decoding JSON text again.
+
+    Cache is bounded by total size of marshalled values. Texts shorter
+    than min_length are cheap to decode and texts longer than
+    max_length (e.g. deployment info of big clusters) would evict
+    everything else, so both are decoded without caching.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, min_length=256,
+                 max_length=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.min_length = min_length
+        self.max_length = max_length
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.bytes = 0
+
+    def loads(self, text):
+        if not self.min_length <= len(text) <= self.max_length:
+            return jsonutils.loads(text)
+
+        if isinstance(text, unicode):
+            key = hashlib.md5(text.encode('utf-8')).digest()
+        else:
+            key = hashlib.md5(text).digest()
+        with self.lock:
+            data = self.cache.pop(key, None)
+            if data is not None:
+                self.cache[key] = data
+        if data is not None:
+            return marshal.loads(data)
+
+        value = jsonutils.loads(text)
+        data = marshal.dumps(value)
+        if len(data) > self.max_bytes:
+            return value
+        with self.lock:
+            old_data = self.cache.pop(key, None)
+            if old_data is not None:
+                self.bytes -= len(old_data)
+            self.cache[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self.bytes -= len(evicted)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.bytes = 0
+
+
+json_cache = JSONCache()
+
+
 class JSON(types.TypeDecorator):
 
     impl = types.Text
@@ -30,7 +96,7 @@ class JSON(types.TypeDecorator):
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            value = jsonutils.loads(value)
+            value = json_cache.loads(value)
         return value
 
 
@@ -22,6 +22,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy import String
 
 from nailgun.db.sqlalchemy.models.base import Base
+from nailgun.db.sqlalchemy.models.base import VersionedMixin
 from nailgun.db.sqlalchemy.models.fields import JSON
 
 
@@ -45,7 +46,7 @@ class IPAddrRange(Base):
     last = Column(String(25), nullable=False)
 
 
-class NetworkGroup(Base):
+class NetworkGroup(VersionedMixin, Base):
     __tablename__ = 'network_groups'
     NAMES = (
         # Node networks
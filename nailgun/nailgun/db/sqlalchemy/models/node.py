@@ -31,6 +31,7 @@ from sqlalchemy.orm import relationship, backref
 from nailgun import consts
 from nailgun.db import db
 from nailgun.db.sqlalchemy.models.base import Base
+from nailgun.db.sqlalchemy.models.base import VersionedMixin
 from nailgun.db.sqlalchemy.models.fields import JSON
 from nailgun.db.sqlalchemy.models.fields import LowercaseString
 from nailgun.db.sqlalchemy.models.network import NetworkBondAssignment
@@ -67,7 +68,7 @@ class Role(Base):
     name = Column(String(50), nullable=False)
 
 
-class Node(Base):
+class Node(VersionedMixin, Base):
     __tablename__ = 'nodes'
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36), nullable=False,
@@ -93,7 +94,7 @@ class Node(Base):
     changes = relationship("ClusterChanges", backref="node")
     error_type = Column(Enum(*consts.NODE_ERRORS, name='node_error_type'))
     error_msg = Column(String(255))
-    timestamp = Column(DateTime, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
     online = Column(Boolean, default=True)
     role_list = relationship(
         "Role",
@@ -280,7 +281,7 @@ class Node(Base):
         self.name = u'Untitled ({0})'.format(self.mac[-5:])
 
 
-class NodeAttributes(Base):
+class NodeAttributes(VersionedMixin, Base):
     __tablename__ = 'node_attributes'
     id = Column(Integer, primary_key=True)
     node_id = Column(Integer, ForeignKey('nodes.id'))
@@ -19,6 +19,7 @@ from sqlalchemy import DateTime
 from sqlalchemy import Enum
 from sqlalchemy import ForeignKey
 from sqlalchemy import Integer
+from sqlalchemy import String
 from sqlalchemy import Text
 
 from nailgun import consts
@@ -47,3 +48,6 @@ class Notification(Base):
         default=consts.NOTIFICATION_STATUSES.unread
     )
     datetime = Column(DateTime, nullable=False)
+    # hash of topic, node, task and message of notification,
+    # see objects.Notification.get_dedup_key
+    dedup_key = Column(String(40), unique=True, index=True)
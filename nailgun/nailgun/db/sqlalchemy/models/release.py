@@ -24,12 +24,14 @@ from sqlalchemy import Text
 from sqlalchemy import Unicode
 from sqlalchemy import UniqueConstraint
 
+from sqlalchemy.orm import deferred
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import not_
 
 from nailgun import consts
 from nailgun.db import db
 from nailgun.db.sqlalchemy.models.base import Base
+from nailgun.db.sqlalchemy.models.base import VersionedMixin
 from nailgun.db.sqlalchemy.models.fields import JSON
 from nailgun.db.sqlalchemy.models.node import Role
 
@@ -43,7 +45,7 @@ class ReleaseOrchestratorData(Base):
     puppet_modules_source = Column(Text, nullable=False)
 
 
-class Release(Base):
+class Release(VersionedMixin, Base):
     __tablename__ = 'releases'
     __table_args__ = (
         UniqueConstraint('name', 'version'),
@@ -63,9 +65,11 @@ class Release(Base):
         nullable=False,
         default='not_available'
     )
-    networks_metadata = Column(JSON, default=[])
-    attributes_metadata = Column(JSON, default={})
-    volumes_metadata = Column(JSON, default={})
+    # big metadata which isn't used by releases list is loaded
+    # and decoded only when it is accessed
+    networks_metadata = deferred(Column(JSON, default=[]))
+    attributes_metadata = deferred(Column(JSON, default={}))
+    volumes_metadata = deferred(Column(JSON, default={}))
     modes_metadata = Column(JSON, default={})
     roles_metadata = Column(JSON, default={})
     wizard_metadata = Column(JSON, default={})
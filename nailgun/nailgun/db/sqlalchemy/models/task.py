@@ -23,15 +23,17 @@ from sqlalchemy import ForeignKey
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Text
+from sqlalchemy.orm import deferred
 from sqlalchemy.orm import relationship, backref
 
 from nailgun import consts
 from nailgun.db import db
 from nailgun.db.sqlalchemy.models.base import Base
+from nailgun.db.sqlalchemy.models.base import VersionedMixin
 from nailgun.db.sqlalchemy.models.fields import JSON
 
 
-class Task(Base):
+class Task(VersionedMixin, Base):
     __tablename__ = 'tasks'
     id = Column(Integer, primary_key=True)
     cluster_id = Column(Integer, ForeignKey('clusters.id'))
@@ -49,7 +51,8 @@ class Task(Base):
         default='running'
     )
     progress = Column(Integer, default=0)
-    cache = Column(JSON, default={})
+    # deployment info cache is loaded and decoded only when accessed
+    cache = deferred(Column(JSON, default={}))
     result = Column(JSON, default={})
     parent_id = Column(Integer, ForeignKey('tasks.id'))
     subtasks = relationship(
@@ -15,7 +15,9 @@
 #    under the License.
 
 import logging
+import re
 import sys
+import time
 
 from logging.handlers import WatchedFileHandler
 from StringIO import StringIO
@@ -49,7 +51,7 @@ def make_api_logger():
     logger = logging.getLogger("nailgun-api")
     log_file = WatchedFileHandler(settings.API_LOG)
     log_file.setFormatter(formatter)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(settings.API_LOG_LEVEL)
     logger.addHandler(log_file)
     return logger
 
@@ -69,33 +71,71 @@ class WriteLogger(logging.Logger, object):
 
 
 class HTTPLoggerMiddleware(object):
+    """Logs requests and responses of the API. Request bodies are read
+    and logged (truncated to API_LOG_BODY_MAX_LENGTH) only if API logger
+    is at debug level. Every response is logged at info level with its
+    latency and size, which are also set as 'route', 'method', 'status',
+    'latency' and 'size' attributes of the log record.
+    """
+
+    # ids in paths are replaced to get routes of requests
+    ID_IN_PATH = re.compile(r'/\d+(?=/|$)')
+
     def __init__(self, application):
         self.application = application
         self.api_logger = make_api_logger()
 
+        # Circular import dependency problem
+        from nailgun.settings import settings
+        self.body_max_length = int(settings.API_LOG_BODY_MAX_LENGTH)
+
     def __call__(self, env, start_response):
         env['wsgi.errors'] = WriteLogger(self.api_logger.error)
-        self.__logging_request(env)
-
-        def start_response_with_logging(status, headers, *args):
-            self.__logging_response(env, status)
-            return start_response(status, headers, *args)
+        started_at = time.time()
+        if self.api_logger.isEnabledFor(logging.DEBUG):
+            self.__logging_request(env)
 
-        return self.application(env, start_response_with_logging)
+        response = {}
 
-    def __logging_response(self, env, response_code):
-        response_info = "Response code '%s' for %s %s from %s:%s" % (
-            response_code,
-            env['REQUEST_METHOD'],
-            env['REQUEST_URI'],
-            self.__get_remote_ip(env),
-            env['REMOTE_PORT'],
-        )
+        def start_response_with_status(status, headers, *args):
+            response['status'] = status
+            return start_response(status, headers, *args)
 
-        if response_code == SERVER_ERROR_MSG:
-            self.api_logger.error(response_info)
-        else:
-            self.api_logger.debug(response_info)
+        result = self.application(env, start_response_with_status)
+        return self.__logging_response(env, response, result, started_at)
+
+    def __logging_response(self, env, response, result, started_at):
+        size = 0
+        try:
+            for chunk in result:
+                size += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+            status = response.get('status')
+            latency = time.time() - started_at
+            level = logging.ERROR if status == SERVER_ERROR_MSG \
+                else logging.INFO
+            self.api_logger.log(
+                level,
+                "Response code '%s' for %s %s from %s:%s in %.3fs, "
+                "%d bytes",
+                status,
+                env['REQUEST_METHOD'],
+                env['REQUEST_URI'],
+                self.__get_remote_ip(env),
+                env['REMOTE_PORT'],
+                latency,
+                size,
+                extra={
+                    'route': self.ID_IN_PATH.sub(
+                        '/{id}', env.get('PATH_INFO', '/')),
+                    'method': env['REQUEST_METHOD'],
+                    'status': status,
+                    'latency': latency,
+                    'size': size})
 
     def __logging_request(self, env):
         content_length = env.get('CONTENT_LENGTH', 0)
@@ -108,7 +148,12 @@ class HTTPLoggerMiddleware(object):
             body = env['wsgi.input'].read(length)
             env['wsgi.input'] = StringIO(body)
 
-        request_info = "Request %s %s from %s:%s %s" % (
+        if len(body) > self.body_max_length:
+            body = '{0}... ({1} bytes)'.format(
+                body[:self.body_max_length], len(body))
+
+        self.api_logger.debug(
+            "Request %s %s from %s:%s %s",
             env['REQUEST_METHOD'],
             env['REQUEST_URI'],
             self.__get_remote_ip(env),
@@ -116,8 +161,6 @@ class HTTPLoggerMiddleware(object):
             body
         )
 
-        self.api_logger.debug(request_info)
-
     def __get_remote_ip(self, env):
         if 'HTTP_X_REAL_IP' in env:
             return env['HTTP_X_REAL_IP']
@@ -14,10 +14,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import defaultdict
 import re
+import threading
+import time
 
 from nailgun.api.v1 import urls as api_urls
 from nailgun.fake_keystone import validate_token
+from nailgun.logger import logger
 from nailgun.settings import settings
 
 from keystoneclient.middleware import auth_token
@@ -34,18 +38,34 @@ def public_urls():
     return urls
 
 
+def compile_public_routes(routes):
+    """Compiles public routes to one regexp per method, which matches
+    any of public routes allowed for the method
+
+    :param routes: dict of route regexp to list of methods
+    :returns: dict of method to compiled regexp
+    """
+    patterns = defaultdict(list)
+    try:
+        for route_tpl, methods in routes.iteritems():
+            re.compile(route_tpl)
+            for method in methods:
+                patterns[method].append('(?:{0})'.format(route_tpl))
+    except re.error as e:
+        msg = 'Cannot compile public API routes: {0}'.format(e)
+        raise Exception(msg)
+
+    return dict(
+        (method, re.compile('|'.join(method_patterns)))
+        for method, method_patterns in patterns.iteritems())
+
+
 class SkipAuthMixin(object):
     """Mixin which skips verification of authentication tokens for public
     routes in the API.
     """
     def __init__(self, app):
-        self.public_api_routes = {}
-        try:
-            for route_tpl, methods in public_urls().iteritems():
-                self.public_api_routes[re.compile(route_tpl)] = methods
-        except re.error as e:
-            msg = 'Cannot compile public API routes: {0}'.format(e)
-            raise Exception(msg)
+        self.public_api_routes = compile_public_routes(public_urls())
 
         super(SkipAuthMixin, self).__init__(app, settings.AUTH)
 
@@ -56,18 +76,46 @@ class SkipAuthMixin(object):
         # The information whether the API call is being performed against the
         # public API may be useful. Saving it to the
         # WSGI environment is reasonable thereby.
-        env['is_public_api'] = False
-        for pattern, methods in self.public_api_routes.iteritems():
-            if re.match(pattern, path):
-                if method in methods:
-                    env['is_public_api'] = True
-                    break
+        pattern = self.public_api_routes.get(method)
+        env['is_public_api'] = bool(pattern and pattern.match(path))
 
         if env['is_public_api']:
             return self.app(env, start_response)
         return super(SkipAuthMixin, self).__call__(env, start_response)
 
 
+class TokensCacheStats(object):
+    """Hits and misses of lookups in cache of validated tokens of
+    auth_token middleware. Hit rate is logged every stats_interval
+    seconds.
+    """
+
+    def __init__(self, stats_interval=60):
+        self.stats_interval = stats_interval
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stats_logged_at = time.time()
+
+    def register(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if time.time() - self.stats_logged_at >= self.stats_interval:
+                self.stats_logged_at = time.time()
+                logger.info("Keystone tokens cache: %s", self.to_dict())
+
+    def to_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0
+        }
+
+
 class FakeAuthProtocol(object):
     """Auth protocol for fake mode.
     """
@@ -83,9 +131,26 @@ class FakeAuthProtocol(object):
 
 
 class NailgunKeystoneAuthMiddleware(SkipAuthMixin, auth_token.AuthProtocol):
-    """Auth middleware for keystone.
+    """Auth middleware for keystone. Validated tokens are cached by
+    auth_token for token_cache_time seconds, hit rate of the cache is
+    collected in tokens_cache_stats.
     """
-    pass
+    def __init__(self, app):
+        self.tokens_cache_stats = TokensCacheStats(
+            int(settings.AUTH_TOKENS_CACHE_STATS_INTERVAL))
+
+        super(NailgunKeystoneAuthMiddleware, self).__init__(app)
+
+    def _cache_get(self, token_id):
+        try:
+            cached = super(NailgunKeystoneAuthMiddleware, self).\
+                _cache_get(token_id)
+        except auth_token.InvalidUserToken:
+            # token is cached as invalid
+            self.tokens_cache_stats.register(True)
+            raise
+        self.tokens_cache_stats.register(cached is not None)
+        return cached
 
 
 class NailgunFakeKeystoneAuthMiddleware(SkipAuthMixin, FakeAuthProtocol):
@@ -14,17 +14,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from bisect import bisect_left
+from collections import defaultdict
+from collections import OrderedDict
 from itertools import chain
-from itertools import ifilter
-from itertools import imap
 from itertools import islice
 
 from netaddr import IPAddress
 from netaddr import IPNetwork
 from netaddr import IPRange
 
+from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.orm import joinedload
+from sqlalchemy.sql import cast
 from sqlalchemy.sql import not_
+from sqlalchemy.sql import or_
 
 from nailgun import objects
 
@@ -148,18 +152,29 @@ class NetworkManager(object):
         If node already has IP address from this network,
         it remains unchanged. If one of the nodes is the
         node from other cluster, this func will fail.
+        Nodes and their IPs are fetched in bulk and all missing
+        IP addresses are inserted at once within single commit.
 
         :param node_ids: List of nodes IDs in database.
         :type  node_ids: list
         :param network_name: Network name
         :type  network_name: str
         :returns: None
-        :raises: Exception, errors.AssignIPError
+        :raises: Exception, errors.AssignIPError, errors.OutOfIPs,
+            errors.ObjectNotFound
         """
-        cluster_id = db().query(Node).get(nodes_ids[0]).cluster_id
+        # repeated ids would get several IPs since all of them
+        # are inserted at once
+        nodes_ids = list(OrderedDict.fromkeys(nodes_ids))
+        nodes = db().query(Node).filter(Node.id.in_(nodes_ids)).all()
+        nodes_by_id = dict((n.id, n) for n in nodes)
+        missing_ids = [n_id for n_id in nodes_ids if n_id not in nodes_by_id]
+        if missing_ids:
+            raise errors.ObjectNotFound(
+                u"Nodes with ids {0} not found".format(missing_ids))
+        cluster_id = nodes_by_id[nodes_ids[0]].cluster_id
         for node_id in nodes_ids:
-            node = db().query(Node).get(node_id)
-            if node.cluster_id != cluster_id:
+            if nodes_by_id[node_id].cluster_id != cluster_id:
                 raise Exception(
                     u"Node id='{0}' doesn't belong to cluster_id='{1}'".format(
                         node_id,
@@ -177,53 +192,51 @@ class NetworkManager(object):
                 (network_name, cluster_id)
             )
 
+        nodes_ips = defaultdict(list)
+        for node_id, ip_addr in db().query(IPAddr.node, IPAddr.ip_addr).\
+                filter(IPAddr.node.in_(nodes_ids)).\
+                filter_by(network=network.id):
+            nodes_ips[node_id].append(ip_addr)
+
+        nodes_to_assign = []
         for node_id in nodes_ids:
             if network_name == 'public' and \
-                    not objects.Node.should_have_public(
-                    objects.Node.get_by_mac_or_uid(node_uid=node_id)):
+                    not objects.Node.should_have_public(nodes_by_id[node_id]):
                 continue
 
-            node_ips = imap(
-                lambda i: i.ip_addr,
-                cls._get_ips_except_admin(
-                    node_id=node_id,
-                    network_id=network.id
-                )
-            )
             # check if any of node_ips in required ranges
-
-            ip_already_assigned = False
-
-            for ip in node_ips:
-                if cls.check_ip_belongs_to_net(ip, network):
-                    logger.info(
-                        u"Node id='{0}' already has an IP address "
-                        "inside '{1}' network.".format(
-                            node_id,
-                            network.name
-                        )
+            if any(cls.check_ip_belongs_to_net(ip, network)
+                   for ip in nodes_ips[node_id]):
+                logger.info(
+                    u"Node id='{0}' already has an IP address "
+                    "inside '{1}' network.".format(
+                        node_id,
+                        network.name
                     )
-                    ip_already_assigned = True
-                    break
-
-            if ip_already_assigned:
+                )
                 continue
 
-            # IP address has not been assigned, let's do it
-            logger.info(
-                "Assigning IP for node '{0}' in network '{1}'".format(
-                    node_id,
-                    network_name
-                )
-            )
-            free_ip = cls.get_free_ips(network.id)[0]
-            ip_db = IPAddr(
-                network=network.id,
-                node=node_id,
-                ip_addr=free_ip
+            nodes_to_assign.append(node_id)
+
+        if not nodes_to_assign:
+            return
+
+        # IP addresses have not been assigned, let's do it
+        logger.info(
+            "Assigning IPs for nodes {0} in network '{1}'".format(
+                nodes_to_assign,
+                network_name
             )
-            db().add(ip_db)
-            db().commit()
+        )
+        free_ips = cls.get_free_ips(network.id, num=len(nodes_to_assign))
+        db().execute(
+            IPAddr.__table__.insert(),
+            [
+                {'network': network.id, 'node': node_id, 'ip_addr': ip}
+                for node_id, ip in zip(nodes_to_assign, free_ips)
+            ]
+        )
+        db().commit()
 
     @classmethod
     def assign_vip(cls, cluster_id, network_name):
@@ -314,32 +327,75 @@ class NetworkManager(object):
                 return True
         return False
 
+    @classmethod
+    def _get_used_ips(cls, network_group):
+        """Returns sorted list of integer representations of IP addresses
+        which are already taken inside ranges of given Network Group.
+        Used addresses are fetched with a single query which selects
+        only addresses inside the ranges (address is taken if it's
+        assigned in any network). Gateway is considered to be taken too.
+
+        :param network_group: NetworkGroup object.
+        :type  network_group: NetworkGroup
+        :returns: sorted list of ints
+        """
+        if not network_group.ip_ranges:
+            return []
+
+        ip_addr = cast(IPAddr.ip_addr, INET)
+        taken = [
+            addr for (addr,) in db().query(IPAddr.ip_addr).filter(or_(*[
+                ip_addr.between(cast(ir.first, INET), cast(ir.last, INET))
+                for ir in network_group.ip_ranges
+            ]))
+        ]
+
+        used = set(int(IPAddress(addr)) for addr in taken)
+        if network_group.gateway and \
+                cls.check_ip_belongs_to_net(network_group.gateway,
+                                            network_group):
+            used.add(int(IPAddress(network_group.gateway)))
+        return sorted(used)
+
     @classmethod
     def _iter_free_ips(cls, network_group):
         """Represents iterator over free IP addresses
-        in all ranges for given Network Group
+        in all ranges for given Network Group. Taken addresses
+        are skipped by bisecting sorted list of used ones, so
+        getting N addresses costs O(N + ranges) after the
+        used addresses are loaded.
         """
-        for ip_addr in ifilter(
-            lambda ip: db().query(IPAddr).filter_by(
-                ip_addr=str(ip)
-            ).first() is None and not str(ip) == network_group.gateway,
-            chain(*[
-                IPRange(ir.first, ir.last)
-                for ir in network_group.ip_ranges
-            ])
-        ):
-            yield ip_addr
+        used = cls._get_used_ips(network_group)
+        for ir in network_group.ip_ranges:
+            first = IPAddress(ir.first)
+            version = first.version
+            current, last = int(first), int(IPAddress(ir.last))
+            idx = bisect_left(used, current)
+            while current <= last:
+                if idx < len(used) and used[idx] == current:
+                    idx += 1
+                    current += 1
+                    continue
+                upper = last
+                if idx < len(used):
+                    upper = min(last, used[idx] - 1)
+                for ip_int in xrange(current, upper + 1):
+                    yield IPAddress(ip_int, version)
+                current = upper + 1
 
     @classmethod
     def get_free_ips(cls, network_group_id, num=1):
-        """Returns list of free IP addresses for given Network Group
+        """Returns list of free IP addresses for given Network Group.
+        Network Group row is locked for update, so concurrent
+        transactions allocating addresses from the same
+        Network Group are serialized and can't get the same address.
         """
-        ng = db().query(NetworkGroup).get(network_group_id)
-        free_ips = []
-        for ip in cls._iter_free_ips(ng):
-            free_ips.append(str(ip))
-            if len(free_ips) == num:
-                break
+        ng = db().query(NetworkGroup).filter_by(
+            id=network_group_id
+        ).with_lockmode('update').first()
+        free_ips = [
+            str(ip) for ip in islice(cls._iter_free_ips(ng), num)
+        ]
         if len(free_ips) < num:
             raise errors.OutOfIPs()
         return free_ips
@@ -493,10 +549,10 @@ class NetworkManager(object):
                 for ng in nic.assigned_networks_list]
 
     @classmethod
-    def _get_admin_node_network(cls, node):
-        net = cls.get_admin_network_group()
+    def _get_admin_node_network(cls, node, admin_net=None):
+        net = admin_net or cls.get_admin_network_group()
         net_cidr = IPNetwork(net.cidr)
-        ip_addr = cls.get_admin_ip_for_node(node)
+        ip_addr = cls.get_admin_ip_for_node(node, net)
         return {
             'name': net.name,
             'vlan': net.vlan_start,
@@ -508,9 +564,19 @@ class NetworkManager(object):
         }
 
     @classmethod
-    def get_node_network_by_netname(cls, node, netname):
-        networks = cls.get_node_networks(node)
-        networks.append(cls._get_admin_node_network(node))
+    def get_node_network_by_netname(cls, node, netname,
+                                    networks=None, admin_net=None):
+        """Returns network of node with given name
+
+        :param networks: already computed networks of node,
+            see get_node_networks
+        :param admin_net: admin network group
+        """
+        admin_net = admin_net or cls.get_admin_network_group()
+        if netname == admin_net.name:
+            return cls._get_admin_node_network(node, admin_net)
+        if networks is None:
+            networks = cls.get_node_networks(node)
         return filter(
             lambda n: n['name'] == netname, networks)[0]
 
@@ -526,13 +592,13 @@ class NetworkManager(object):
 
     @classmethod
     def _get_network_data_with_ip(cls, node_db, interface, net, ip):
-        prefix = str(IPNetwork(net.cidr).prefixlen)
+        net_cidr = IPNetwork(net.cidr)
         return {
             'name': net.name,
             'vlan': cls.get_network_vlan(net, node_db.cluster),
-            'ip': ip.ip_addr + '/' + prefix,
-            'netmask': str(IPNetwork(net.cidr).netmask),
-            'brd': str(IPNetwork(net.cidr).broadcast),
+            'ip': ip.ip_addr + '/' + str(net_cidr.prefixlen),
+            'netmask': str(net_cidr.netmask),
+            'brd': str(net_cidr.broadcast),
             'gateway': net.gateway,
             'dev': interface.name}
 
@@ -630,32 +696,63 @@ class NetworkManager(object):
     @classmethod
     def update_interfaces_info(cls, node):
         """Update interfaces in case of correct interfaces
-        in meta field in node's model
+        in meta field in node's model. Reported interfaces are compared
+        with the loaded ones, and only changed attributes are set.
+
+        :returns: True if interfaces were changed
         """
         try:
             cls.check_interfaces_correctness(node)
         except errors.InvalidInterfacesInfo as e:
             logger.debug("Cannot update interfaces: %s", e.message)
-            return
-
-        for interface in node.meta["interfaces"]:
-            # try to get interface by mac address
-            interface_db = next((
-                n for n in node.nic_interfaces if n.mac == interface['mac']),
-                None)
-
-            # try to get interface instance by interface name. this protects
-            # us from loosing nodes when some NICs was replaced with a new one
-            interface_db = interface_db or next((
-                n for n in node.nic_interfaces if n.name == interface['name']),
-                None)
-
-            if interface_db:
-                cls.__update_existing_interface(interface_db.id, interface)
-            else:
-                cls.__add_new_interface(node, interface)
+            return False
+
+        reported = [cls.__get_interface_attributes(attrs)
+                    for attrs in node.meta["interfaces"]]
+        mac = lambda attrs: attrs['mac']
+        current = [
+            dict((name, getattr(interface, name)) for name in reported[0])
+            for interface in node.nic_interfaces]
+        if sorted(reported, key=mac) == sorted(current, key=mac):
+            return False
+
+        # interfaces are looked up by mac address and then by name,
+        # this protects us from loosing nodes when some NICs were
+        # replaced with new ones. Interface is matched only once,
+        # since its mac and name can be taken by another reported one
+        by_mac = {}
+        by_name = {}
+        for interface in node.nic_interfaces:
+            by_mac.setdefault(interface.mac, interface)
+            by_name.setdefault(interface.name, interface)
+
+        matched = set()
+        for attrs in reported:
+            interface = by_mac.get(attrs['mac'])
+            if interface is None or interface in matched:
+                interface = by_name.get(attrs['name'])
+            if interface is None or interface in matched:
+                interface = NodeNICInterface(node_id=node.id)
+                node.nic_interfaces.append(interface)
+                db().add(interface)
+            matched.add(interface)
+            for name, value in attrs.iteritems():
+                if getattr(interface, name) != value:
+                    setattr(interface, name, value)
+
+        macs = set(map(mac, reported))
+        interfaces_to_delete = [
+            n for n in node.nic_interfaces if n.mac not in macs]
+        if interfaces_to_delete:
+            logger.info("Interfaces %s removed from node %s",
+                        ' '.join(i.mac for i in interfaces_to_delete),
+                        node.name or node.mac)
+            for interface in interfaces_to_delete:
+                node.nic_interfaces.remove(interface)
+                db().delete(interface)
 
-        cls.__delete_not_found_interfaces(node, node.meta["interfaces"])
+        db().flush()
+        return True
 
     @classmethod
     def check_interfaces_correctness(cls, node):
@@ -709,66 +806,31 @@ class NetworkManager(object):
         return False
 
     @classmethod
-    def __add_new_interface(cls, node, interface_attrs):
-        interface = NodeNICInterface()
-        interface.node_id = node.id
-        cls.__set_interface_attributes(interface, interface_attrs)
-        db().add(interface)
-        db().flush()
-
-    @classmethod
-    def __update_existing_interface(cls, interface_id, interface_attrs):
-        interface = db().query(NodeNICInterface).get(interface_id)
-        cls.__set_interface_attributes(interface, interface_attrs)
-        db().add(interface)
-        db().flush()
-
-    @classmethod
-    def __set_interface_attributes(cls, interface, interface_attrs):
-        interface.name = interface_attrs['name']
-        interface.mac = interface_attrs['mac']
-
-        interface.current_speed = interface_attrs.get('current_speed')
-        interface.max_speed = interface_attrs.get('max_speed')
-        interface.ip_addr = interface_attrs.get('ip')
-        interface.netmask = interface_attrs.get('netmask')
-        interface.state = interface_attrs.get('state')
-
-    @classmethod
-    def __delete_not_found_interfaces(cls, node, interfaces):
-        interfaces_mac_addresses = map(
-            lambda interface: interface['mac'], interfaces)
-
-        interfaces_to_delete = db().query(NodeNICInterface).filter(
-            NodeNICInterface.node_id == node.id
-        ).filter(
-            not_(NodeNICInterface.mac.in_(interfaces_mac_addresses))
-        ).all()
-
-        if interfaces_to_delete:
-            mac_addresses = ' '.join(
-                map(lambda i: i.mac, interfaces_to_delete))
-
-            node_name = node.name or node.mac
-            logger.info("Interfaces %s removed from node %s" % (
-                mac_addresses, node_name))
-
-            map(db().delete, interfaces_to_delete)
-        db().flush()
+    def __get_interface_attributes(cls, interface_attrs):
+        """Returns NodeNICInterface attributes of interface reported
+        by agent
+        """
+        return {
+            'name': interface_attrs['name'],
+            'mac': interface_attrs['mac'].lower(),
+            'current_speed': interface_attrs.get('current_speed'),
+            'max_speed': interface_attrs.get('max_speed'),
+            'ip_addr': interface_attrs.get('ip'),
+            'netmask': interface_attrs.get('netmask'),
+            'state': interface_attrs.get('state'),
+        }
 
     @classmethod
-    def get_admin_ip_for_node(cls, node):
+    def get_admin_ip_for_node(cls, node, admin_net=None):
         """Returns first admin IP address for node
+
+        :param admin_net: admin network group
         """
-        admin_net_id = cls.get_admin_network_group_id()
-        admin_ip = db().query(IPAddr).order_by(
-            IPAddr.id
-        ).filter_by(
-            node=node.id
-        ).filter_by(
-            network=admin_net_id
-        ).first()
-        return admin_ip.ip_addr
+        admin_net_id = (admin_net or cls.get_admin_network_group()).id
+        admin_ips = sorted(
+            (ip for ip in node.ip_addrs if ip.network == admin_net_id),
+            key=lambda ip: ip.id)
+        return admin_ips[0].ip_addr
 
     @classmethod
     def get_admin_ips_for_interfaces(cls, node):
@@ -903,24 +965,16 @@ class NetworkManager(object):
         return range1.first <= range2.last and range2.first <= range1.last
 
     @classmethod
-    def get_node_interface_by_netname(cls, node_id, netname):
-        iface = db().query(NodeNICInterface).join(
-            (NetworkGroup, NodeNICInterface.assigned_networks_list)
-        ).filter(
-            NetworkGroup.name == netname
-        ).filter(
-            NodeNICInterface.node_id == node_id
-        ).first()
-        if iface:
-            return iface
+    def get_node_interface_by_netname(cls, node, netname):
+        """Returns NIC or bond of node which has assigned network
+        with given name or None
 
-        return db().query(NodeBondInterface).join(
-            (NetworkGroup, NodeBondInterface.assigned_networks_list)
-        ).filter(
-            NetworkGroup.name == netname
-        ).filter(
-            NodeBondInterface.node_id == node_id
-        ).first()
+        :param node: node or its id
+        """
+        try:
+            return cls._get_interface_by_network_name(node, netname)
+        except errors.CanNotFindInterface:
+            return None
 
     @classmethod
     def _set_ip_ranges(cls, network_group_id, ip_ranges):
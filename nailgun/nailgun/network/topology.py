@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import defaultdict
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from nailgun import objects
+
+from nailgun.db import db
+from nailgun.db.sqlalchemy.models import IPAddr
+from nailgun.db.sqlalchemy.models import IPAddrRange
+from nailgun.db.sqlalchemy.models import NetworkBondAssignment
+from nailgun.db.sqlalchemy.models import NetworkGroup
+from nailgun.db.sqlalchemy.models import NetworkNICAssignment
+from nailgun.db.sqlalchemy.models import Node
+from nailgun.db.sqlalchemy.models import NodeAttributes
+from nailgun.db.sqlalchemy.models import NodeBondInterface
+from nailgun.db.sqlalchemy.models import NodeNICInterface
+from nailgun.db.sqlalchemy.models import NodeRoles
+from nailgun.db.sqlalchemy.models import PendingNodeRoles
+from nailgun.db.sqlalchemy.models import Role
+
+
+def _set_loaded(instance, key, value):
+    """Sets value of relationship loaded in bulk, unless
+    the relationship is already loaded
+    """
+    if key not in instance.__dict__:
+        set_committed_value(instance, key, value)
+
+
+class NetworkTopology(object):
+    """Snapshot of cluster network topology for one serialization run.
+
+    Network groups, IP ranges, IP addresses, NICs and bonds, as well as
+    roles and attributes of all cluster nodes are loaded with a few bulk
+    queries and put into relationships of the loaded instances. Networks
+    of every node are computed only once, so returned data should be
+    treated as read-only. Nodes mustn't be queried again while topology
+    is used, since every query refreshes them and drops loaded
+    relationships.
+
+    Networks are computed by methods of network manager of the cluster,
+    which only use relationships of nodes loaded here.
+
+    Data of given nodes only is loaded if nodes are passed, which is
+    used when single node is serialized.
+    """
+
+    def __init__(self, cluster, nodes=None):
+        self.cluster = cluster
+        self.net_manager = objects.Cluster.get_network_manager(cluster)
+        self.admin_net = self.net_manager.get_admin_network_group()
+        self.network_groups = db().query(NetworkGroup).filter_by(
+            cluster_id=cluster.id
+        ).order_by(NetworkGroup.id).all()
+        if nodes is None:
+            self.nodes = db().query(Node).filter_by(
+                cluster_id=cluster.id
+            ).order_by(Node.id).all()
+            self._nodes_clause = Node.cluster_id == cluster.id
+        else:
+            self.nodes = sorted(nodes, key=lambda node: node.id)
+            self._nodes_clause = Node.id.in_(
+                [node.id for node in self.nodes])
+
+        self._networks = {}
+
+        self._load_ip_ranges()
+        self._load_interfaces()
+        self._load_ip_addrs()
+        self._load_roles()
+        self._load_attributes()
+
+    def _load_ip_ranges(self):
+        ip_ranges = defaultdict(list)
+        query = db().query(IPAddrRange).join(
+            NetworkGroup, IPAddrRange.network_group_id == NetworkGroup.id
+        ).filter(
+            NetworkGroup.cluster_id == self.cluster.id
+        ).order_by(IPAddrRange.id)
+        for ip_range in query:
+            ip_ranges[ip_range.network_group_id].append(ip_range)
+
+        for ng in self.network_groups:
+            _set_loaded(ng, 'ip_ranges', ip_ranges[ng.id])
+
+    def _load_assigned_networks(self, assignment, iface_column, iface_model):
+        networks = defaultdict(list)
+        query = db().query(iface_column, NetworkGroup).join(
+            NetworkGroup, assignment.network_id == NetworkGroup.id
+        ).join(
+            iface_model, iface_column == iface_model.id
+        ).join(
+            Node, iface_model.node_id == Node.id
+        ).filter(
+            self._nodes_clause
+        ).order_by(NetworkGroup.id)
+        for iface_id, ng in query:
+            networks[iface_id].append(ng)
+        return networks
+
+    def _load_interfaces(self):
+        nic_networks = self._load_assigned_networks(
+            NetworkNICAssignment, NetworkNICAssignment.interface_id,
+            NodeNICInterface)
+        bond_networks = self._load_assigned_networks(
+            NetworkBondAssignment, NetworkBondAssignment.bond_id,
+            NodeBondInterface)
+
+        nics = defaultdict(list)
+        slaves = defaultdict(list)
+        query = db().query(NodeNICInterface).join(
+            Node, NodeNICInterface.node_id == Node.id
+        ).filter(
+            self._nodes_clause
+        ).order_by(NodeNICInterface.name)
+        for nic in query:
+            _set_loaded(nic, 'assigned_networks_list', nic_networks[nic.id])
+            nics[nic.node_id].append(nic)
+            if nic.parent_id is not None:
+                slaves[nic.parent_id].append(nic)
+
+        bonds = defaultdict(list)
+        query = db().query(NodeBondInterface).join(
+            Node, NodeBondInterface.node_id == Node.id
+        ).filter(
+            self._nodes_clause
+        ).order_by(NodeBondInterface.name)
+        for bond in query:
+            _set_loaded(bond, 'assigned_networks_list', bond_networks[bond.id])
+            _set_loaded(bond, 'slaves', slaves[bond.id])
+            bonds[bond.node_id].append(bond)
+
+        for node in self.nodes:
+            _set_loaded(node, 'nic_interfaces', nics[node.id])
+            _set_loaded(node, 'bond_interfaces', bonds[node.id])
+
+    def _load_ip_addrs(self):
+        ip_addrs = defaultdict(list)
+        query = db().query(IPAddr).join(
+            Node, IPAddr.node == Node.id
+        ).filter(
+            self._nodes_clause
+        ).order_by(IPAddr.id)
+        for ip in query:
+            ip_addrs[ip.node].append(ip)
+
+        for node in self.nodes:
+            _set_loaded(node, 'ip_addrs', ip_addrs[node.id])
+
+    def _load_roles(self):
+        for assoc, key in ((NodeRoles, 'role_list'),
+                           (PendingNodeRoles, 'pending_role_list')):
+            roles = defaultdict(list)
+            query = db().query(assoc.node, Role).join(
+                Role, assoc.role == Role.id
+            ).join(
+                Node, assoc.node == Node.id
+            ).filter(
+                self._nodes_clause
+            ).order_by(assoc.id)
+            for node_id, role in query:
+                roles[node_id].append(role)
+
+            for node in self.nodes:
+                _set_loaded(node, key, roles[node.id])
+
+    def _load_attributes(self):
+        query = db().query(NodeAttributes).join(
+            Node, NodeAttributes.node_id == Node.id
+        ).filter(
+            self._nodes_clause
+        )
+        attributes = dict((attrs.node_id, attrs) for attrs in query)
+
+        for node in self.nodes:
+            _set_loaded(node, 'attributes', attributes.get(node.id))
+
+    def get_node_networks(self, node):
+        """NetworkManager.get_node_networks computed once per node
+        """
+        if node.id not in self._networks:
+            self._networks[node.id] = self.net_manager.get_node_networks(
+                node)
+        return list(self._networks[node.id])
+
+    def get_node_network_by_netname(self, node, netname):
+        return self.net_manager.get_node_network_by_netname(
+            node, netname, networks=self.get_node_networks(node),
+            admin_net=self.admin_net)
+
+    def get_node_interface_by_netname(self, node, netname):
+        return self.net_manager.get_node_interface_by_netname(node, netname)
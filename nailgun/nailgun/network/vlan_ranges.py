@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compact representation of vlans lists used by network verification:
+sorted list of vlan ids and [start, end] ranges (both ends included),
+e.g. [0, [1000, 2000], 2100]. Explicit list of ids is valid compact
+representation too, so all functions accept both of them.
+"""
+
+
+def _ranges(vlans):
+    """:returns: sorted list of merged [start, end] ranges
+    """
+    ranges = sorted(
+        list(vlan) if isinstance(vlan, list) else [vlan, vlan]
+        for vlan in vlans)
+
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _compact(ranges):
+    return [start if start == end else [start, end]
+            for start, end in ranges]
+
+
+def compress(vlans):
+    """Returns compact representation of vlans
+    """
+    return _compact(_ranges(vlans))
+
+
+def expand(vlans):
+    """Returns sorted explicit list of vlan ids
+    """
+    ids = set()
+    for vlan in vlans:
+        if isinstance(vlan, list):
+            ids.update(xrange(vlan[0], vlan[1] + 1))
+        else:
+            ids.add(vlan)
+    return sorted(ids)
+
+
+def difference(vlans, other):
+    """Returns sorted list of vlan ids which are not in other
+    """
+    ids = set(expand(vlans))
+    try:
+        # explicit list of ids (as orchestrator returns it) is
+        # subtracted without conversion
+        ids.difference_update(other)
+    except TypeError:
+        # other contains [start, end] ranges, which are unhashable
+        ids.difference_update(expand(other))
+    return sorted(ids)
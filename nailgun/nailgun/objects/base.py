@@ -451,6 +451,37 @@ class NailgunCollection(object):
             )
         )
 
+    @classmethod
+    def to_json_stream(cls, iterable=None, fields=None, yield_per=100):
+        """Serialize iterable to JSON by chunks, so the whole collection
+        is never kept in memory as list of dicts or single string.
+        In case if iterable=None serializes all object instances
+
+        :param iterable: iterable (SQLAlchemy query)
+        :param fields: exact fields to serialize
+        :param yield_per: SQLAlchemy's yield_per() clause and number
+            of objects serialized in single chunk
+        :returns: generator of JSON string chunks
+        """
+        use_iterable = iterable or cls.all(yield_per=yield_per)
+        # query is executed on the first next() call, so callers have to
+        # get the first chunk before response headers are sent to handle
+        # query errors
+        prefix = '['
+        batch = []
+        for obj in use_iterable:
+            batch.append(
+                jsonutils.dumps(cls.single.to_dict(obj, fields=fields))
+            )
+            if len(batch) >= yield_per:
+                yield prefix + ', '.join(batch)
+                prefix = ', '
+                batch = []
+        if batch or prefix == '[':
+            yield prefix + ', '.join(batch) + ']'
+        else:
+            yield ']'
+
     @classmethod
     def create(cls, data):
         """Create object instance with specified parameters in DB
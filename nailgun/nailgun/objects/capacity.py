@@ -32,3 +32,17 @@ class CapacityLog(NailgunObject):
         return db().query(cls.model).order_by(
             cls.model.datetime.desc()
         ).first()
+
+    @classmethod
+    def create_snapshot(cls, report):
+        """Creates capacity log with report, if it differs from report
+        of the latest capacity log. So logs are only kept for changes
+        of capacity, and history of capacity is read without duplicates.
+
+        :param report: capacity report
+        :returns: created or the latest capacity log
+        """
+        latest = cls.get_latest()
+        if latest and latest.report == report:
+            return latest
+        return cls.create({'report': report})
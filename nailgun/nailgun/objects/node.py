@@ -248,9 +248,8 @@ class Node(NailgunObject):
             network_manager = Cluster.get_network_manager(instance.cluster)
 
             network_manager.check_interfaces_correctness(instance)
-            network_manager.update_interfaces_info(instance)
-
-            db().refresh(instance)
+            if network_manager.update_interfaces_info(instance):
+                db().refresh(instance)
         except errors.InvalidInterfacesInfo as exc:
             logger.warning(
                 "Failed to update interfaces for node '%s' - invalid info "
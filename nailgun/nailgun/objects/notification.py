@@ -15,8 +15,12 @@
 #    under the License.
 
 from datetime import datetime
+import hashlib
+
+from sqlalchemy.exc import IntegrityError
 
 from nailgun import consts
+from nailgun.db import db
 from nailgun.db.sqlalchemy import models
 
 from nailgun.errors import errors
@@ -25,8 +29,6 @@ from nailgun.logger import logger
 from nailgun.objects import NailgunCollection
 from nailgun.objects import NailgunObject
 
-from nailgun.objects import Task
-
 from nailgun.objects.serializers.notification import NotificationSerializer
 
 
@@ -60,19 +62,29 @@ class Notification(NailgunObject):
     }
 
     @classmethod
-    def create(cls, data):
-        """Creates and returns a notification instance.
+    def get_dedup_key(cls, topic, node_id, task_uuid, message):
+        """Returns key by which duplicated notifications are skipped.
+        Only notifications about nodes in tasks are deduplicated.
 
-        :param data: a dict with notification data
-        :returns: a notification instance in case of notification
-            doesn't exist; otherwise - None
+        :returns: sha1 of topic, node, task and message or None
+        """
+        if not (node_id and task_uuid):
+            return None
+        return hashlib.sha1(u"{0}/{1}/{2}/{3}".format(
+            topic, node_id, task_uuid, message
+        ).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def prepare_data(cls, data):
+        """Checks notification data, sets its datetime and dedup key
+
+        :param data: a dict with notification data, task_uuid key
+            is replaced with dedup_key
+        :returns: notification data
         """
-        topic = data.get("topic")
-        node_id = data.get("node_id")
         task_uuid = data.pop("task_uuid", None)
-        message = data.get("message")
 
-        if topic == 'discover' and node_id is None:
+        if data.get("topic") == 'discover' and data.get("node_id") is None:
             raise errors.CannotFindNodeIDForDiscovering(
                 "No node id in discover notification"
             )
@@ -80,29 +92,45 @@ class Notification(NailgunObject):
         if "datetime" not in data:
             data["datetime"] = datetime.now()
 
-        exist = None
-        if task_uuid:
-            task = Task.get_by_uuid(task_uuid)
-            if task and node_id:
-                exist = NotificationCollection.count(
-                    NotificationCollection.filter_by(
-                        None,
-                        node_id=node_id,
-                        message=message,
-                        task_id=task.id
-                    )
-                )
+        data["dedup_key"] = cls.get_dedup_key(
+            data.get("topic"),
+            data.get("node_id"),
+            task_uuid,
+            data.get("message")
+        )
+        return data
+
+    @classmethod
+    def create(cls, data):
+        """Creates and returns a notification instance.
 
-        if not exist:
+        :param data: a dict with notification data
+        :returns: a notification instance in case of notification
+            doesn't exist; otherwise - None
+        """
+        data = cls.prepare_data(data)
+
+        dedup_key = data["dedup_key"]
+        if dedup_key:
+            if db().query(cls.model.id).filter_by(
+                    dedup_key=dedup_key).first():
+                return None
+            try:
+                with db().begin_nested():
+                    notification = super(Notification, cls).create(data)
+            except IntegrityError:
+                # the same notification was created concurrently
+                return None
+        else:
             notification = super(Notification, cls).create(data)
-            logger.info(
-                u"Notification: topic: {0} message: {1}".format(
-                    data.get("topic"),
-                    data.get("message")
-                )
+
+        logger.info(
+            u"Notification: topic: {0} message: {1}".format(
+                data.get("topic"),
+                data.get("message")
             )
-            return notification
-        return None
+        )
+        return notification
 
     @classmethod
     def to_dict(cls, instance, fields=None):
@@ -115,3 +143,64 @@ class Notification(NailgunObject):
 class NotificationCollection(NailgunCollection):
 
     single = Notification
+
+    @classmethod
+    def create_many(cls, notifications):
+        """Creates notifications by one insert. Notifications with dedup
+        keys of existing notifications or of preceding notifications
+        in the list are skipped.
+
+        :param notifications: list of dicts with topic, message,
+            cluster_id, node_id, task_uuid and datetime of notifications
+        :returns: number of created notifications
+        """
+        rows = []
+        dedup_keys = set()
+        for data in notifications:
+            data = cls.single.prepare_data(dict(data))
+            if data["dedup_key"] in dedup_keys:
+                continue
+            if data["dedup_key"]:
+                dedup_keys.add(data["dedup_key"])
+            rows.append({
+                "topic": data["topic"],
+                "message": data.get("message"),
+                "cluster_id": data.get("cluster_id"),
+                "node_id": data.get("node_id"),
+                "datetime": data["datetime"],
+                "dedup_key": data["dedup_key"]
+            })
+
+        model = cls.single.model
+        if dedup_keys:
+            existing = set(key for key, in db().query(
+                model.dedup_key).filter(model.dedup_key.in_(dedup_keys)))
+            rows = [row for row in rows if row["dedup_key"] not in existing]
+        if not rows:
+            return 0
+
+        try:
+            with db().begin_nested():
+                db().execute(model.__table__.insert(), rows)
+        except IntegrityError:
+            # some of notifications were created concurrently,
+            # so the rest are inserted one by one
+            rows = filter(cls._insert_if_not_exists, rows)
+
+        for row in rows:
+            logger.info(
+                u"Notification: topic: {0} message: {1}".format(
+                    row["topic"],
+                    row["message"]
+                )
+            )
+        return len(rows)
+
+    @classmethod
+    def _insert_if_not_exists(cls, row):
+        try:
+            with db().begin_nested():
+                db().execute(cls.single.model.__table__.insert(), row)
+        except IntegrityError:
+            return False
+        return True
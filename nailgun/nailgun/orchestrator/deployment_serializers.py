@@ -16,6 +16,7 @@
 
 """Deployment serializers for orchestrator"""
 
+from collections import defaultdict
 from copy import deepcopy
 from itertools import groupby
 
@@ -35,16 +36,25 @@ from nailgun.db.sqlalchemy.models import NetworkGroup
 from nailgun.db.sqlalchemy.models import Node
 from nailgun.errors import errors
 from nailgun.logger import logger
+from nailgun.network.topology import NetworkTopology
 from nailgun.objects import Cluster
 from nailgun.orchestrator import priority_serializers as ps
 from nailgun.settings import settings
 from nailgun.utils import dict_merge
+from nailgun.utils import dict_merge_shared
 from nailgun.utils import extract_env_version
 from nailgun.volumes import manager as volume_manager
 
 
-def get_nodes_not_for_deletion(cluster):
-    """All clusters nodes except nodes for deletion."""
+def get_nodes_not_for_deletion(cluster, topology=None):
+    """All clusters nodes except nodes for deletion.
+
+    Nodes of topology are returned if it's given, since querying nodes
+    again refreshes them and drops relationships loaded by topology.
+    """
+    if topology is not None:
+        return [node for node in topology.nodes
+                if not node.pending_deletion]
     return db().query(Node).filter(
         and_(Node.cluster == cluster,
              False == Node.pending_deletion)).order_by(Node.id)
@@ -53,18 +63,23 @@ def get_nodes_not_for_deletion(cluster):
 class NetworkDeploymentSerializer(object):
 
     @classmethod
-    def get_common_attrs(cls, cluster, attrs):
+    def get_common_attrs(cls, cluster, attrs, topology=None):
         """Cluster network attributes."""
-        common = cls.network_provider_cluster_attrs(cluster)
-        common.update(cls.network_ranges(cluster))
+        topology = topology or NetworkTopology(cluster)
+        common = cls.network_provider_cluster_attrs(cluster, topology)
+        common.update(cls.network_ranges(topology))
         common.update({'master_ip': settings.MASTER_IP})
         common['nodes'] = deepcopy(attrs['nodes'])
 
+        nodes_by_uid = defaultdict(list)
+        for n in common['nodes']:
+            nodes_by_uid[n['uid']].append(n)
+
         # Addresses
-        for node in get_nodes_not_for_deletion(cluster):
-            netw_data = node.network_data
+        for node in get_nodes_not_for_deletion(cluster, topology):
+            netw_data = topology.get_node_networks(node)
             addresses = {}
-            for net in node.cluster.network_groups:
+            for net in topology.network_groups:
                 if net.name == 'public' and \
                         not objects.Node.should_have_public(node):
                     continue
@@ -74,31 +89,30 @@ class NetworkDeploymentSerializer(object):
                         net.name,
                         net.meta.get('render_addr_mask')))
 
-            [n.update(addresses) for n in common['nodes']
-             if n['uid'] == str(node.uid)]
+            [n.update(addresses) for n in nodes_by_uid[str(node.uid)]]
         return common
 
     @classmethod
-    def get_node_attrs(cls, node):
+    def get_node_attrs(cls, node, topology=None):
         """Node network attributes."""
-        return cls.network_provider_node_attrs(node.cluster, node)
+        topology = topology or NetworkTopology(node.cluster, [node])
+        return cls.network_provider_node_attrs(node.cluster, node, topology)
 
     @classmethod
-    def network_provider_cluster_attrs(cls, cluster):
+    def network_provider_cluster_attrs(cls, cluster, topology):
         raise NotImplementedError()
 
     @classmethod
-    def network_provider_node_attrs(cls, cluster, node):
+    def network_provider_node_attrs(cls, cluster, node, topology):
         raise NotImplementedError()
 
     @classmethod
-    def network_ranges(cls, cluster):
+    def network_ranges(cls, topology):
         """Returns ranges for network groups
         except range for public network
         """
-        ng_db = db().query(NetworkGroup).filter_by(cluster_id=cluster.id).all()
         attrs = {}
-        for net in ng_db:
+        for net in topology.network_groups:
             net_name = net.name + '_network_range'
             if net.meta.get("render_type") == 'ip_ranges':
                 attrs[net_name] = cls.get_ip_ranges_first_last(net)
@@ -133,24 +147,11 @@ class NetworkDeploymentSerializer(object):
             render_name + '_netmask': str(IPNetwork(net).netmask)
         }
 
-    @staticmethod
-    def get_admin_ip_w_prefix(node):
-        """Getting admin ip and assign prefix from admin network."""
-        network_manager = objects.Node.get_network_manager(node)
-        admin_ip = network_manager.get_admin_ip_for_node(node)
-        admin_ip = IPNetwork(admin_ip)
-
-        # Assign prefix from admin network
-        admin_net = IPNetwork(network_manager.get_admin_network_group().cidr)
-        admin_ip.prefixlen = admin_net.prefixlen
-
-        return str(admin_ip)
-
 
 class NovaNetworkDeploymentSerializer(NetworkDeploymentSerializer):
 
     @classmethod
-    def network_provider_cluster_attrs(cls, cluster):
+    def network_provider_cluster_attrs(cls, cluster, topology):
         return {
             'novanetwork_parameters': cls.novanetwork_attrs(cluster),
             'dns_nameservers': cluster.network_config.dns_nameservers,
@@ -162,9 +163,9 @@ class NovaNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         }
 
     @classmethod
-    def network_provider_node_attrs(cls, cluster, node):
-        network_data = node.network_data
-        interfaces = cls.configure_interfaces(node)
+    def network_provider_node_attrs(cls, cluster, node, topology):
+        network_data = topology.get_node_networks(node)
+        interfaces = cls.configure_interfaces(node, topology)
         cls.__add_hw_interfaces(interfaces, node.meta['interfaces'])
 
         # Interfaces assignment
@@ -207,17 +208,18 @@ class NovaNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         """
         net_manager = objects.Node.get_network_manager(node)
         fixed_interface = net_manager._get_interface_by_network_name(
-            node.id, 'fixed')
+            node, 'fixed')
 
         attrs = {'fixed_interface': fixed_interface.name,
                  'vlan_interface': fixed_interface.name}
         return attrs
 
     @classmethod
-    def configure_interfaces(cls, node):
+    def configure_interfaces(cls, node, topology=None):
         """Configure interfaces
         """
-        network_data = node.network_data
+        topology = topology or NetworkTopology(node.cluster, [node])
+        network_data = topology.get_node_networks(node)
         interfaces = {}
 
         for network in network_data:
@@ -231,7 +233,8 @@ class NovaNetworkDeploymentSerializer(NetworkDeploymentSerializer):
                 interface['ipaddr'].append(network.get('ip'))
 
             if network_name == 'admin':
-                admin_ip_addr = cls.get_admin_ip_w_prefix(node)
+                admin_ip_addr = topology.get_node_network_by_netname(
+                    node, topology.admin_net.name)['ip']
                 interface['ipaddr'].append(admin_ip_addr)
             elif network_name == 'public' and network.get('gateway'):
                 interface['gateway'] = network['gateway']
@@ -282,7 +285,7 @@ class NovaNetworkDeploymentSerializer(NetworkDeploymentSerializer):
 class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
 
     @classmethod
-    def network_provider_cluster_attrs(cls, cluster):
+    def network_provider_cluster_attrs(cls, cluster, topology):
         """Cluster attributes."""
         attrs = {'quantum': True,
                  'quantum_settings': cls.neutron_attrs(cluster)}
@@ -290,8 +293,7 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         if cluster.mode == 'multinode':
             for node in cluster.nodes:
                 if cls._node_has_role_by_name(node, 'controller'):
-                    net_manager = objects.Node.get_network_manager(node)
-                    mgmt_cidr = net_manager.get_node_network_by_netname(
+                    mgmt_cidr = topology.get_node_network_by_netname(
                         node,
                         'management'
                     )['ip']
@@ -301,31 +303,27 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         return attrs
 
     @classmethod
-    def network_provider_node_attrs(cls, cluster, node):
+    def network_provider_node_attrs(cls, cluster, node, topology):
         """Serialize node, then it will be
         merged with common attributes
         """
-        node_attrs = {'network_scheme': cls.generate_network_scheme(node)}
-        node_attrs = cls.mellanox_settings(node_attrs, node)
+        node_attrs = {
+            'network_scheme': cls.generate_network_scheme(node, topology)}
+        node_attrs = cls.mellanox_settings(node_attrs, node, topology)
         return node_attrs
 
     @classmethod
-    def mellanox_settings(cls, node_attrs, node):
+    def mellanox_settings(cls, node_attrs, node, topology):
         """Serialize mellanox node attrs, then it will be
         merged with common attributes, if mellanox plugin or iSER storage
         enabled.
         """
         # Get Mellanox data
         neutron_mellanox_data =  \
-            Cluster.get_attributes(node.cluster).editable\
-            .get('neutron_mellanox', {})
+            node.cluster.attributes.editable.get('neutron_mellanox', {})
 
         # Get storage data
-        storage_data = \
-            Cluster.get_attributes(node.cluster).editable.get('storage', {})
-
-        # Get network manager
-        nm = objects.Node.get_network_manager(node)
+        storage_data = node.cluster.attributes.editable.get('storage', {})
 
         # Init mellanox dict
         node_attrs['neutron_mellanox'] = {}
@@ -333,23 +331,24 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         # Find Physical port for VFs generation
         if 'plugin' in neutron_mellanox_data and \
            neutron_mellanox_data['plugin']['value'] == 'ethernet':
-            node_attrs = cls.set_mellanox_ml2_config(node_attrs, node, nm)
+            node_attrs = cls.set_mellanox_ml2_config(
+                node_attrs, node, topology)
 
         # Fix network scheme to have physical port for RDMA if iSER enabled
         if 'iser' in storage_data and storage_data['iser']['value']:
-            node_attrs = cls.fix_iser_port(node_attrs, node, nm)
+            node_attrs = cls.fix_iser_port(node_attrs, node, topology)
 
         return node_attrs
 
     @classmethod
-    def set_mellanox_ml2_config(cls, node_attrs, node, nm):
+    def set_mellanox_ml2_config(cls, node_attrs, node, topology):
         """Change the yaml file to include the required configurations
         for ml2 mellanox mechanism driver.
         should be called only in case of mellanox SR-IOV plugin usage.
         """
         # Set physical port for SR-IOV virtual functions
         node_attrs['neutron_mellanox']['physical_port'] = \
-            nm.get_node_network_by_netname(node, 'private')['dev']
+            topology.get_node_network_by_netname(node, 'private')['dev']
 
         # Set ML2 eswitch section conf
         ml2_eswitch = {}
@@ -360,7 +359,7 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         return node_attrs
 
     @classmethod
-    def fix_iser_port(cls, node_attrs, node, nm):
+    def fix_iser_port(cls, node_attrs, node, topology):
         """Change the iser port to eth_iser probed (VF on the HV) interface
         instead of br-storage. that change is made due to RDMA
         (Remote Direct Memory Access) limitation of working with physical
@@ -371,12 +370,12 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
 
         # Add iSER extra params to astute.yaml
         node_attrs['neutron_mellanox']['storage_parent'] = \
-            nm.get_node_network_by_netname(node, 'storage')['dev']
+            topology.get_node_network_by_netname(node, 'storage')['dev']
         node_attrs['neutron_mellanox']['iser_interface_name'] = iser_new_name
 
         # Get VLAN if exists
         storage_vlan = \
-            nm.get_node_network_by_netname(node, 'storage').get('vlan')
+            topology.get_node_network_by_netname(node, 'storage').get('vlan')
 
         if storage_vlan:
             vlan_name = "vlan{0}".format(storage_vlan)
@@ -431,7 +430,7 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         return attrs
 
     @classmethod
-    def generate_network_scheme(cls, node):
+    def generate_network_scheme(cls, node, topology):
 
         # Create a data structure and fill it with static values.
 
@@ -456,7 +455,7 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
             attrs['endpoints']['br-ex'] = {}
             attrs['roles']['ex'] = 'br-ex'
 
-        nm = objects.Node.get_network_manager(node)
+        nm = topology.net_manager
         iface_types = consts.NETWORK_INTERFACE_TYPES
 
         # Add a dynamic data to a structure.
@@ -535,7 +534,7 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
         for ngname, brname in netgroup_mapping:
             # Here we get a dict with network description for this particular
             # node with its assigned IPs and device names for each network.
-            netgroup = nm.get_node_network_by_netname(node, ngname)
+            netgroup = topology.get_node_network_by_netname(node, ngname)
             attrs['endpoints'][brname]['IP'] = [netgroup['ip']]
             netgroups[ngname] = netgroup
         if objects.Node.should_have_public(node):
@@ -546,7 +545,7 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
 
         # Connect interface bridges to network bridges.
         for ngname, brname in netgroup_mapping:
-            netgroup = nm.get_node_network_by_netname(node, ngname)
+            netgroup = topology.get_node_network_by_netname(node, ngname)
             if not netgroup['vlan']:
                 # Untagged network.
                 attrs['transformations'].append({
@@ -578,8 +577,8 @@ class NeutronNetworkDeploymentSerializer(NetworkDeploymentSerializer):
             attrs['transformations'].append({
                 'action': 'add-patch',
                 'bridges': [
-                    'br-%s' % nm.get_node_interface_by_netname(
-                        node.id,
+                    'br-%s' % topology.get_node_interface_by_netname(
+                        node,
                         'private'
                     ).name,
                     'br-prv'
@@ -773,13 +772,16 @@ class DeploymentMultinodeSerializer(object):
         return serialized_nodes
 
     def serialize_generated(self, cluster, nodes):
-        nodes = self.serialize_nodes(nodes)
-        common_attrs = self.get_common_attrs(cluster)
+        topology = NetworkTopology(cluster)
+        nodes = self.serialize_nodes(nodes, topology)
+        common_attrs = self.get_common_attrs(cluster, topology)
 
         self.set_deployment_priorities(nodes)
         self.set_critical_nodes(nodes)
 
-        return [dict_merge(node, common_attrs) for node in nodes]
+        # common attributes are the same for all nodes, so they are
+        # referenced by every node's facts instead of being copied
+        return [dict_merge_shared(node, common_attrs) for node in nodes]
 
     def serialize_customized(self, cluster, nodes):
         serialized = []
@@ -791,7 +793,7 @@ class DeploymentMultinodeSerializer(object):
                 serialized.append(role_data)
         return serialized
 
-    def get_common_attrs(self, cluster):
+    def get_common_attrs(self, cluster, topology=None):
         """Cluster attributes."""
         attrs = objects.Attributes.merged_attrs_values(cluster.attributes)
         release = self.current_release(cluster)
@@ -805,7 +807,8 @@ class DeploymentMultinodeSerializer(object):
         attrs.update(
             objects.Release.get_orchestrator_data_dict(release)
         )
-        attrs['nodes'] = self.node_list(get_nodes_not_for_deletion(cluster))
+        attrs['nodes'] = self.node_list(
+            get_nodes_not_for_deletion(cluster, topology))
 
         for node in attrs['nodes']:
             if node['role'] in 'cinder':
@@ -816,8 +819,8 @@ class DeploymentMultinodeSerializer(object):
 
         attrs = dict_merge(
             attrs,
-            self.get_net_provider_serializer(cluster).get_common_attrs(cluster,
-                                                                       attrs))
+            self.get_net_provider_serializer(cluster).get_common_attrs(
+                cluster, attrs, topology))
 
         return attrs
 
@@ -895,20 +898,22 @@ class DeploymentMultinodeSerializer(object):
         for n in nodes:
             n['fail_if_error'] = n['role'] in self.critical_roles
 
-    def serialize_nodes(self, nodes):
+    def serialize_nodes(self, nodes, topology=None):
         """Serialize node for each role.
         For example if node has two roles then
         in orchestrator will be passed two serialized
         nodes.
         """
-        serialized_nodes = []
-        for node in nodes:
-            for role in sorted(node.all_roles):
-                serialized_nodes.append(self.serialize_node(node, role))
+        nodes_roles = [(node, role) for node in nodes
+                       for role in sorted(node.all_roles)]
+
+        serialized_nodes = [self.serialize_node(node, role, topology)
+                            for node, role in nodes_roles]
+
         self.set_primary_mongo(serialized_nodes)
         return serialized_nodes
 
-    def serialize_node(self, node, role):
+    def serialize_node(self, node, role, topology=None):
         """Serialize node, then it will be
         merged with common attributes
         """
@@ -924,7 +929,7 @@ class DeploymentMultinodeSerializer(object):
         }
 
         node_attrs.update(self.get_net_provider_serializer(
-            node.cluster).get_node_attrs(node))
+            node.cluster).get_node_attrs(node, topology))
         node_attrs.update(self.get_image_cache_max_size(node))
         node_attrs.update(self.generate_test_vm_image_data(node))
         return node_attrs
@@ -1021,11 +1026,11 @@ class DeploymentHASerializer(DeploymentMultinodeSerializer):
                       'primary-swift-proxy',
                       'ceph-osd']
 
-    def serialize_nodes(self, nodes):
+    def serialize_nodes(self, nodes, topology=None):
         """Serialize nodes and set primary-controller
         """
         serialized_nodes = super(
-            DeploymentHASerializer, self).serialize_nodes(nodes)
+            DeploymentHASerializer, self).serialize_nodes(nodes, topology)
         self.set_primary_controller(serialized_nodes)
         return serialized_nodes
 
@@ -1061,13 +1066,13 @@ class DeploymentHASerializer(DeploymentMultinodeSerializer):
 
         return node_list
 
-    def get_common_attrs(self, cluster):
+    def get_common_attrs(self, cluster, topology=None):
         """Common attributes for all facts
         """
         common_attrs = super(
             DeploymentHASerializer,
             self
-        ).get_common_attrs(cluster)
+        ).get_common_attrs(cluster, topology)
 
         net_manager = objects.Cluster.get_network_manager(cluster)
 
@@ -14,11 +14,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import six
 import functools
+import logging
+import six
 
 from kombu import Connection
 from kombu import Exchange
+from kombu import pools
 from kombu import Queue
 
 import amqp.exceptions as amqp_exceptions
@@ -76,25 +78,57 @@ nailgun_queue = Queue(
 )
 
 
+connection = Connection(conn_str)
+
+
 def cast(name, message, service=False):
-    logger.debug(
-        "RPC cast to orchestrator:\n{0}".format(
-            jsonutils.dumps(message, indent=4)
-        )
-    )
+    """Publishes message to orchestrator.
+
+    Producers (and their connections and channels) are taken from
+    kombu pool, so they are reused between casts and reconnected
+    automatically. Message is serialized only once, serialized
+    body is logged only when debug logging is enabled.
+    """
+    body = jsonutils.dumps(message)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("RPC cast to orchestrator:\n{0}".format(body))
+
     use_queue = naily_queue if not service else naily_service_queue
     use_exchange = naily_exchange if not service else naily_service_exchange
-    with Connection(conn_str) as conn:
-        with conn.Producer(serializer='json') as producer:
-            publish = functools.partial(producer.publish, message,
-                exchange=use_exchange, routing_key=name, declare=[use_queue])
-            try:
-                publish()
-            except amqp_exceptions.PreconditionFailed as e:
-                logger.warning(six.text_type(e))
-                # (dshulyak) we should drop both exchanges/queues in order
-                # for astute to be able to recover temporary queues
-                utils.delete_entities(
-                    conn, naily_service_exchange, naily_service_queue,
-                    naily_exchange, naily_queue)
-                publish()
+    with pools.producers[connection].acquire(block=True) as producer:
+        publish = functools.partial(producer.publish, body,
+            exchange=use_exchange, routing_key=name, declare=[use_queue],
+            content_type='application/json', content_encoding='utf-8',
+            retry=True, retry_policy={
+                'max_retries': int(settings.RPC_CAST_MAX_RETRIES)})
+        try:
+            publish()
+        except amqp_exceptions.PreconditionFailed as e:
+            logger.warning(six.text_type(e))
+            # (dshulyak) we should drop both exchanges/queues in order
+            # for astute to be able to recover temporary queues
+            utils.delete_entities(
+                producer.connection, naily_service_exchange,
+                naily_service_queue, naily_exchange, naily_queue)
+            # broker closes the channel on precondition failure
+            producer.revive(producer.connection.channel())
+            publish()
+
+
+def cast_nailgun(message):
+    """Publishes message to nailgun queue, so it's processed by
+    receiverd in the same way as responses of orchestrator.
+    Message is persistent, so it's kept by broker until receiverd
+    acks it.
+    """
+    body = jsonutils.dumps(message)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("RPC cast to nailgun:\n{0}".format(body))
+
+    with pools.producers[connection].acquire(block=True) as producer:
+        producer.publish(
+            body, exchange=nailgun_exchange, routing_key='nailgun',
+            declare=[nailgun_queue], delivery_mode='persistent',
+            content_type='application/json', content_encoding='utf-8',
+            retry=True, retry_policy={
+                'max_retries': int(settings.RPC_CAST_MAX_RETRIES)})
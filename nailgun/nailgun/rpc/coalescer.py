@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import copy
+import time
+
+
+class ProgressCoalescer(object):
+    """Merges progress only orchestrator responses of the same task.
+
+    Messages which only change progress (see
+    :func:`NailgunReceiver.is_progress_only_update`) are held for
+    `window` seconds and merged into one message, so receiver locks
+    task, cluster and nodes and recalculates task progress once
+    per window instead of once per message. Any other message of
+    the task releases pending messages of the task before itself,
+    so order of messages within the task is kept.
+
+    Every merged message is returned along with list of AMQP messages
+    it was built from, which should be acked after processing.
+    """
+
+    def __init__(self, receiver, window):
+        self.receiver = receiver
+        self.window = window
+        # (task_uuid, method) -> [received_at, body, msgs]
+        self.pending = collections.OrderedDict()
+
+    def push(self, body, msg):
+        """Adds message to coalescer.
+
+        :returns: list of (body, msgs) ready to be processed
+        """
+        method = body.get("method")
+        args = body.get("args") or {}
+        task_uuid = args.get("task_uuid")
+
+        if task_uuid and self.receiver.is_progress_only_update(method, args):
+            key = (task_uuid, method)
+            if key in self.pending:
+                _, pending_body, msgs = self.pending[key]
+                self.merge(pending_body["args"], args)
+                msgs.append(msg)
+            else:
+                self.pending[key] = [time.time(), copy.deepcopy(body), [msg]]
+            return []
+
+        ready = [
+            self.pending.pop(pending_key)[1:]
+            for pending_key in self.pending.keys()
+            if pending_key[0] == task_uuid
+        ]
+        ready.append((body, [msg]))
+        return ready
+
+    @classmethod
+    def merge(cls, pending, update):
+        """Merges progress update into pending one. Nodes are merged
+        by uid, all other fields are taken from latest update
+        """
+        nodes = collections.OrderedDict(
+            (node["uid"], node) for node in pending.get("nodes") or []
+        )
+        for node in update.get("nodes") or []:
+            nodes.setdefault(node["uid"], {}).update(node)
+
+        pending.update(copy.deepcopy(update))
+        pending["nodes"] = nodes.values()
+
+    def pop_expired(self):
+        """Pops messages which were held for longer than window
+
+        :returns: list of (body, msgs)
+        """
+        deadline = time.time() - self.window
+        ready = []
+        for key, (received_at, _, _) in self.pending.items():
+            if received_at > deadline:
+                break
+            ready.append(self.pending.pop(key)[1:])
+        return ready
+
+    def pop_all(self):
+        """Pops all pending messages
+
+        :returns: list of (body, msgs)
+        """
+        ready = [item[1:] for item in self.pending.values()]
+        self.pending.clear()
+        return ready
@@ -20,7 +20,11 @@ import itertools
 import os
 import traceback
 
+import six
+
+from sqlalchemy import bindparam
 from sqlalchemy import or_
+from sqlalchemy.orm.util import identity_key
 
 from nailgun import consts
 from nailgun import notifier
@@ -31,14 +35,83 @@ from nailgun.consts import TASK_STATUSES
 from nailgun.db import db
 from nailgun.db.sqlalchemy.models import IPAddr
 from nailgun.db.sqlalchemy.models import Node
+from nailgun.db.sqlalchemy.models import NodeBondInterface
+from nailgun.db.sqlalchemy.models import NodeNICInterface
 from nailgun.db.sqlalchemy.models import Release
 from nailgun.logger import logger
+from nailgun.network import vlan_ranges
 from nailgun.openstack.common import jsonutils
 from nailgun.task.helpers import TaskHelper
 
 
 class NailgunReceiver(object):
 
+    # node fields which can be changed by progress only update
+    PROGRESS_FIELDS = ('uid', 'progress', 'status')
+
+    @classmethod
+    def is_progress_only_update(cls, method, kwargs):
+        """Checks whether deploy_resp/provision_resp message changes
+        only progress of task and nodes, so it can be merged with
+        other such messages of the same task. Messages with
+        error or ready statuses are never progress only.
+        """
+        if method not in ('deploy_resp', 'provision_resp'):
+            return False
+        if kwargs.get('error') or \
+                kwargs.get('status') in ('error', 'ready'):
+            return False
+        return cls._is_progress_only_nodes(kwargs.get('nodes') or [])
+
+    @classmethod
+    def _is_progress_only_nodes(cls, nodes):
+        return all(
+            set(node) <= set(cls.PROGRESS_FIELDS) and
+            node.get('status') not in ('error', 'ready')
+            for node in nodes
+        )
+
+    @classmethod
+    def _update_nodes_progress(cls, nodes, fields=None):
+        """Updates nodes with one batched UPDATE per set of changed
+        fields instead of loading and updating nodes one by one.
+
+        :param nodes: list of nodes data from orchestrator
+        :param fields: fields to update, if None all fields
+            present in node data are updated
+        """
+        table = Node.__table__
+        params_by_fields = collections.defaultdict(list)
+        for node in nodes:
+            node_fields = fields or tuple(
+                sorted(f for f in node if f != 'uid'))
+            if not node_fields:
+                continue
+            params = dict(
+                ('new_{0}'.format(f), node.get(f)) for f in node_fields)
+            params['node_id'] = int(node['uid'])
+            params_by_fields[node_fields].append(params)
+
+        for node_fields, params in six.iteritems(params_by_fields):
+            logger.debug(
+                u"Updating %s of nodes %s",
+                ', '.join(node_fields), [p['node_id'] for p in params])
+            db().execute(
+                table.update().where(
+                    table.c.id == bindparam('node_id')
+                ).values(**dict(
+                    (f, bindparam('new_{0}'.format(f))) for f in node_fields
+                )),
+                params
+            )
+
+        # nodes which are already loaded into session are stale now
+        for params in itertools.chain(*params_by_fields.values()):
+            node_db = db().identity_map.get(
+                identity_key(Node, params['node_id']))
+            if node_db is not None:
+                db().expire(node_db)
+
     @classmethod
     def remove_nodes_resp(cls, **kwargs):
         logger.info(
@@ -188,6 +261,50 @@ class NailgunReceiver(object):
                 cluster.id
             )
 
+    @classmethod
+    def apply_changes(cls, **kwargs):
+        """Runs deferred part of deployment of deploy supertask
+        created by ApplyChangesTaskManager, see nailgun.task.executor
+        """
+        logger.info(
+            "RPC method apply_changes received: %s" %
+            jsonutils.dumps(kwargs)
+        )
+        # task managers import receiver
+        from nailgun.task.manager import ApplyChangesTaskManager
+
+        task_uuid = kwargs.get('task_uuid')
+        supertask = objects.Task.get_by_uuid(
+            task_uuid, fail_if_not_found=True, lock_for_update=True)
+        if supertask.status != TASK_STATUSES.running:
+            logger.warning(
+                u"Task %s is already %s, skipping deployment",
+                task_uuid, supertask.status)
+            return
+        if supertask.subtasks:
+            # message is delivered again, since receiverd was stopped
+            # while deployment was being started, so we can't know
+            # which subtasks were cast to orchestrator
+            objects.Task.update(supertask, {
+                'status': TASK_STATUSES.error,
+                'progress': 100,
+                'message': u"Deployment was interrupted by restart "
+                           u"of nailgun, please deploy changes again"})
+            return
+
+        try:
+            ApplyChangesTaskManager(
+                cluster_id=kwargs.get('cluster_id')).deploy(supertask)
+        except Exception as exc:
+            db().rollback()
+            supertask = objects.Task.get_by_uuid(task_uuid)
+            objects.Task.update(supertask, {
+                'status': TASK_STATUSES.error,
+                'progress': 100,
+                'message': six.text_type(exc)})
+            db().commit()
+            raise
+
     @classmethod
     def deploy_resp(cls, **kwargs):
         logger.info(
@@ -227,7 +344,14 @@ class NailgunReceiver(object):
         objects.NodeCollection.lock_for_update(q_nodes).all()
 
         # First of all, let's update nodes in database
-        for node in nodes:
+        if cls._is_progress_only_nodes(nodes):
+            cls._update_nodes_progress(nodes)
+            nodes_to_update = []
+        else:
+            nodes_to_update = nodes
+
+        notifications = []
+        for node in nodes_to_update:
             node_db = objects.Node.get_by_uid(node['uid'])
             if not node_db:
                 logger.warning(
@@ -265,16 +389,17 @@ class NailgunReceiver(object):
                                 and not node_db.error_msg:
                             node_db.error_msg = u"Node is offline"
                         # Notification on particular node failure
-                        notifier.notify(
-                            "error",
-                            u"Failed to deploy node '{0}': {1}".format(
+                        notifications.append(dict(
+                            topic="error",
+                            message=u"Failed to deploy node '{0}': {1}".format(
                                 node_db.name,
                                 node_db.error_msg or "Unknown error"
                             ),
                             cluster_id=task.cluster_id,
                             node_id=node['uid'],
                             task_uuid=task_uuid
-                        )
+                        ))
+        objects.NotificationCollection.create_many(notifications)
         db().flush()
         if nodes and not progress:
             progress = TaskHelper.recalculate_deployment_task_progress(task)
@@ -314,7 +439,13 @@ class NailgunReceiver(object):
         q_nodes = objects.NodeCollection.order_by(q_nodes, 'id')
         objects.NodeCollection.lock_for_update(q_nodes).all()
 
-        for node in nodes:
+        if cls._is_progress_only_nodes(nodes):
+            cls._update_nodes_progress(nodes, fields=('status', 'progress'))
+            nodes_to_update = []
+        else:
+            nodes_to_update = nodes
+
+        for node in nodes_to_update:
             uid = node.get('uid')
             node_db = objects.Node.get_by_uid(node['uid'])
 
@@ -749,73 +880,7 @@ class NailgunReceiver(object):
                     )
                 status = 'error'
             else:
-                error_nodes = []
-                for node in nodes:
-                    cached_nodes_filtered = filter(
-                        lambda n: str(n['uid']) == str(node['uid']),
-                        cached_nodes
-                    )
-
-                    if not cached_nodes_filtered:
-                        logger.warning(
-                            "verify_networks_resp: arguments contain node "
-                            "data which is not in the task cache: %r",
-                            node
-                        )
-                        continue
-
-                    cached_node = cached_nodes_filtered[0]
-
-                    for cached_network in cached_node['networks']:
-                        received_networks_filtered = filter(
-                            lambda n: n['iface'] == cached_network['iface'],
-                            node.get('networks', [])
-                        )
-
-                        if received_networks_filtered:
-                            received_network = received_networks_filtered[0]
-                            absent_vlans = list(
-                                set(cached_network['vlans']) -
-                                set(received_network['vlans'])
-                            )
-                        else:
-                            logger.warning(
-                                "verify_networks_resp: arguments don't contain"
-                                " data for interface: uid=%s iface=%s",
-                                node['uid'], cached_network['iface']
-                            )
-                            absent_vlans = cached_network['vlans']
-
-                        if absent_vlans:
-                            data = {'uid': node['uid'],
-                                    'interface': cached_network['iface'],
-                                    'absent_vlans': absent_vlans}
-                            node_db = db().query(Node).get(node['uid'])
-                            if node_db:
-                                data['name'] = node_db.name
-                                db_nics = filter(
-                                    lambda i:
-                                    i.name == cached_network['iface'],
-                                    node_db.interfaces
-                                )
-                                if db_nics:
-                                    data['mac'] = db_nics[0].mac
-                                else:
-                                    logger.warning(
-                                        "verify_networks_resp: can't find "
-                                        "interface %r for node %r in DB",
-                                        cached_network['iface'], node_db.id
-                                    )
-                                    data['mac'] = 'unknown'
-                            else:
-                                logger.warning(
-                                    "verify_networks_resp: can't find node "
-                                    "%r in DB",
-                                    node['uid']
-                                )
-
-                            error_nodes.append(data)
-
+                error_nodes = cls._get_absent_vlans(cached_nodes, nodes)
                 if error_nodes:
                     result = error_nodes
                     status = 'error'
@@ -833,6 +898,97 @@ class NailgunReceiver(object):
             objects.Task.update_verify_networks(task, status, progress,
                                                 error_msg, result)
 
+    @classmethod
+    def _get_absent_vlans(cls, cached_nodes, nodes):
+        """Compares vlans received by nodes interfaces with expected ones
+        from task cache. Nodes and networks are indexed by uid and iface,
+        vlans may be given as ranges (see nailgun.network.vlan_ranges).
+
+        :returns: list of dicts with absent vlans of nodes interfaces
+        """
+        # first node (and network) with the same uid (iface)
+        # wins, as with linear search
+        cached_nodes_by_uid = dict(
+            (str(n['uid']), n) for n in reversed(cached_nodes))
+        error_nodes = []
+        for node in nodes:
+            cached_node = cached_nodes_by_uid.get(str(node['uid']))
+            if cached_node is None:
+                logger.warning(
+                    "verify_networks_resp: arguments contain node "
+                    "data which is not in the task cache: %r",
+                    node
+                )
+                continue
+
+            received_vlans = dict(
+                (n['iface'], n['vlans'])
+                for n in reversed(node.get('networks', [])))
+
+            for cached_network in cached_node['networks']:
+                iface = cached_network['iface']
+                if iface in received_vlans:
+                    absent_vlans = vlan_ranges.difference(
+                        cached_network['vlans'], received_vlans[iface])
+                else:
+                    logger.warning(
+                        "verify_networks_resp: arguments don't contain"
+                        " data for interface: uid=%s iface=%s",
+                        node['uid'], iface
+                    )
+                    absent_vlans = vlan_ranges.expand(cached_network['vlans'])
+
+                if absent_vlans:
+                    error_nodes.append({
+                        'uid': node['uid'],
+                        'interface': iface,
+                        'absent_vlans': absent_vlans})
+
+        cls._add_nodes_names_and_macs(error_nodes)
+        return error_nodes
+
+    @classmethod
+    def _add_nodes_names_and_macs(cls, error_nodes):
+        """Adds names of nodes and MACs of interfaces with absent vlans
+        to results of network verification. Nodes and interfaces are
+        fetched by one query for all nodes.
+        """
+        node_ids = set(int(data['uid']) for data in error_nodes)
+        if not node_ids:
+            return
+
+        names = dict(db().query(Node.id, Node.name).filter(
+            Node.id.in_(node_ids)))
+        macs = {}
+        for model in (NodeNICInterface, NodeBondInterface):
+            query = db().query(
+                model.node_id, model.name, model.mac
+            ).filter(
+                model.node_id.in_(node_ids)
+            ).order_by(model.name)
+            for node_id, name, mac in query:
+                macs.setdefault((node_id, name), mac)
+
+        for data in error_nodes:
+            node_id = int(data['uid'])
+            if node_id not in names:
+                logger.warning(
+                    "verify_networks_resp: can't find node %r in DB",
+                    data['uid']
+                )
+                continue
+
+            data['name'] = names[node_id]
+            mac = macs.get((node_id, data['interface']))
+            if mac is None:
+                logger.warning(
+                    "verify_networks_resp: can't find "
+                    "interface %r for node %r in DB",
+                    data['interface'], node_id
+                )
+                mac = 'unknown'
+            data['mac'] = mac
+
     @classmethod
     def multicast_verification_resp(cls, **kwargs):
         """Receiver for verification of multicast packages
@@ -19,6 +19,9 @@ import sys
 
 sys.path.insert(0, os.path.dirname(__file__))
 
+import Queue
+import threading
+import time
 import traceback
 
 import six
@@ -32,21 +35,50 @@ from nailgun.db import db
 from nailgun.errors import errors
 from nailgun.logger import logger
 import nailgun.rpc as rpc
+from nailgun.rpc.coalescer import ProgressCoalescer
 from nailgun.rpc.receiver import NailgunReceiver
 from nailgun.rpc import utils
+from nailgun.settings import settings
 
 
 class RPCConsumer(ConsumerMixin):
 
-    def __init__(self, connection, receiver):
+    def __init__(self, connection, receiver, coalesce_window=0):
         self.connection = connection
         self.receiver = receiver
+        self.coalescer = None
+        if coalesce_window:
+            self.coalescer = ProgressCoalescer(receiver, coalesce_window)
 
     def get_consumers(self, Consumer, channel):
         return [Consumer(queues=[rpc.nailgun_queue],
                          callbacks=[self.consume_msg])]
 
     def consume_msg(self, body, msg):
+        if self.coalescer is None:
+            self.handle_msg(body, [msg])
+            return
+        for ready_body, msgs in self.coalescer.push(body, msg):
+            self.handle_msg(ready_body, msgs)
+
+    def handle_msg(self, body, msgs):
+        try:
+            self.process_msg(body)
+        finally:
+            for msg in msgs:
+                msg.ack()
+
+    def on_iteration(self):
+        if self.coalescer is not None:
+            for body, msgs in self.coalescer.pop_expired():
+                self.handle_msg(body, msgs)
+
+    def on_connection_revived(self):
+        if self.coalescer is not None:
+            # unacked messages will be redelivered by broker
+            self.coalescer.pop_all()
+
+    def process_msg(self, body):
         callback = getattr(self.receiver, body["method"])
         try:
             callback(**body["args"])
@@ -58,7 +90,6 @@ class RPCConsumer(ConsumerMixin):
             logger.error(traceback.format_exc())
             db().rollback()
         finally:
-            msg.ack()
             db().expire_all()
 
     def on_precondition_failed(self, error_msg):
@@ -74,10 +105,174 @@ class RPCConsumer(ConsumerMixin):
             self.run(*args, **kwargs)
 
 
+class ConsumerStats(object):
+    """Handlers latency statistics of RPC consumer. Latency is
+    collected per receiver method: time message waited in worker
+    queue and time spent in handler.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}
+
+    def register(self, method, wait_time, handle_time):
+        with self.lock:
+            stat = self.methods.setdefault(method, {
+                'count': 0,
+                'wait_time': 0.0,
+                'handle_time': 0.0,
+                'max_handle_time': 0.0
+            })
+            stat['count'] += 1
+            stat['wait_time'] += wait_time
+            stat['handle_time'] += handle_time
+            stat['max_handle_time'] = max(
+                stat['max_handle_time'], handle_time)
+
+    def to_dict(self):
+        with self.lock:
+            return dict(
+                (method, dict(stat)) for method, stat in
+                six.iteritems(self.methods)
+            )
+
+
+class PooledRPCConsumer(RPCConsumer):
+    """RPC consumer which handles messages in pool of worker threads.
+
+    Messages of the same task are always routed to the same worker,
+    so they are processed strictly in order they were received, while
+    messages of different tasks (and so clusters) are processed in
+    parallel. Every worker thread uses its own DB session.
+
+    Messages are acked in consumer thread (channel isn't thread safe)
+    only after they were processed, and number of unacked messages
+    is limited by AMQP prefetch count, so nothing is lost if process
+    dies and workers queues can't grow unbounded.
+    """
+
+    def __init__(self, connection, receiver, workers_count,
+                 prefetch_count=None, stats_interval=60, coalesce_window=0):
+        super(PooledRPCConsumer, self).__init__(
+            connection, receiver, coalesce_window=coalesce_window)
+        self.queues = [Queue.Queue() for _ in xrange(workers_count)]
+        self.processed = Queue.Queue()
+        self.prefetch_count = prefetch_count or workers_count * 10
+        self.stats = ConsumerStats()
+        self.stats_interval = stats_interval
+        self.stats_logged_at = time.time()
+        self.workers = []
+
+    def get_consumers(self, Consumer, channel):
+        consumers = super(PooledRPCConsumer, self).get_consumers(
+            Consumer, channel)
+        for consumer in consumers:
+            consumer.qos(prefetch_count=self.prefetch_count)
+        return consumers
+
+    def get_queue(self, body):
+        task_uuid = body.get("args", {}).get("task_uuid")
+        return self.queues[hash(task_uuid) % len(self.queues)]
+
+    def handle_msg(self, body, msgs):
+        self.get_queue(body).put((body, msgs, time.time()))
+
+    def on_iteration(self):
+        super(PooledRPCConsumer, self).on_iteration()
+        self.ack_processed()
+        if time.time() - self.stats_logged_at >= self.stats_interval:
+            self.stats_logged_at = time.time()
+            logger.info(
+                "RPC consumer queue depth: %s, handlers latency: %s",
+                self.queue_depth(), self.stats.to_dict())
+
+    def ack_processed(self):
+        while True:
+            try:
+                msgs = self.processed.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                for msg in msgs:
+                    msg.ack()
+            except self.connection.connection_errors as e:
+                # channel was recreated after connection loss,
+                # so message will be redelivered by broker
+                logger.warning(
+                    "Failed to ack message: %s", six.text_type(e))
+
+    def queue_depth(self):
+        """Number of received messages waiting for processing
+        """
+        return sum(q.qsize() for q in self.queues)
+
+    def work(self, queue):
+        try:
+            while True:
+                item = queue.get()
+                if item is None:
+                    return
+                body, msgs, received_at = item
+                started_at = time.time()
+                try:
+                    self.process_msg(body)
+                    self.stats.register(
+                        body.get("method"),
+                        started_at - received_at,
+                        time.time() - started_at)
+                except Exception:
+                    # e.g. unknown method, worker has to keep working,
+                    # otherwise messages of its queue are never acked
+                    logger.error(traceback.format_exc())
+                finally:
+                    self.processed.put(msgs)
+        finally:
+            db.remove()
+
+    def start_workers(self):
+        if self.workers:
+            return
+        for queue in self.queues:
+            worker = threading.Thread(target=self.work, args=(queue,))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def stop_workers(self):
+        if not self.workers:
+            return
+        for queue in self.queues:
+            queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        self.ack_processed()
+
+    def run(self, *args, **kwargs):
+        self.start_workers()
+        try:
+            super(PooledRPCConsumer, self).run(*args, **kwargs)
+        finally:
+            self.stop_workers()
+
+
+def get_consumer(conn):
+    workers_count = int(settings.RPC_CONSUMER_WORKERS)
+    coalesce_window = float(settings.RPC_CONSUMER_COALESCE_WINDOW)
+    if workers_count > 0:
+        return PooledRPCConsumer(
+            conn, NailgunReceiver, workers_count,
+            prefetch_count=int(settings.RPC_CONSUMER_PREFETCH_COUNT),
+            stats_interval=int(settings.RPC_CONSUMER_STATS_INTERVAL),
+            coalesce_window=coalesce_window)
+    return RPCConsumer(
+        conn, NailgunReceiver, coalesce_window=coalesce_window)
+
+
 def run():
     logger.info("Starting standalone RPC consumer...")
     with Connection(rpc.conn_str) as conn:
         try:
-            RPCConsumer(conn, NailgunReceiver).run()
+            get_consumer(conn).run()
         except (KeyboardInterrupt, SystemExit):
             logger.info("Stopping standalone RPC consumer...")
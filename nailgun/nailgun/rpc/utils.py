@@ -23,5 +23,11 @@ def delete_entities(conn, *entities):
     for entity in entities:
         logger.debug('Deleting amqp entity %s', six.text_type(entity))
         channel = conn.channel()
-        bound_entity = entity(channel)
-        bound_entity.delete()
+        try:
+            bound_entity = entity(channel)
+            bound_entity.delete()
+        finally:
+            channel.close()
+    # entities are cached as declared by connection, they have
+    # to be declared again by the next publish
+    conn.declared_entities.clear()
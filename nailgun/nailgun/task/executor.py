@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import traceback
+
+import six
+
+from nailgun.consts import TASK_STATUSES
+from nailgun.db import db
+from nailgun.logger import logger
+from nailgun import objects
+import nailgun.rpc as rpc
+from nailgun.settings import settings
+
+
+def execute(task_uuid, method, **kwargs):
+    """Runs deferred part of task manager (checks, serialization and
+    casting of messages to orchestrator), which is implemented by
+    NailgunReceiver method, for already committed supertask.
+
+    If DEFERRED_TASKS setting is enabled, the call is cast to nailgun
+    queue, so it's done by receiverd instead of API process. Message
+    is persistent and acked only after it's processed, so it isn't
+    lost if receiverd is restarted. Otherwise method is called right
+    away.
+
+    :param task_uuid: uuid of supertask, which is set to error if
+        message can't be cast
+    :param method: name of NailgunReceiver method
+    """
+    kwargs['task_uuid'] = task_uuid
+    if not settings.DEFERRED_TASKS:
+        # receiver imports task managers
+        from nailgun.rpc.receiver import NailgunReceiver
+        getattr(NailgunReceiver, method)(**kwargs)
+        return
+
+    try:
+        rpc.cast_nailgun({'method': method, 'args': kwargs})
+    except Exception as exc:
+        logger.error(traceback.format_exc())
+        fail_task(task_uuid, exc)
+        raise
+
+
+def fail_task(task_uuid, exc):
+    task = objects.Task.get_by_uuid(task_uuid)
+    if task:
+        objects.Task.update(task, {
+            'status': TASK_STATUSES.error,
+            'progress': 100,
+            'message': six.text_type(exc)})
+    db().commit()
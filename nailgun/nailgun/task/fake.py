@@ -30,6 +30,7 @@ from nailgun import objects
 
 from nailgun.db import db
 from nailgun.db.sqlalchemy.models import Node
+from nailgun.network import vlan_ranges
 from nailgun.rpc.receiver import NailgunReceiver
 from nailgun.settings import settings
 
@@ -514,8 +515,9 @@ class FakeVerificationThread(FakeThread):
         # verification will fail if you specified 404 as VLAN id in any net
         for n in self.data['args']['nodes']:
             for iface in n['networks']:
-                if 404 in iface['vlans']:
-                    iface['vlans'] = list(set(iface['vlans']) ^ set([404]))
+                vlans = vlan_ranges.expand(iface['vlans'])
+                if 404 in vlans:
+                    iface['vlans'] = list(set(vlans) ^ set([404]))
 
         while not ready and not self.stoprequest.isSet():
             kwargs['progress'] += randrange(
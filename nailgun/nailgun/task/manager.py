@@ -33,6 +33,7 @@ from nailgun.logger import logger
 from nailgun import objects
 from nailgun.openstack.common import jsonutils
 import nailgun.rpc as rpc
+from nailgun.task import executor
 from nailgun.task import task as tasks
 from nailgun.task.task import TaskHelper
 
@@ -116,12 +117,40 @@ class ApplyChangesTaskManager(TaskManager):
         db().flush()
 
     def execute(self):
+        """Creates deploy supertask and runs the rest of deployment
+        (checks, serialization and casting) by NailgunReceiver.apply_changes
+        through deferred tasks executor, see nailgun.task.executor
+
+        :returns: deploy supertask
+        """
         logger.info(
             u"Trying to start deployment at cluster '{0}'".format(
                 self.cluster.name or self.cluster.id
             )
         )
 
+        self._remove_obsolete_tasks()
+
+        supertask = Task(name=TASK_NAMES.deploy, cluster=self.cluster)
+        db().add(supertask)
+
+        if not any([TaskHelper.nodes_to_provision(self.cluster),
+                    TaskHelper.nodes_to_deploy(self.cluster),
+                    TaskHelper.nodes_to_delete(self.cluster)]):
+            db().rollback()
+            raise errors.WrongNodeStatus("No changes to deploy")
+
+        # we should have task committed for processing in other threads
+        db().commit()
+
+        executor.execute(
+            supertask.uuid, 'apply_changes', cluster_id=self.cluster.id)
+        return supertask
+
+    def deploy(self, supertask):
+        """Checks cluster, serializes messages of subtasks of
+        supertask and casts them to orchestrator
+        """
         network_info = self.serialize_network_cfg(self.cluster)
         logger.info(
             u"Network info:\n{0}".format(
@@ -129,22 +158,11 @@ class ApplyChangesTaskManager(TaskManager):
             )
         )
 
-        self._remove_obsolete_tasks()
-
-        supertask = Task(name=TASK_NAMES.deploy, cluster=self.cluster)
-        db().add(supertask)
-
         nodes_to_delete = TaskHelper.nodes_to_delete(self.cluster)
         nodes_to_deploy = TaskHelper.nodes_to_deploy(self.cluster)
         nodes_to_provision = TaskHelper.nodes_to_provision(self.cluster)
 
         task_messages = []
-        if not any([nodes_to_provision, nodes_to_deploy, nodes_to_delete]):
-            db().rollback()
-            raise errors.WrongNodeStatus("No changes to deploy")
-
-        # we should have task committed for processing in other threads
-        db().commit()
 
         # Run validation if user didn't redefine
         # provisioning and deployment information
@@ -21,7 +21,6 @@ import netaddr
 from sqlalchemy import func
 from sqlalchemy import not_
 from sqlalchemy.orm import ColumnProperty
-from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import object_mapper
 
 import nailgun.rpc as rpc
@@ -31,11 +30,13 @@ from nailgun import objects
 from nailgun.consts import CLUSTER_STATUSES
 from nailgun.consts import NODE_STATUSES
 from nailgun.db import db
-from nailgun.db.sqlalchemy.models import CapacityLog
 from nailgun.db.sqlalchemy.models import Cluster
 from nailgun.db.sqlalchemy.models import Node
+from nailgun.db.sqlalchemy.models import NodeRoles
+from nailgun.db.sqlalchemy.models import Role
 from nailgun.errors import errors
 from nailgun.logger import logger
+from nailgun.network import vlan_ranges
 from nailgun.network.checker import NetworkCheck
 from nailgun.orchestrator import deployment_serializers
 from nailgun.orchestrator import provisioning_serializers
@@ -261,7 +262,8 @@ class DeletionTask(object):
                         'cluster_id',
                         'roles',
                         'pending_deletion',
-                        'pending_addition'
+                        'pending_addition',
+                        'xmin'
                     )
                     for prop in object_mapper(node).iterate_properties:
                         if isinstance(
@@ -461,7 +463,7 @@ class BaseNetworkVerification(object):
                 if not vlans:
                     continue
                 node_json['networks'].append(
-                    {'iface': nic.name, 'vlans': vlans}
+                    {'iface': nic.name, 'vlans': vlan_ranges.compress(vlans)}
                 )
             nodes.append(node_json)
 
@@ -488,8 +490,30 @@ class BaseNetworkVerification(object):
                      self.task.name, message)
 
         db().commit()
+        if not settings.VERIFY_NETWORKS_VLAN_RANGES:
+            message = self.expand_vlans(message)
         rpc.cast('naily', message)
 
+    @classmethod
+    def expand_vlans(cls, message):
+        """Copy of message (and its subtasks) with explicit lists of
+        vlans instead of ranges, for orchestrator which doesn't
+        support ranges
+        """
+        nodes = []
+        for node in message['args']['nodes']:
+            if 'networks' in node:
+                node = dict(node, networks=[
+                    dict(net, vlans=vlan_ranges.expand(net['vlans']))
+                    for net in node['networks']])
+            nodes.append(node)
+
+        message = dict(message, args=dict(message['args'], nodes=nodes))
+        if 'subtasks' in message:
+            message['subtasks'] = [
+                cls.expand_vlans(subtask) for subtask in message['subtasks']]
+        return message
+
     @classmethod
     def enabled(cls, cluster):
         """Should be used to verify that subtask is enabled based on
@@ -774,43 +798,43 @@ class GenerateCapacityLogTask(object):
     def execute(cls, task):
         logger.debug("GenerateCapacityLogTask: task=%s" % task.uuid)
         unallocated_nodes = db().query(Node).filter_by(cluster_id=None).count()
-        # Use Node.cluster_id != (None) for PEP-8 accordance.
-        allocated_nodes = db().query(Node).\
-            filter(Node.cluster_id != (None)).count()
-        node_allocation = db().query(Cluster, func.count(Node.id)).\
-            outerjoin(Node).group_by(Cluster)
+        node_allocation = db().query(Cluster.name, func.count(Node.id)).\
+            outerjoin(Node, Node.cluster_id == Cluster.id).\
+            group_by(Cluster.id, Cluster.name).order_by(Cluster.id)
         env_stats = []
-        for allocation in node_allocation:
-            env_stats.append({'cluster': allocation[0].name,
-                              'nodes': allocation[1]})
-        allocation_stats = {'allocated': allocated_nodes,
-                            'unallocated': unallocated_nodes}
+        for cluster_name, nodes_count in node_allocation:
+            env_stats.append({'cluster': cluster_name,
+                              'nodes': nodes_count})
+        allocation_stats = {
+            'allocated': sum(stat['nodes'] for stat in env_stats),
+            'unallocated': unallocated_nodes}
 
         fuel_data = {
             "release": settings.VERSION['release'],
             "uuid": settings.FUEL_KEY
         }
 
-        nodes = db().query(Node).options(
-            joinedload('role_list'))
+        # names of roles aren't sorted in arrays by array_agg,
+        # so combinations are joined in python
+        nodes_roles = db().query(
+            func.array_agg(Role.name).label('roles')
+        ).select_from(NodeRoles).join(Role, Role.id == NodeRoles.role).\
+            group_by(NodeRoles.node).subquery()
+        roles_combinations = db().query(
+            nodes_roles.c.roles, func.count()
+        ).group_by(nodes_roles.c.roles)
         roles_stat = {}
-        for node in nodes:
-            if node.roles:
-                roles_list = '+'.join(sorted(node.roles))
-                if roles_list in roles_stat:
-                    roles_stat[roles_list] += 1
-                else:
-                    roles_stat[roles_list] = 1
+        for roles, nodes_count in roles_combinations:
+            roles_list = '+'.join(sorted(roles))
+            roles_stat[roles_list] = \
+                roles_stat.get(roles_list, 0) + nodes_count
 
         capacity_data = {'environment_stats': env_stats,
                          'allocation_stats': allocation_stats,
                          'fuel_data': fuel_data,
                          'roles_stat': roles_stat}
 
-        capacity_log = CapacityLog()
-        capacity_log.report = capacity_data
-        db().add(capacity_log)
-        db().flush()
+        capacity_log = objects.CapacityLog.create_snapshot(capacity_data)
 
         task.result = {'log_id': capacity_log.id}
         task.status = 'ready'
@@ -15,6 +15,7 @@
 #    under the License.
 
 from nailgun.assassin import assassind
+from nailgun.db.sqlalchemy.models import Notification
 from nailgun.test.base import BaseIntegrationTest
 
 
@@ -42,3 +43,17 @@ class TestKeepalive(BaseIntegrationTest):
         )
         assassind.update_nodes_status(self.ZERO_TIMEOUT)
         self.assertEqual(node.online, True)
+
+    def test_nodes_become_offline_with_notifications(self):
+        nodes = [self.env.create_node(status="discover", name=name)
+                 for name in ("First", "Second", None)]
+        assassind.update_nodes_status(self.ZERO_TIMEOUT)
+
+        notifications = self.db.query(Notification).filter_by(
+            topic="error").order_by(Notification.node_id).all()
+        self.assertEqual(
+            [(n.node_id, n.message) for n in notifications],
+            [(node.id, u"Node '{0}' has gone away".format(
+                node.human_readable_name)) for node in nodes])
+        for node in nodes:
+            self.assertEqual(node.online, False)
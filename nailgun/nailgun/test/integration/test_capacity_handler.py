@@ -19,6 +19,7 @@ from hashlib import md5
 from mock import patch
 from StringIO import StringIO
 
+from nailgun.db.sqlalchemy.models import CapacityLog
 from nailgun.db.sqlalchemy.models import Task
 from nailgun.openstack.common import jsonutils
 from nailgun.test.base import BaseIntegrationTest
@@ -65,6 +66,25 @@ class TestHandlers(BaseIntegrationTest):
         self.assertEqual(report['allocation_stats']['allocated'], 0)
         self.assertEqual(report['allocation_stats']['unallocated'], 1)
 
+    def test_capacity_log_is_created_only_for_changes(self):
+        self.env.create_node(api=False)
+        for _ in xrange(2):
+            resp = self.app.put(
+                reverse('CapacityLogHandler'),
+                headers=self.default_headers)
+            self.assertEqual(resp.status_code, 202)
+        self.assertEqual(self.db.query(CapacityLog).count(), 1)
+
+        self.env.create_node(api=False)
+        resp = self.app.put(
+            reverse('CapacityLogHandler'),
+            headers=self.default_headers)
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(self.db.query(CapacityLog).count(), 2)
+
+        report = self._get_capacity_log_json()['report']
+        self.assertEqual(report['allocation_stats']['unallocated'], 2)
+
     @patch('nailgun.api.v1.handlers.version.settings.VERSION', {
         'release': '0.1b'})
     def test_capacity_csv_checksum(self):
@@ -16,22 +16,30 @@
 
 import itertools
 
+from copy import deepcopy
+
 from mock import Mock
 from mock import patch
 from netaddr import IPAddress
 from netaddr import IPNetwork
 from netaddr import IPRange
+from sqlalchemy import event
 from sqlalchemy import not_
 
 import nailgun
 
+from nailgun import objects
+
+from nailgun.db.sqlalchemy.models import Cluster
 from nailgun.db.sqlalchemy.models import IPAddr
 from nailgun.db.sqlalchemy.models import IPAddrRange
 from nailgun.db.sqlalchemy.models import NetworkGroup
 from nailgun.db.sqlalchemy.models import Node
 from nailgun.db.sqlalchemy.models import NodeNICInterface
+from nailgun.errors import errors
 from nailgun.network.neutron import NeutronManager
 from nailgun.network.nova_network import NovaNetworkManager
+from nailgun.network.topology import NetworkTopology
 from nailgun.openstack.common import jsonutils
 from nailgun.test.base import BaseIntegrationTest
 from nailgun.test.base import fake_tasks
@@ -130,6 +138,65 @@ class TestNetworkManager(BaseIntegrationTest):
             1
         )
 
+    def test_assign_ips_repeated_and_unknown_ids(self):
+        self.env.create(
+            cluster_kwargs={},
+            nodes_kwargs=[{"pending_addition": True, "api": True}]
+        )
+        node_db = self.env.nodes[0]
+
+        self.env.network_manager.assign_ips(
+            [node_db.id, node_db.id], "management")
+        management_net = self.db.query(NetworkGroup).filter_by(
+            cluster_id=self.env.clusters[0].id,
+            name='management'
+        ).first()
+        self.assertEqual(
+            self.db.query(IPAddr).filter_by(
+                node=node_db.id, network=management_net.id).count(),
+            1
+        )
+
+        self.assertRaises(
+            errors.ObjectNotFound,
+            self.env.network_manager.assign_ips,
+            [node_db.id, node_db.id + 1000],
+            "management"
+        )
+
+    def test_assign_ips_out_of_ips(self):
+        self.env.create(
+            cluster_kwargs={},
+            nodes_kwargs=[
+                {"pending_addition": True, "api": True},
+                {"pending_addition": True, "api": True}
+            ]
+        )
+        management_net = self.db.query(NetworkGroup).filter_by(
+            cluster_id=self.env.clusters[0].id,
+            name='management'
+        ).first()
+        map(self.db.delete, management_net.ip_ranges)
+        self.db.add(IPAddrRange(
+            first='192.168.0.2',
+            last='192.168.0.2',
+            network_group_id=management_net.id
+        ))
+        self.db.commit()
+
+        self.assertRaises(
+            errors.OutOfIPs,
+            self.env.network_manager.assign_ips,
+            [n.id for n in self.env.nodes],
+            "management"
+        )
+        self.db.rollback()
+
+        ips = self.db.query(IPAddr).filter_by(
+            network=management_net.id
+        ).all()
+        self.assertEqual(ips, [])
+
     def test_assign_vip_is_idempotent(self):
         cluster = self.env.create_cluster(api=True)
         vip = self.env.network_manager.assign_vip(
@@ -269,6 +336,45 @@ class TestNetworkManager(BaseIntegrationTest):
         self.assertEqual(len(admin_ips), 1)
         self.assertEqual(admin_ips[0].ip_addr, '10.0.0.1')
 
+    def test_get_free_ips_skips_used_ips_and_gateway(self):
+        map(self.db.delete, self.db.query(IPAddrRange).all())
+        admin_net = self.env.network_manager.get_admin_network_group()
+        admin_net.gateway = '10.0.0.2'
+        self.db.add_all([
+            IPAddrRange(
+                first='10.0.0.1',
+                last='10.0.0.5',
+                network_group_id=admin_net.id
+            ),
+            IPAddrRange(
+                first='10.0.1.1',
+                last='10.0.1.3',
+                network_group_id=admin_net.id
+            ),
+            IPAddr(ip_addr='10.0.0.4', network=admin_net.id),
+            IPAddr(ip_addr='10.0.0.5', network=admin_net.id),
+            IPAddr(ip_addr='10.0.1.2', network=admin_net.id),
+            IPAddr(ip_addr='10.0.0.10', network=admin_net.id),
+        ])
+        self.db.commit()
+
+        self.assertEqual(
+            self.env.network_manager._get_used_ips(admin_net),
+            [int(IPAddress(ip)) for ip in
+             ('10.0.0.2', '10.0.0.4', '10.0.0.5', '10.0.1.2')]
+        )
+        free_ips = self.env.network_manager.get_free_ips(admin_net.id, 4)
+        self.assertEqual(
+            free_ips,
+            ['10.0.0.1', '10.0.0.3', '10.0.1.1', '10.0.1.3']
+        )
+        self.assertRaises(
+            errors.OutOfIPs,
+            self.env.network_manager.get_free_ips,
+            admin_net.id,
+            5
+        )
+
     @fake_tasks(fake_rpc=False, mock_rpc=False)
     @patch('nailgun.rpc.cast')
     def test_admin_ip_cobbler(self, mocked_rpc):
@@ -325,6 +431,61 @@ class TestNetworkManager(BaseIntegrationTest):
             itertools.product((0, 1), ('eth0',))
         )
 
+    def test_update_interfaces_info_writes_only_changes(self):
+        node = self.env.create_node(
+            api=False, meta=self.env.generate_interfaces_in_meta(3))
+        manager = self.env.network_manager
+        writes = []
+        bind = self.db.get_bind()
+
+        def on_execute(conn, cursor, statement, *args):
+            if 'node_nic_interfaces' in statement.split('\n')[0] and \
+                    statement.startswith(('INSERT', 'UPDATE', 'DELETE')):
+                writes.append(statement.split()[0])
+
+        event.listen(bind, 'before_cursor_execute', on_execute)
+        try:
+            self.assertFalse(manager.update_interfaces_info(node))
+            self.assertEqual(writes, [])
+
+            eth0_id = node.nic_interfaces[0].id
+            meta = deepcopy(node.meta)
+            meta['interfaces'][1]['current_speed'] = 10
+            meta['interfaces'][2] = {
+                'name': 'eth3', 'mac': self.env.generate_random_mac()}
+            node.meta = meta
+            self.assertTrue(manager.update_interfaces_info(node))
+        finally:
+            event.remove(bind, 'before_cursor_execute', on_execute)
+
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT', 'UPDATE'])
+        self.db.refresh(node)
+        self.assertEqual(
+            sorted((n.name, n.current_speed) for n in node.nic_interfaces),
+            [('eth0', 100), ('eth1', 10), ('eth3', None)])
+        self.assertIn(eth0_id, [n.id for n in node.nic_interfaces])
+
+    def test_update_interfaces_info_with_renamed_interface(self):
+        node = self.env.create_node(
+            api=False, meta=self.env.generate_interfaces_in_meta(3))
+        eth2 = [n for n in node.nic_interfaces if n.name == 'eth2'][0]
+        eth2_id, eth2_mac = eth2.id, eth2.mac
+        new_mac = self.env.generate_random_mac()
+
+        # eth1 is removed, eth2 is renamed to eth1 and new NIC is eth2
+        meta = deepcopy(node.meta)
+        meta['interfaces'][1] = dict(meta['interfaces'][2], name='eth1')
+        meta['interfaces'][2] = {'name': 'eth2', 'mac': new_mac}
+        node.meta = meta
+        self.assertTrue(self.env.network_manager.update_interfaces_info(node))
+
+        self.db.refresh(node)
+        interfaces = dict((n.name, n) for n in node.nic_interfaces)
+        self.assertEqual(sorted(interfaces), ['eth0', 'eth1', 'eth2'])
+        self.assertEqual(interfaces['eth1'].id, eth2_id)
+        self.assertEqual(interfaces['eth1'].mac, eth2_mac)
+        self.assertEqual(interfaces['eth2'].mac, new_mac)
+
 
 class TestNovaNetworkManager(BaseIntegrationTest):
 
@@ -417,3 +578,85 @@ class TestNeutronManager(BaseIntegrationTest):
             ])
 
         self.check_networks_assignment(self.env.nodes[0])
+
+    def test_network_topology_is_the_same_as_manager(self):
+        meta = self.env.default_metadata()
+        self.env.set_interfaces_in_meta(
+            meta,
+            [{'name': 'eth0', 'mac': '00:00:00:00:00:11'},
+             {'name': 'eth1', 'mac': '00:00:00:00:00:22'},
+             {'name': 'eth2', 'mac': '00:00:00:00:00:33'}])
+        cluster = self.env.create(
+            cluster_kwargs={
+                'net_provider': 'neutron',
+                'net_segment_type': 'vlan'},
+            nodes_kwargs=[
+                {'roles': ['controller'], 'meta': meta,
+                 'pending_addition': True},
+                {'roles': ['compute'], 'meta': meta,
+                 'pending_addition': True}
+            ])
+        cluster_db = self.db.query(Cluster).get(cluster['id'])
+        objects.NodeCollection.prepare_for_deployment(cluster_db.nodes)
+        self.db.commit()
+        self.db.expire_all()
+
+        topology = NetworkTopology(cluster_db)
+
+        queries = []
+        bind = self.db.get_bind()
+        on_execute = lambda *args: queries.append(args[2])
+        event.listen(bind, 'before_cursor_execute', on_execute)
+        try:
+            networks = dict(
+                (node.id, topology.get_node_networks(node))
+                for node in topology.nodes)
+            private_ifaces = dict(
+                (node.id, topology.get_node_interface_by_netname(
+                    node, 'private'))
+                for node in topology.nodes)
+            roles = dict(
+                (node.id, node.all_roles) for node in topology.nodes)
+            volumes = dict(
+                (node.id, node.attributes.volumes)
+                for node in topology.nodes)
+        finally:
+            event.remove(bind, 'before_cursor_execute', on_execute)
+        self.assertEqual(queries, [])
+        self.assertEqual(
+            sorted(map(list, roles.values())), [['compute'], ['controller']])
+        self.assertTrue(all(volumes.values()))
+
+        for node in topology.nodes:
+            self.assertEqual(
+                networks[node.id], NeutronManager.get_node_networks(node))
+            for netname in ('management', 'storage', 'fuelweb_admin'):
+                self.assertEqual(
+                    topology.get_node_network_by_netname(node, netname),
+                    NeutronManager.get_node_network_by_netname(
+                        node, netname))
+            self.assertEqual(
+                private_ifaces[node.id],
+                NeutronManager.get_node_interface_by_netname(
+                    node.id, 'private'))
+
+    def test_network_topology_of_single_node(self):
+        cluster = self.env.create(
+            cluster_kwargs={},
+            nodes_kwargs=[
+                {'roles': ['controller'], 'pending_addition': True},
+                {'roles': ['compute'], 'pending_addition': True}
+            ])
+        cluster_db = self.db.query(Cluster).get(cluster['id'])
+        objects.NodeCollection.prepare_for_deployment(cluster_db.nodes)
+        self.db.commit()
+        self.db.expire_all()
+        node, other_node = sorted(cluster_db.nodes, key=lambda n: n.id)
+
+        topology = NetworkTopology(cluster_db, [node])
+        self.assertEqual(topology.nodes, [node])
+        self.assertIn('ip_addrs', node.__dict__)
+        self.assertNotIn('ip_addrs', other_node.__dict__)
+        self.assertEqual(
+            topology.get_node_networks(node),
+            NovaNetworkManager.get_node_networks(node))
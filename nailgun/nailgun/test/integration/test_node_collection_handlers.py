@@ -14,11 +14,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from datetime import datetime
+import time
+
+from mock import patch
+from sqlalchemy import event
+
 from nailgun.db.sqlalchemy.models import Node
 from nailgun.db.sqlalchemy.models import Notification
 from nailgun.openstack.common import jsonutils
 from nailgun.test.base import BaseIntegrationTest
 from nailgun.test.base import reverse
+from nailgun.utils.heartbeats import heartbeats
+from nailgun.utils.heartbeats import HeartbeatsBuffer
 
 
 class TestHandlers(BaseIntegrationTest):
@@ -320,6 +328,104 @@ class TestHandlers(BaseIntegrationTest):
         self.assertEqual(resp.status_code, 200)
         self.assertTrue('cached' in response and response['cached'])
 
+    @patch.dict('nailgun.utils.heartbeats.settings.KEEPALIVE',
+                {'flush_interval': 3600})
+    def test_agent_heartbeats_are_buffered(self):
+        node = self.env.create_node(api=False)
+        heartbeats.flush()
+        data = jsonutils.dumps({
+            'mac': node.mac,
+            'manufacturer': 'new',
+            'agent_checksum': 'test'
+        })
+        self.app.put(reverse('NodeAgentHandler'), data,
+                     headers=self.default_headers)
+        self.db.refresh(node)
+        timestamp = node.timestamp
+
+        resp = self.app.put(reverse('NodeAgentHandler'), data,
+                            headers=self.default_headers)
+        self.assertTrue(jsonutils.loads(resp.body)['cached'])
+        self.db.refresh(node)
+        self.assertEqual(node.timestamp, timestamp)
+
+        heartbeats.flush()
+        # heartbeats are committed regardless of current transaction
+        self.db.rollback()
+        self.db.refresh(node)
+        self.assertGreater(node.timestamp, timestamp)
+
+        # older heartbeat doesn't overwrite newer timestamp
+        timestamp = node.timestamp
+        heartbeats.add(node.id, datetime(2014, 1, 1))
+        heartbeats.flush()
+        self.db.refresh(node)
+        self.assertEqual(node.timestamp, timestamp)
+
+    @patch.dict('nailgun.utils.heartbeats.settings.KEEPALIVE',
+                {'flush_interval': 0.1})
+    def test_agent_heartbeats_are_flushed_without_requests(self):
+        node = self.env.create_node(api=False)
+        heartbeat = datetime(2030, 1, 1)
+        HeartbeatsBuffer().add(node.id, heartbeat)
+
+        deadline = time.time() + 10
+        while node.timestamp != heartbeat and time.time() < deadline:
+            time.sleep(0.1)
+            self.db.rollback()
+            self.db.refresh(node)
+        self.assertEqual(node.timestamp, heartbeat)
+
+    def test_agent_heartbeats_flush_failure_is_logged(self):
+        buf = HeartbeatsBuffer()
+        buf._timestamps[1] = datetime.now()
+        with patch('nailgun.utils.heartbeats.engine') as mocked_engine:
+            mocked_engine.begin.side_effect = Exception('db is down')
+            with patch('nailgun.utils.heartbeats.logger.error') as error:
+                buf.flush()
+        self.assertTrue(error.called)
+        self.assertEqual(buf._timestamps.keys(), [1])
+
+    @patch.dict('nailgun.utils.heartbeats.settings.KEEPALIVE',
+                {'flush_interval': 3600})
+    def test_agent_heartbeat_doesnt_load_node(self):
+        node = self.env.create_node(api=False)
+        data = jsonutils.dumps({
+            'mac': node.mac.upper(),
+            'manufacturer': 'new',
+            'agent_checksum': 'test'
+        })
+        self.app.put(reverse('NodeAgentHandler'), data,
+                     headers=self.default_headers)
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: \
+            statements.append(statement)
+        event.listen(self.db.get_bind(), 'before_cursor_execute', listener)
+        try:
+            resp = self.app.put(reverse('NodeAgentHandler'), data,
+                                headers=self.default_headers)
+        finally:
+            event.remove(
+                self.db.get_bind(), 'before_cursor_execute', listener)
+        self.assertEqual(
+            jsonutils.loads(resp.body), {'id': node.id, 'cached': True})
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('SELECT nodes.mac'))
+
+        # offline node is processed by the regular way
+        node.online = False
+        self.db.commit()
+        notifications = self.db.query(Notification).filter_by(
+            node_id=node.id, topic='discover')
+        count = notifications.count()
+        resp = self.app.put(reverse('NodeAgentHandler'), data,
+                            headers=self.default_headers)
+        self.assertEqual(resp.status_code, 200)
+        self.db.refresh(node)
+        self.assertTrue(node.online)
+        self.assertEqual(notifications.count(), count + 1)
+
     def test_agent_updates_node_by_interfaces(self):
         node = self.env.create_node(api=False)
         interface = node.meta['interfaces'][0]
@@ -20,6 +20,7 @@ from nailgun.db.sqlalchemy.models import Notification
 from nailgun.db.sqlalchemy.models import Task
 from nailgun.errors import errors
 from nailgun import notifier
+from nailgun import objects
 from nailgun.openstack.common import jsonutils
 from nailgun.rpc import receiver as rcvr
 from nailgun.test.base import BaseIntegrationTest
@@ -163,3 +164,61 @@ class TestNotification(BaseIntegrationTest):
             notifications[0].message,
             "Cluster deletion fake error"
         )
+
+    def test_notifications_of_failed_nodes_are_not_duplicated(self):
+        self.env.create(nodes_kwargs=[{}, {}, {}])
+        cluster = self.env.clusters[0]
+        receiver = rcvr.NailgunReceiver()
+
+        task = Task(
+            uuid=str(uuid.uuid4()),
+            name="deployment",
+            cluster_id=cluster.id
+        )
+        self.db.add(task)
+        self.db.commit()
+
+        kwargs = {
+            'task_uuid': task.uuid,
+            'status': 'running',
+            'nodes': [
+                {'uid': node.id, 'status': 'error', 'progress': 50,
+                 'error_type': 'deploy', 'online': False}
+                for node in self.env.nodes
+            ]
+        }
+
+        receiver.deploy_resp(**kwargs)
+        self.db.commit()
+        receiver.deploy_resp(**kwargs)
+
+        notifications = self.db.query(Notification).filter_by(
+            topic='error'
+        ).all()
+        self.assertEqual(len(notifications), 3)
+        self.assertEqual(
+            sorted(n.node_id for n in notifications),
+            sorted(node.id for node in self.env.nodes))
+
+    def test_create_many_notifications(self):
+        node = self.env.create_node(api=False)
+        task_uuid = str(uuid.uuid4())
+        notifier.notify("error", "Existing", node_id=node.id,
+                        task_uuid=task_uuid)
+
+        created = objects.NotificationCollection.create_many([
+            {'topic': 'error', 'message': 'Existing',
+             'node_id': node.id, 'task_uuid': task_uuid},
+            {'topic': 'error', 'message': 'New',
+             'node_id': node.id, 'task_uuid': task_uuid},
+            {'topic': 'error', 'message': 'New',
+             'node_id': node.id, 'task_uuid': task_uuid},
+            {'topic': 'done', 'message': 'Without task'},
+            {'topic': 'done', 'message': 'Without task'},
+        ])
+
+        self.assertEqual(created, 3)
+        self.assertEqual(
+            sorted(n.message for n in self.db.query(Notification).filter(
+                Notification.topic != 'discover')),
+            ['Existing', 'New', 'Without task', 'Without task'])
@@ -17,6 +17,8 @@
 import random
 import uuid
 
+from sqlalchemy import event
+
 from nailgun.db.sqlalchemy.models import Attributes
 from nailgun.db.sqlalchemy.models import Cluster
 from nailgun.db.sqlalchemy.models import IPAddr
@@ -117,6 +119,42 @@ class TestVerifyNetworks(BaseIntegrationTest):
         self.assertEqual(task.message, '')
         self.assertEqual(task.result, error_nodes)
 
+    def test_verify_networks_absent_vlans_nodes_data_loaded_in_bulk(self):
+        self.env.create(
+            cluster_kwargs={},
+            nodes_kwargs=[{"api": False}] * 3
+        )
+        nets_sent = [{'iface': 'eth0', 'vlans': range(100, 105)},
+                     {'iface': 'eth9', 'vlans': [100]}]
+        nets_resp = [{'iface': 'eth0', 'vlans': range(101, 105)},
+                     {'iface': 'eth9', 'vlans': []}]
+        cached_nodes = [{'uid': node.id, 'networks': nets_sent}
+                        for node in self.env.nodes]
+        nodes = [{'uid': node.id, 'networks': nets_resp}
+                 for node in self.env.nodes]
+
+        queries = []
+        bind = self.db.get_bind()
+        on_execute = lambda *args: queries.append(args[2])
+        event.listen(bind, 'before_cursor_execute', on_execute)
+        try:
+            error_nodes = self.receiver._get_absent_vlans(
+                cached_nodes, nodes)
+        finally:
+            event.remove(bind, 'before_cursor_execute', on_execute)
+
+        # names of nodes, MACs of NICs and bonds
+        self.assertEqual(len(queries), 3)
+        expected = []
+        for node in self.env.nodes:
+            expected.append({'uid': node.id, 'interface': 'eth0',
+                             'name': node.name, 'absent_vlans': [100],
+                             'mac': node.interfaces[0].mac})
+            expected.append({'uid': node.id, 'interface': 'eth9',
+                             'name': node.name, 'absent_vlans': [100],
+                             'mac': 'unknown'})
+        self.assertEqual(error_nodes, expected)
+
     def test_verify_networks_resp_error_with_removed_node(self):
         self.env.create(
             cluster_kwargs={},
@@ -857,6 +895,50 @@ class TestConsumer(BaseIntegrationTest):
         self.assertEqual(task.progress, 20)
         self.assertEqual(task.status, "running")
 
+    def test_node_deploy_resp_progress_only(self):
+        self.env.create(
+            cluster_kwargs={},
+            nodes_kwargs=[
+                {"api": False, "status": "deploying"},
+                {"api": False, "status": "deploying"}]
+        )
+        node, node2 = self.env.nodes
+
+        task = Task(
+            uuid=str(uuid.uuid4()),
+            name="deploy",
+            status="running",
+            cluster_id=self.env.clusters[0].id
+        )
+        self.db.add(task)
+        self.db.commit()
+
+        kwargs = {'task_uuid': task.uuid,
+                  'nodes': [{'uid': node.id, 'progress': 40},
+                            {'uid': node2.id, 'progress': 60,
+                             'status': 'deploying'}]}
+        self.assertTrue(
+            self.receiver.is_progress_only_update('deploy_resp', kwargs))
+        self.receiver.deploy_resp(**kwargs)
+        self.db.refresh(node)
+        self.db.refresh(node2)
+        self.db.refresh(task)
+        self.assertEqual((node.progress, node2.progress), (40, 60))
+        self.assertEqual(task.progress, 50)
+        self.assertEqual(task.status, "running")
+
+    def test_is_progress_only_update(self):
+        is_progress_only = self.receiver.is_progress_only_update
+        nodes = [{'uid': 1, 'progress': 10, 'status': 'provisioning'}]
+        self.assertTrue(is_progress_only('provision_resp', {'nodes': nodes}))
+        self.assertFalse(is_progress_only('remove_nodes_resp', {}))
+        self.assertFalse(is_progress_only(
+            'deploy_resp', {'status': 'ready', 'progress': 100}))
+        self.assertFalse(is_progress_only(
+            'deploy_resp', {'nodes': [{'uid': 1, 'status': 'error'}]}))
+        self.assertFalse(is_progress_only(
+            'deploy_resp', {'nodes': [{'uid': 1, 'online': False}]}))
+
     def test_node_deletion_subtask_progress(self):
         supertask = Task(
             uuid=str(uuid.uuid4()),
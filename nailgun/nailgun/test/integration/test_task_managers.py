@@ -34,6 +34,7 @@ from nailgun.db.sqlalchemy.models import Notification
 from nailgun.db.sqlalchemy.models import Task
 from nailgun.errors import errors
 from nailgun.openstack.common import jsonutils
+from nailgun.rpc.receiver import NailgunReceiver
 from nailgun.task.manager import ApplyChangesTaskManager
 from nailgun.test.base import BaseIntegrationTest
 from nailgun.test.base import fake_tasks
@@ -91,6 +92,96 @@ class TestTaskManagers(BaseIntegrationTest):
             self.assertEqual(n.status, NODE_STATUSES.ready)
             self.assertEqual(n.progress, 100)
 
+    @fake_tasks(godmode=True)
+    @patch('nailgun.task.executor.settings.DEFERRED_TASKS', True)
+    @patch('nailgun.task.executor.rpc.cast_nailgun')
+    def test_deployment_is_deferred_to_receiver(self, cast_mock):
+        self.env.create(
+            nodes_kwargs=[
+                {"pending_addition": True},
+            ]
+        )
+        supertask = self.env.launch_deployment()
+        self.assertEqual(supertask.name, TASK_NAMES.deploy)
+        self.assertEqual(supertask.status, TASK_STATUSES.running)
+        self.assertEqual(len(supertask.subtasks), 0)
+
+        message = cast_mock.call_args[0][0]
+        self.assertEqual(message['method'], 'apply_changes')
+        self.assertEqual(message['args'], {
+            'task_uuid': supertask.uuid,
+            'cluster_id': self.env.clusters[0].id})
+
+        NailgunReceiver.apply_changes(**message['args'])
+        self.env.wait_ready(supertask, 60)
+        self.assertEqual(len(supertask.subtasks), 2)
+        self.env.refresh_nodes()
+        self.assertEqual(self.env.nodes[0].status, NODE_STATUSES.ready)
+
+        # message delivered again is ignored
+        NailgunReceiver.apply_changes(**message['args'])
+        self.assertEqual(supertask.status, TASK_STATUSES.ready)
+
+    @fake_tasks()
+    @patch('nailgun.task.executor.settings.DEFERRED_TASKS', True)
+    @patch('nailgun.task.executor.rpc.cast_nailgun')
+    @patch('nailgun.task.manager.ApplyChangesTaskManager.'
+           'check_before_deployment')
+    def test_deferred_deployment_error_is_set_to_supertask(
+            self, check_mock, cast_mock):
+        check_mock.side_effect = Exception('Unexpected failure')
+        self.env.create(
+            nodes_kwargs=[
+                {"pending_addition": True},
+            ]
+        )
+        supertask = self.env.launch_deployment()
+
+        message = cast_mock.call_args[0][0]
+        self.assertRaises(
+            Exception, NailgunReceiver.apply_changes, **message['args'])
+        self.env.wait_error(supertask, 60, 'Unexpected failure')
+
+    @fake_tasks()
+    @patch('nailgun.task.executor.settings.DEFERRED_TASKS', True)
+    @patch('nailgun.task.executor.rpc.cast_nailgun')
+    def test_interrupted_deferred_deployment_is_failed(self, cast_mock):
+        self.env.create(
+            nodes_kwargs=[
+                {"pending_addition": True},
+            ]
+        )
+        supertask = self.env.launch_deployment()
+        supertask.create_subtask(TASK_NAMES.provision)
+        self.db.commit()
+
+        NailgunReceiver.apply_changes(**cast_mock.call_args[0][0]['args'])
+        self.assertEqual(supertask.status, TASK_STATUSES.error)
+        self.assertIn('interrupted', supertask.message)
+
+    @fake_tasks()
+    @patch('nailgun.task.executor.settings.DEFERRED_TASKS', True)
+    @patch('nailgun.task.executor.rpc.cast_nailgun')
+    def test_deferred_deployment_cast_failure(self, cast_mock):
+        cast_mock.side_effect = Exception('Broker is down')
+        self.env.create(
+            nodes_kwargs=[
+                {"pending_addition": True},
+            ]
+        )
+        resp = self.app.put(
+            reverse(
+                'ClusterChangesHandler',
+                kwargs={'cluster_id': self.env.clusters[0].id}),
+            headers=self.default_headers,
+            expect_errors=True)
+        self.assertEqual(resp.status_code, 500)
+
+        supertask = self.db.query(Task).filter_by(
+            name=TASK_NAMES.deploy).one()
+        self.assertEqual(supertask.status, TASK_STATUSES.error)
+        self.assertEqual(supertask.message, 'Broker is down')
+
     @fake_tasks(fake_rpc=False, mock_rpc=False)
     @patch('nailgun.rpc.cast')
     def test_do_not_send_node_to_orchestrator_which_has_status_discover(
@@ -387,6 +478,7 @@ class TestTaskManagers(BaseIntegrationTest):
         rpc.receiver.NailgunReceiver.deploy_resp(nodes=[
             {'uid': 666, 'id': 666, 'status': 'discover'}
         ], task_uuid=task.uuid)
+        self.db.commit()
         self.assertRaises(errors.WrongNodeStatus, manager.execute)
 
     @fake_tasks()
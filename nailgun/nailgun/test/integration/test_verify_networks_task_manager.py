@@ -16,11 +16,13 @@
 
 import copy
 
+from mock import patch
 import unittest2
 
 from nailgun.consts import CLUSTER_STATUSES
 from nailgun.consts import NETWORK_INTERFACE_TYPES
 from nailgun.consts import OVS_BOND_MODES
+from nailgun.network import vlan_ranges
 from nailgun.openstack.common import jsonutils
 from nailgun.test.base import BaseIntegrationTest
 from nailgun.test.base import fake_tasks
@@ -341,7 +343,7 @@ class TestNetworkVerificationWithBonds(BaseIntegrationTest):
 
     @property
     def expected_args(self):
-        expected_networks = [{u'vlans': [0, 101, 102], u'iface': u'eth0'},
+        expected_networks = [{u'vlans': [0, [101, 102]], u'iface': u'eth0'},
                              {u'vlans': [0], u'iface': u'eth1'},
                              {u'vlans': [0], u'iface': u'eth2'}]
         _expected_args = []
@@ -452,5 +454,32 @@ class TestVerifyNeutronVlan(BaseIntegrationTest):
         for node in task.cache['args']['nodes']:
             for net in node['networks']:
                 if net['iface'] == priv_nics[node['uid']]:
-                    self.assertTrue(vlan_rng <= set(net['vlans']))
+                    self.assertTrue(
+                        vlan_rng <= set(vlan_ranges.expand(net['vlans'])))
                     break
+
+    @fake_tasks(fake_rpc=False)
+    def test_network_verification_vlans_ranges(self, mocked_rpc):
+        task = self.env.launch_verify_networks()
+        message = mocked_rpc.call_args[0][1]
+
+        cached_vlans = [net['vlans'] for node in task.cache['args']['nodes']
+                        for net in node['networks']]
+        self.assertTrue(any(
+            isinstance(vlan, list) for vlans in cached_vlans
+            for vlan in vlans))
+
+        # orchestrator gets explicit lists of vlans by default
+        for msg in [message] + message['subtasks']:
+            sent_vlans = [net['vlans'] for node in msg['args']['nodes']
+                          for net in node['networks']]
+            self.assertEqual(
+                sent_vlans, [vlan_ranges.expand(v) for v in cached_vlans])
+
+    @fake_tasks(fake_rpc=False)
+    @patch('nailgun.task.task.settings.VERIFY_NETWORKS_VLAN_RANGES', True)
+    def test_network_verification_vlans_ranges_sent(self, mocked_rpc):
+        task = self.env.launch_verify_networks()
+        message = mocked_rpc.call_args[0][1]
+        self.assertEqual(
+            message['args']['nodes'], task.cache['args']['nodes'])
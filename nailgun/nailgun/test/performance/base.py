@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmarks are not collected by the regular test run, because module
+names don't match nose test pattern. Run them explicitly, e.g.::
+
+    nosetests nailgun/test/performance/rpc_cast_benchmark.py
+"""
+
+import sys
+import timeit
+
+
+class BenchmarkMixin(object):
+
+    repeat = 3
+
+    def measure(self, func, number=1):
+        """Returns best wall time of single func call in seconds
+        """
+        timer = timeit.Timer(func)
+        return min(timer.repeat(repeat=self.repeat, number=number)) / number
+
+    def report_timing(self, name, timing):
+        """Writes per call timing to stderr, which is not captured
+        by nose
+        """
+        sys.stderr.write("\n{0}: {1:.6f}s\n".format(name, timing))
+
+    def report(self, name, before, after):
+        """Writes comparison of per call timings to stderr,
+        which is not captured by nose
+        """
+        sys.stderr.write(
+            "\n{0}: before {1:.6f}s, after {2:.6f}s, "
+            "speedup x{3:.2f}\n".format(
+                name, before, after, before / after if after else 0
+            )
+        )
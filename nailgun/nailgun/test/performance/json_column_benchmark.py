@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from mock import patch
+
+from nailgun.db.sqlalchemy.models import fields
+from nailgun.db.sqlalchemy.models import Node
+from nailgun.openstack.common import jsonutils
+from nailgun.test.base import BaseTestCase
+from nailgun.test.performance.base import BenchmarkMixin
+
+
+class NoJSONCache(object):
+    """JSON decoding as it was before caching
+    """
+
+    def loads(self, text):
+        return jsonutils.loads(text)
+
+
+class JSONColumnBenchmark(BaseTestCase, BenchmarkMixin):
+    """Measures loading of nodes list. NoCacheQuery populates existing
+    instances, so JSON columns are decoded on every query.
+    """
+
+    nodes_count = 500
+
+    def setUp(self):
+        super(JSONColumnBenchmark, self).setUp()
+        cluster = self.env.create_cluster(api=False)
+        for _ in xrange(self.nodes_count):
+            self.env.create_node(api=False, cluster_id=cluster['id'])
+        self.db.commit()
+
+    def load_nodes(self):
+        nodes = self.db.query(Node).all()
+        self.assertEqual(len(nodes), self.nodes_count)
+
+    def test_load_nodes(self):
+        with patch.object(fields, 'json_cache', NoJSONCache()):
+            before = self.measure(self.load_nodes)
+
+        fields.json_cache.clear()
+        after = self.measure(self.load_nodes)
+
+        self.report('500 nodes query', before, after)
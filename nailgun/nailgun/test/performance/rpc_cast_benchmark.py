@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from kombu import Connection
+from mock import patch
+
+import nailgun.rpc as rpc
+from nailgun.test.base import BaseUnitTest
+from nailgun.test.performance.base import BenchmarkMixin
+
+
+class RPCCastBenchmark(BaseUnitTest, BenchmarkMixin):
+    """Measures time of cast of big deployment message. In-memory
+    transport is used, so real broker adds network round trips.
+    """
+
+    nodes_count = 300
+    casts = 50
+    conn_str = 'memory://'
+
+    def setUp(self):
+        nodes = [
+            {
+                'uid': str(i),
+                'role': 'compute',
+                'fqdn': 'node-{0}.domain.tld'.format(i),
+                'network_data': dict(
+                    ('eth{0}'.format(n), {'ip': '10.0.{0}.{1}'.format(n, i)})
+                    for n in range(4)
+                ),
+            } for i in range(self.nodes_count)
+        ]
+        self.message = {
+            'method': 'deploy',
+            'respond_to': 'deploy_resp',
+            'args': {
+                'task_uuid': 'fake-uuid',
+                'deployment_info': [
+                    dict(node, nodes=nodes) for node in nodes[:10]
+                ],
+            },
+        }
+
+    def test_casts_per_second(self):
+        def cast_all():
+            for _ in xrange(self.casts):
+                rpc.cast('naily', self.message)
+
+        with patch.object(rpc, 'connection', Connection(self.conn_str)):
+            timing = self.measure(cast_all) / self.casts
+
+        self.report_timing('rpc.cast, seconds per cast', timing)
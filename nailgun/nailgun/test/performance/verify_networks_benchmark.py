@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nailgun.network import vlan_ranges
+from nailgun.rpc.receiver import NailgunReceiver
+from nailgun.test.base import BaseIntegrationTest
+from nailgun.test.performance.base import BenchmarkMixin
+
+
+class VerifyNetworksBenchmark(BaseIntegrationTest, BenchmarkMixin):
+    """Measures comparison of received vlans with expected ones for
+    nodes with several interfaces and a lot of vlans. Every second node
+    didn't receive one vlan on every interface.
+    """
+
+    nodes_count = 200
+    ifaces_count = 4
+    vlans = range(1000, 2000)
+
+    def setUp(self):
+        super(VerifyNetworksBenchmark, self).setUp()
+        cluster = self.env.create_cluster(api=False)
+        for _ in xrange(self.nodes_count):
+            self.env.create_node(api=False, cluster_id=cluster['id'])
+        self.db.commit()
+
+        self.cached_nodes = []
+        self.nodes = []
+        for i, node in enumerate(self.env.nodes):
+            ifaces = ['eth{0}'.format(n) for n in range(self.ifaces_count)]
+            received_vlans = self.vlans[:-1] if i % 2 else self.vlans
+            self.cached_nodes.append({
+                'uid': node.id,
+                'networks': [{'iface': iface,
+                              'vlans': vlan_ranges.compress(self.vlans)}
+                             for iface in ifaces]})
+            self.nodes.append({
+                'uid': node.id,
+                'networks': [{'iface': iface, 'vlans': received_vlans}
+                             for iface in reversed(ifaces)]})
+
+    def test_absent_vlans(self):
+        def absent_vlans():
+            return NailgunReceiver._get_absent_vlans(
+                self.cached_nodes, self.nodes)
+
+        self.assertEqual(len(absent_vlans()), self.nodes_count * 2)
+        self.report_timing(
+            '200 nodes x 4 interfaces x 1000 vlans verification',
+            self.measure(absent_vlans))
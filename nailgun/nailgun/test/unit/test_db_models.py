@@ -14,10 +14,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import marshal
 from random import randint
 
+from nailgun.db import versioned_identity
 from nailgun.db.sqlalchemy.models import Cluster
+from nailgun.db.sqlalchemy.models.fields import JSONCache
+from nailgun.db.sqlalchemy.models import Node
 from nailgun.test.base import BaseTestCase
+from nailgun.test.base import BaseUnitTest
 
 
 class TestDbModels(BaseTestCase):
@@ -33,3 +39,69 @@ class TestDbModels(BaseTestCase):
         cluster = Cluster(**cluster_data)
         self.db.add(cluster)
         self.db.commit()
+
+    def test_json_field_values_are_not_shared(self):
+        node = self.env.create_node(api=False)
+        meta = self.db.query(Node).get(node.id).meta
+        meta['cpu']['total'] = -1
+        self.db.expire_all()
+
+        self.assertNotEqual(
+            self.db.query(Node).get(node.id).meta['cpu']['total'], -1)
+
+    def test_versioned_identity_skips_unchanged_rows(self):
+        self.env.create(nodes_kwargs=[{'roles': ['controller']}])
+        node = self.env.nodes[0]
+        self.db.commit()
+        self.db.query(Node).get(node.id)
+
+        # pretend that object was changed in memory only,
+        # refreshing query overwrites it
+        node.__dict__['name'] = 'stale'
+        self.db.query(Node).get(node.id)
+        self.assertNotEqual(node.name, 'stale')
+
+        self.assertEqual(len(node.cluster.nodes), 1)
+        self.assertTrue(node.nic_interfaces)
+        node.__dict__['name'] = 'stale'
+        with versioned_identity(self.db):
+            self.db.query(Node).get(node.id)
+            self.assertEqual(node.name, 'stale')
+            # loaded collections are reloaded on access
+            self.assertNotIn('nic_interfaces', node.__dict__)
+            self.assertTrue(node.nic_interfaces)
+
+            # row changed by another session is refreshed
+            self.db.connection().execute(
+                Node.__table__.update().where(
+                    Node.id == node.id).values(name='renamed'))
+            self.db.query(Node).get(node.id)
+            self.assertEqual(node.name, 'renamed')
+
+
+class TestJSONCache(BaseUnitTest):
+
+    def test_loads_returns_copies(self):
+        cache = JSONCache(min_length=0)
+        text = '{"a": [1, 2.5, "x", null, true]}'
+        first = cache.loads(text)
+        second = cache.loads(text)
+        self.assertEqual(first, {u'a': [1, 2.5, u'x', None, True]})
+        self.assertEqual(first, second)
+        self.assertIsNot(first['a'], second['a'])
+
+    def test_least_recently_used_evicted(self):
+        entry_size = len(marshal.dumps([1]))
+        cache = JSONCache(max_bytes=entry_size * 2, min_length=0)
+        for text in ('[1]', '[2]', '[1]', '[3]'):
+            cache.loads(text)
+        self.assertEqual(
+            cache.cache.keys(),
+            [hashlib.md5('[1]').digest(), hashlib.md5('[3]').digest()])
+        self.assertEqual(cache.bytes, entry_size * 2)
+
+    def test_long_texts_arent_cached(self):
+        cache = JSONCache(min_length=0, max_length=10)
+        self.assertEqual(cache.loads('[1, 2, 3, 4, 5]'), [1, 2, 3, 4, 5])
+        self.assertEqual(cache.loads('[1]'), [1])
+        self.assertEqual(cache.cache.keys(), [hashlib.md5('[1]').digest()])
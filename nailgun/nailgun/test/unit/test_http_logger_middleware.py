@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import mock
+import webob
+
+from nailgun.logger import HTTPLoggerMiddleware
+from nailgun.test.base import BaseUnitTest
+
+
+@mock.patch('nailgun.logger.make_api_logger')
+class TestHTTPLoggerMiddleware(BaseUnitTest):
+
+    def get_environ(self, body):
+        fake_req = webob.Request.blank(
+            '/api/nodes/12/disks', method='PUT', body=body)
+        fake_req.environ.update({
+            'REQUEST_URI': '/api/nodes/12/disks',
+            'REMOTE_PORT': '40000'})
+        return fake_req.environ
+
+    def call_middleware(self, app, env):
+        middleware = HTTPLoggerMiddleware(app)
+        return ''.join(middleware(env, mock.Mock()))
+
+    def test_body_is_not_read_if_debug_disabled(self, mock_make_logger):
+        api_logger = mock_make_logger.return_value
+        api_logger.isEnabledFor.return_value = False
+        env = self.get_environ('{"mac": "00:00:00:00:00:00"}')
+        wsgi_input = env['wsgi.input']
+
+        self.call_middleware(mock.Mock(return_value=['']), env)
+
+        self.assertIs(env['wsgi.input'], wsgi_input)
+        self.assertFalse(api_logger.debug.called)
+
+    @mock.patch('nailgun.settings.settings.API_LOG_BODY_MAX_LENGTH', 4)
+    def test_long_body_is_truncated(self, mock_make_logger):
+        api_logger = mock_make_logger.return_value
+        api_logger.isEnabledFor.return_value = True
+        env = self.get_environ('a' * 10)
+
+        def app(env, start_response):
+            return [env['wsgi.input'].read()]
+
+        self.assertEqual(self.call_middleware(app, env), 'a' * 10)
+        self.assertEqual(
+            api_logger.debug.call_args[0][-1], 'aaaa... (10 bytes)')
+
+    def test_response_latency_and_size_are_logged(self, mock_make_logger):
+        api_logger = mock_make_logger.return_value
+        api_logger.isEnabledFor.return_value = False
+
+        def app(env, start_response):
+            start_response('200 OK', [])
+            return ['ab', 'cde']
+
+        self.call_middleware(app, self.get_environ(''))
+
+        level = api_logger.log.call_args[0][0]
+        extra = api_logger.log.call_args[1]['extra']
+        self.assertEqual(level, logging.INFO)
+        self.assertEqual(extra['route'], '/api/nodes/{id}/disks')
+        self.assertEqual(extra['method'], 'PUT')
+        self.assertEqual(extra['status'], '200 OK')
+        self.assertEqual(extra['size'], 5)
+        self.assertGreaterEqual(extra['latency'], 0)
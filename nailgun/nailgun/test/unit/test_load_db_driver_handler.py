@@ -17,11 +17,17 @@
 import datetime
 import unittest
 
+from sqlalchemy import exc as sa_exc
 import web
+from webtest import app as webtest_app
 
 from nailgun.api.v1.handlers import load_db_driver
+from nailgun.app import build_app
 from nailgun.db import db
 from nailgun.db.sqlalchemy import models
+from nailgun.openstack.common import jsonutils
+from nailgun.test.base import BaseIntegrationTest
+from nailgun.test.base import reverse
 
 
 class TestLoadDbDriverWithSAExceptions(unittest.TestCase):
@@ -77,3 +83,35 @@ class TestLoadDbDriverWithSAExceptions(unittest.TestCase):
             db.flush()
 
         self.assertRaises(AssertionError, load_db_driver, handler)
+
+    def test_sa_error_in_streamed_response(self):
+        def handler():
+            db.execute('SELECT * FROM unknown_table')
+            yield '[]'
+
+        self.assertRaises(
+            sa_exc.ProgrammingError, load_db_driver, handler)
+
+    def test_streamed_response(self):
+        def handler():
+            yield '['
+            yield ']'
+
+        self.assertEqual(''.join(load_db_driver(handler)), '[]')
+
+
+class TestLoadDbDriverStreaming(BaseIntegrationTest):
+
+    def test_streamed_collection_larger_than_yield_per(self):
+        for i in xrange(250):
+            self.db.add(models.Node(
+                mac='60:a4:4c:35:{0:02x}:{1:02x}'.format(i // 256, i % 256),
+                timestamp=datetime.datetime.now()))
+        self.db.commit()
+
+        app = webtest_app.TestApp(
+            build_app(db_driver=load_db_driver).wsgifunc())
+        resp = app.get(reverse('NodeCollectionHandler'),
+                       headers=self.default_headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(jsonutils.loads(resp.body)), 250)
@@ -17,13 +17,14 @@
 import os
 import shutil
 import tempfile
+import threading
 import time
 
 from mock import Mock
 from mock import patch
 
 import nailgun
-from nailgun.api.v1.handlers.logs import read_backwards
+from nailgun.api.v1.handlers.logs import log_watcher
 from nailgun.db.sqlalchemy.models import Role
 from nailgun.errors import errors
 from nailgun.openstack.common import jsonutils
@@ -33,6 +34,10 @@ from nailgun.task.task import DumpTask
 from nailgun.test.base import BaseIntegrationTest
 from nailgun.test.base import fake_tasks
 from nailgun.test.base import reverse
+from nailgun.utils.logs import get_reader
+from nailgun.utils.logs import LogReader
+from nailgun.utils.logs import LogTail
+from nailgun.utils.logs import LogWatcher
 
 
 class TestLogs(BaseIntegrationTest):
@@ -44,6 +49,7 @@ class TestLogs(BaseIntegrationTest):
         regexp = (r'^(?P<date>\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}):'
                   '(?P<level>\w+):(?P<text>.+)$')
         settings.update({
+            'LOG_INDEX_DIR': os.path.join(self.log_dir, 'index'),
             'LOGS': [
                 {
                     'id': 'nailgun',
@@ -67,6 +73,7 @@ class TestLogs(BaseIntegrationTest):
         })
 
     def tearDown(self):
+        log_watcher.tails.clear()
         shutil.rmtree(self.log_dir)
         super(TestLogs, self).tearDown()
 
@@ -175,50 +182,221 @@ class TestLogs(BaseIntegrationTest):
         self.assertEqual(response['entries'], log_entries)
         settings.LOGS[0]['multiline'] = False
 
-    def test_backward_reader(self):
-        f = tempfile.TemporaryFile(mode='r+')
-        forward_lines = []
-        backward_lines = []
-
-        # test empty files
-        forward_lines = list(f)
-        backward_lines = list(read_backwards(f))
-        backward_lines.reverse()
-        self.assertEqual(forward_lines, backward_lines)
-
-        # filling file with content
-        contents = [
-            'Lorem ipsum dolor sit amet, consectetur adipisicing elit, sed do',
-            'eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut',
-            'enim ad minim veniam, quis nostrud exercitation ullamco laboris',
-            'nisi ut aliquip ex ea commodo consequat. Duis aute irure dolor',
-            'in reprehenderit in voluptate velit esse cillum dolore eu fugiat',
-            'nulla pariatur. Excepteur sint occaecat cupidatat non proident,',
-            'sunt in culpa qui officia deserunt mollit anim id est laborum.',
+    def _get_log_entries(self, **params):
+        params.setdefault('source', settings.LOGS[0]['id'])
+        resp = self.app.get(
+            reverse('LogEntryCollectionHandler'),
+            params=params,
+            headers=self.default_headers
+        )
+        self.assertEqual(200, resp.status_code)
+        return jsonutils.loads(resp.body)
+
+    def _make_log_entries(self, count, levels):
+        start = time.mktime(time.strptime('2014-06-01 00:00:00',
+                                          settings.UI_LOG_DATE_FORMAT))
+        return [
+            [
+                time.strftime(settings.UI_LOG_DATE_FORMAT,
+                              time.localtime(start + i * 60)),
+                levels[i % len(levels)],
+                'text{0}'.format(i),
+            ] for i in xrange(count)
         ]
-        for i in range(5):
-            for line in contents:
-                f.write('%s\n' % line)
-
-        # test with different buffer sizes
-        for bufsize in (1, 5000):
-            f.seek(0)
-
-            # test full file reading
-            forward_lines = list(f)
-            backward_lines = list(read_backwards(f, bufsize))
-            backward_lines.reverse()
-            self.assertEqual(forward_lines, backward_lines)
-
-            # test partial file reading from middle to beginning
-            forward_lines = []
-            for i in range(2 * len(contents)):
-                forward_lines.append(f.readline())
-            backward_lines = list(read_backwards(f, bufsize))
-            backward_lines.reverse()
-            self.assertEqual(forward_lines, backward_lines)
-
-        f.close()
+
+    @patch('nailgun.utils.logs.BLOCK_SIZE', 256)
+    def test_log_entries_filtered_by_date_and_level(self):
+        levels = ['DEBUG', 'INFO', 'ERROR']
+        settings.LOGS[0]['levels'] = levels
+        log_entries = self._make_log_entries(100, levels)
+        self._create_logfile_for_node(settings.LOGS[0], log_entries)
+
+        response = self._get_log_entries(
+            date_after=log_entries[10][0],
+            date_before=log_entries[20][0])
+        response['entries'].reverse()
+        self.assertEqual(response['entries'], log_entries[10:20])
+
+        response = self._get_log_entries(level='ERROR')
+        response['entries'].reverse()
+        self.assertEqual(response['entries'], log_entries[2::3])
+
+        response = self._get_log_entries(
+            level='INFO',
+            date_before=log_entries[50][0],
+            truncate_log=1,
+            max_entries=5)
+        self.assertTrue(response['has_more'])
+        response['entries'].reverse()
+        expected = [e for e in log_entries[:50] if e[1] != 'DEBUG'][-5:]
+        self.assertEqual(response['entries'], expected)
+        settings.LOGS[0]['levels'] = []
+
+    @patch('nailgun.utils.logs.BLOCK_SIZE', 256)
+    def test_log_index_updated_on_append(self):
+        log_entries = self._make_log_entries(60, ['INFO'])
+        self._create_logfile_for_node(settings.LOGS[0], log_entries[:40])
+
+        response = self._get_log_entries()
+        response['entries'].reverse()
+        self.assertEqual(response['entries'], log_entries[:40])
+        index_files = os.listdir(settings.LOG_INDEX_DIR)
+        self.assertEqual(len(index_files), 1)
+
+        to_byte = response['to']
+        with open(self.local_log_file, 'a') as f:
+            for log_entry in log_entries[40:]:
+                f.write(':'.join(log_entry) + '\n')
+
+        response = self._get_log_entries(to=to_byte)
+        self.assertTrue(response['has_more'])
+        response['entries'].reverse()
+        self.assertEqual(response['entries'], log_entries[40:])
+
+        response = self._get_log_entries()
+        response['entries'].reverse()
+        self.assertEqual(response['entries'], log_entries)
+
+        # rotated log file is reindexed
+        self._create_logfile_for_node(settings.LOGS[0], log_entries[:3])
+        response = self._get_log_entries()
+        response['entries'].reverse()
+        self.assertEqual(response['entries'], log_entries[:3])
+
+    def test_log_entry_follow_handler(self):
+        log_entries = self._make_log_entries(10, ['INFO'])
+        self._create_logfile_for_node(settings.LOGS[0], log_entries[:5])
+        to_byte = os.stat(self.local_log_file).st_size
+
+        resp = self.app.get(
+            reverse('LogEntryFollowHandler'),
+            params={'source': settings.LOGS[0]['id'],
+                    'to': to_byte, 'timeout': 0},
+            headers=self.default_headers
+        )
+        self.assertEqual(200, resp.status_code)
+        response = jsonutils.loads(resp.body)
+        self.assertEqual(response['entries'], [])
+        self.assertEqual(response['to'], to_byte)
+
+        with open(self.local_log_file, 'a') as f:
+            for log_entry in log_entries[5:]:
+                f.write(':'.join(log_entry) + '\n')
+
+        with patch('nailgun.api.v1.handlers.logs.log_watcher.interval', 0.1):
+            resp = self.app.get(
+                reverse('LogEntryFollowHandler'),
+                params={'source': settings.LOGS[0]['id'],
+                        'to': to_byte, 'timeout': 5},
+                headers=self.default_headers
+            )
+        self.assertEqual(200, resp.status_code)
+        response = jsonutils.loads(resp.body)
+        response['entries'].reverse()
+        self.assertEqual(response['entries'], log_entries[5:])
+        self.assertEqual(response['to'],
+                         os.stat(self.local_log_file).st_size)
+
+    def test_log_tail_shared_between_followers(self):
+        log_entries = self._make_log_entries(6, ['INFO'])
+        self._create_logfile_for_node(settings.LOGS[0], log_entries[:2])
+        watcher = LogWatcher()
+        tail = watcher.get_tail(self.local_log_file, settings.LOGS[0])
+        self.assertIs(
+            tail, watcher.get_tail(self.local_log_file, settings.LOGS[0]))
+        start = tail.size
+
+        with open(self.local_log_file, 'a') as f:
+            for log_entry in log_entries[2:]:
+                f.write(':'.join(log_entry) + '\n')
+        with patch.object(tail.reader, 'read',
+                          wraps=tail.reader.read) as read_mock:
+            tail.check()
+            tail.check()
+            for _ in xrange(3):
+                entries, to_byte = tail.wait(start, 0)
+                self.assertEqual(len(entries), 4)
+                self.assertEqual(to_byte, tail.size)
+        self.assertEqual(read_mock.call_count, 1)
+
+    def test_log_reader_keeps_index_in_memory(self):
+        log_entries = self._make_log_entries(10, ['INFO'])
+        self._create_logfile_for_node(settings.LOGS[0], log_entries[:5])
+        # index dir can't be created
+        index_dir = os.path.join(self.local_log_file, 'index')
+        reader = get_reader(self.local_log_file, settings.LOGS[0], index_dir)
+        reader.read()
+        self.assertIs(
+            reader,
+            get_reader(self.local_log_file, settings.LOGS[0], index_dir))
+        indexed_size = os.stat(self.local_log_file).st_size
+        self.assertEqual(reader.index.indexed_size, indexed_size)
+
+        with open(self.local_log_file, 'a') as f:
+            for log_entry in log_entries[5:]:
+                f.write(':'.join(log_entry) + '\n')
+        with patch.object(reader.index, 'reset') as reset_mock:
+            entries, _ = reader.read()
+        self.assertFalse(reset_mock.called)
+        self.assertEqual([e[2] for e in entries],
+                         [e[2] for e in reversed(log_entries)])
+
+    def test_big_log_file_indexed_in_background(self):
+        settings.LOGS[0]['multiline'] = True
+        log_entries = self._make_log_entries(50, ['INFO', 'DEBUG'])
+        for log_entry in log_entries[::7]:
+            log_entry[2] += '\nmulti\nline'
+        self._create_logfile_for_node(settings.LOGS[0], log_entries)
+
+        reader = LogReader(self.local_log_file, settings.LOGS[0])
+        # entries are read without index until indexing is released
+        release = threading.Event()
+        update_index = reader.update_index_in_background
+
+        def delayed_update_index():
+            release.wait()
+            update_index()
+
+        with patch.object(reader, 'update_index_in_background',
+                          delayed_update_index):
+            with patch('nailgun.utils.logs.SYNC_INDEX_LIMIT', 0):
+                with patch('nailgun.utils.logs.BLOCK_SIZE', 100):
+                    tail_entries, _ = reader.read()
+                    truncated, has_more = reader.read(
+                        truncate=True, max_entries=5)
+        self.assertEqual(reader.index.indexed_size, 0)
+        indexing = reader.indexing
+        release.set()
+        indexing.join()
+        self.assertEqual(
+            reader.index.indexed_size, os.stat(self.local_log_file).st_size)
+        self.assertEqual(truncated, tail_entries[:5])
+        self.assertTrue(has_more)
+
+        indexed_entries, _ = reader.read()
+        self.assertEqual(tail_entries, indexed_entries)
+        self.assertEqual([e[2] for e in indexed_entries],
+                         [e[2] for e in reversed(log_entries)])
+
+    def test_log_tail_skips_incomplete_line(self):
+        log_entries = self._make_log_entries(3, ['INFO'])
+        self._create_logfile_for_node(settings.LOGS[0], log_entries[:1])
+        tail = LogTail(self.local_log_file, settings.LOGS[0])
+        tail.check()
+        start = tail.size
+
+        line = ':'.join(log_entries[1]) + '\n'
+        with open(self.local_log_file, 'a') as f:
+            f.write(line[:-5])
+        tail.check()
+        self.assertEqual(tail.size, start)
+
+        with open(self.local_log_file, 'a') as f:
+            f.write(line[-5:] + ':'.join(log_entries[2]))
+        tail.check()
+        self.assertEqual(tail.size, start + len(line))
+        entries, to_byte = tail.wait(start, 0)
+        self.assertEqual([e[2] for e in entries], [log_entries[1][2]])
 
     def _create_logfile_for_node(self, log_config, log_entries, node=None):
         if log_config['remote']:
@@ -110,3 +110,21 @@ class TestFakeKeystoneAuthMiddleware(AuthMiddlewareTestBase, BaseUnitTest):
 
 class TestKeystoneAuthMiddleware(AuthMiddlewareTestBase, BaseUnitTest):
     MiddlewareClass = NailgunKeystoneAuthMiddleware
+
+    @mock.patch('keystoneclient.middleware.auth_token.AuthProtocol.'
+                'verify_uuid_token')
+    def test_hit_rate_of_tokens_cache(self, mock_verify_token):
+        token_info = {'access': {'token': {
+            'id': 'token', 'expires': '2999-01-01T00:00:00Z'}}}
+        mock_verify_token.return_value = token_info
+        middleware = self.get_middleware()
+        middleware._init_cache({})
+
+        for _ in xrange(3):
+            self.assertEqual(
+                middleware._validate_user_token('token', {}), token_info)
+
+        self.assertEqual(mock_verify_token.call_count, 1)
+        self.assertEqual(
+            middleware.tokens_cache_stats.to_dict(),
+            {'hits': 2, 'misses': 1, 'hit_rate': 2.0 / 3})
@@ -19,14 +19,17 @@ from mock import patch
 import string
 
 from nailgun.errors import errors
+from nailgun.logger import logger
 from nailgun.openstack.common import jsonutils
 from nailgun.test.base import BaseIntegrationTest
 from nailgun.test.base import fake_tasks
 from nailgun.test.base import reverse
 from nailgun.volumes.manager import Disk
 from nailgun.volumes.manager import DisksFormatConvertor
+from nailgun.volumes.manager import layouts_cache
 from nailgun.volumes.manager import only_disks
 from nailgun.volumes.manager import only_vg
+from nailgun.volumes.manager import VolumeManager
 
 
 class TestNodeDisksHandlers(BaseIntegrationTest):
@@ -792,6 +795,62 @@ class TestVolumeManager(BaseIntegrationTest):
 
         self.update_ram_and_assert_swap_size(node, 81920, 4096)
 
+    def test_volumes_info_is_generated_once_for_same_nodes(self):
+        computes = [self.create_node('compute') for _ in range(3)]
+        controller = self.create_node('controller')
+        layouts_cache.clear()
+
+        gen_volumes_info = VolumeManager._gen_volumes_info
+        with patch.object(VolumeManager, '_gen_volumes_info',
+                          autospec=True,
+                          side_effect=gen_volumes_info) as gen_mock:
+            volumes = [node.volume_manager.gen_volumes_info()
+                       for node in computes + [controller]]
+        self.assertEqual(gen_mock.call_count, 2)
+
+        self.assertEqual(volumes[0], volumes[1])
+        self.assertEqual(volumes[0], volumes[2])
+        self.assertNotEqual(volumes[0], volumes[3])
+        # every node gets its own copy of layout
+        volumes[1][0]['volumes'][0]['size'] += 1
+        self.assertNotEqual(volumes[1], volumes[2])
+
+        cached = computes[2].volume_manager
+        cached.gen_volumes_info()
+        generated = computes[2].volume_manager
+        generated._gen_volumes_info()
+        self.assertEqual(cached.volumes, generated.volumes)
+        self.assertEqual(
+            [disk.free_space for disk in cached.disks],
+            [disk.free_space for disk in generated.disks])
+
+    @patch('nailgun.volumes.manager.settings.VOLUME_MANAGER_TRACING', True)
+    def test_volume_manager_tracing(self):
+        node = self.create_node('compute')
+        layouts_cache.clear()
+        with patch('nailgun.volumes.manager.logger') as logger_mock:
+            volume_manager = node.volume_manager
+            volume_manager.gen_volumes_info()
+
+        trace = volume_manager.tracer.to_dict()
+        self.assertEqual(trace['node'], node.name)
+        self.assertEqual(trace['calls'], {'init': 1, 'gen_volumes_info': 1})
+        self.assertEqual(
+            sorted(trace['timings']), ['gen_volumes_info', 'init'])
+        self.assertGreater(trace['generators']['calc_lvm_meta_size'], 0)
+        self.assertEqual(logger_mock.info.call_count, 2)
+
+    def test_volume_manager_skips_formatting_without_debug(self):
+        node = self.create_node('compute')
+        layouts_cache.clear()
+        with patch.object(logger, 'isEnabledFor', return_value=False):
+            with patch.object(Disk, '__repr__') as repr_mock:
+                volume_manager = node.volume_manager
+                volume_manager.gen_volumes_info()
+
+        self.assertIsNone(volume_manager.tracer)
+        self.assertFalse(repr_mock.called)
+
 
 class TestDisks(BaseIntegrationTest):
 
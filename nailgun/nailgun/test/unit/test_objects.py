@@ -127,6 +127,23 @@ class TestObjects(BaseIntegrationTest):
             elif r.operating_system == "CentOS":
                 self.assertNotEqual(r.name, "A")
 
+    def test_to_json_stream(self):
+        for i in xrange(5):
+            self.env.create_release(name='release-{0}'.format(i))
+
+        for yield_per in (2, 5, 100):
+            chunks = list(objects.ReleaseCollection.to_json_stream(
+                fields=('id', 'name'), yield_per=yield_per))
+            self.assertEqual(
+                jsonutils.loads(''.join(chunks)),
+                objects.ReleaseCollection.to_list(fields=('id', 'name'))
+            )
+        self.assertEqual(len(chunks), 1)
+
+        chunks = objects.ReleaseCollection.to_json_stream(
+            objects.ReleaseCollection.filter_by(None, name='unknown'))
+        self.assertEqual(jsonutils.loads(''.join(chunks)), [])
+
 
 class TestNodeObject(BaseIntegrationTest):
 
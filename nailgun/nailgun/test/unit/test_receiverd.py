@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from mock import Mock
+
+from nailgun.rpc.coalescer import ProgressCoalescer
+from nailgun.rpc.receiver import NailgunReceiver
+from nailgun.rpc.receiverd import PooledRPCConsumer
+from nailgun.test.base import BaseTestCase
+from nailgun.test.base import BaseUnitTest
+
+
+class FakeReceiver(object):
+
+    lock = threading.Lock()
+    calls = []
+
+    @classmethod
+    def deploy_resp(cls, **kwargs):
+        with cls.lock:
+            cls.calls.append((kwargs['task_uuid'], kwargs['progress']))
+
+
+class TestPooledRPCConsumer(BaseTestCase):
+
+    def setUp(self):
+        super(TestPooledRPCConsumer, self).setUp()
+        FakeReceiver.calls = []
+        self.consumer = PooledRPCConsumer(Mock(), FakeReceiver, 4)
+
+    def test_messages_order_is_kept_per_task(self):
+        msgs = []
+        self.consumer.start_workers()
+        for progress in xrange(20):
+            for task_uuid in ('uuid-1', 'uuid-2', 'uuid-3'):
+                msg = Mock()
+                msgs.append(msg)
+                self.consumer.consume_msg({
+                    'method': 'deploy_resp',
+                    'args': {'task_uuid': task_uuid, 'progress': progress}
+                }, msg)
+        self.consumer.stop_workers()
+
+        for task_uuid in ('uuid-1', 'uuid-2', 'uuid-3'):
+            self.assertEqual(
+                [p for uuid, p in FakeReceiver.calls if uuid == task_uuid],
+                range(20)
+            )
+        for msg in msgs:
+            msg.ack.assert_called_once_with()
+
+        self.assertEqual(self.consumer.queue_depth(), 0)
+        stats = self.consumer.stats.to_dict()
+        self.assertEqual(stats['deploy_resp']['count'], 60)
+
+    def test_messages_are_acked_after_processing(self):
+        msg = Mock()
+        self.consumer.consume_msg({
+            'method': 'deploy_resp',
+            'args': {'task_uuid': 'uuid-1', 'progress': 0}
+        }, msg)
+        self.assertEqual(self.consumer.queue_depth(), 1)
+        self.consumer.on_iteration()
+        self.assertFalse(msg.ack.called)
+
+        self.consumer.start_workers()
+        self.consumer.stop_workers()
+        msg.ack.assert_called_once_with()
+
+    def test_worker_survives_failed_message(self):
+        msgs = [Mock(), Mock()]
+        self.consumer.start_workers()
+        self.consumer.consume_msg({
+            'method': 'unknown_resp',
+            'args': {'task_uuid': 'uuid-1'}
+        }, msgs[0])
+        self.consumer.consume_msg({
+            'method': 'deploy_resp',
+            'args': {'task_uuid': 'uuid-1', 'progress': 10}
+        }, msgs[1])
+        self.consumer.stop_workers()
+        self.consumer.on_iteration()
+
+        self.assertEqual(FakeReceiver.calls, [('uuid-1', 10)])
+        for msg in msgs:
+            msg.ack.assert_called_once_with()
+
+
+class TestProgressCoalescer(BaseUnitTest):
+
+    def progress_msg(self, task_uuid, nodes, progress=None):
+        return {
+            'method': 'deploy_resp',
+            'args': {
+                'task_uuid': task_uuid,
+                'progress': progress,
+                'nodes': nodes
+            }
+        }
+
+    def test_progress_updates_are_merged(self):
+        coalescer = ProgressCoalescer(NailgunReceiver, 0)
+        self.assertEqual(coalescer.push(self.progress_msg(
+            'uuid-1', [{'uid': 1, 'progress': 10}]), 'msg-1'), [])
+        self.assertEqual(coalescer.push(self.progress_msg(
+            'uuid-1', [{'uid': 1, 'progress': 20},
+                       {'uid': 2, 'progress': 5, 'status': 'deploying'}],
+            progress=7), 'msg-2'), [])
+        self.assertEqual(coalescer.push(self.progress_msg(
+            'uuid-2', [{'uid': 3, 'progress': 30}]), 'msg-3'), [])
+
+        ready = coalescer.pop_expired()
+        self.assertEqual(len(ready), 2)
+        body, msgs = ready[0]
+        self.assertEqual(msgs, ['msg-1', 'msg-2'])
+        self.assertEqual(body['args']['progress'], 7)
+        self.assertEqual(body['args']['nodes'], [
+            {'uid': 1, 'progress': 20},
+            {'uid': 2, 'progress': 5, 'status': 'deploying'}])
+        self.assertEqual(ready[1][1], ['msg-3'])
+        self.assertEqual(coalescer.pop_all(), [])
+
+    def test_status_update_releases_pending_progress(self):
+        coalescer = ProgressCoalescer(NailgunReceiver, 60)
+        coalescer.push(self.progress_msg(
+            'uuid-1', [{'uid': 1, 'progress': 10}]), 'msg-1')
+        coalescer.push(self.progress_msg(
+            'uuid-2', [{'uid': 2, 'progress': 10}]), 'msg-2')
+        self.assertEqual(coalescer.pop_expired(), [])
+
+        error_msg = {
+            'method': 'deploy_resp',
+            'args': {
+                'task_uuid': 'uuid-1',
+                'nodes': [{'uid': 1, 'status': 'error'}]
+            }
+        }
+        ready = coalescer.push(error_msg, 'msg-3')
+        self.assertEqual(
+            [msgs for _, msgs in ready], [['msg-1'], ['msg-3']])
+        self.assertEqual(ready[1][0], error_msg)
+        self.assertEqual(len(coalescer.pop_all()), 1)
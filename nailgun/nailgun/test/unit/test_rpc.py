@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+import nailgun.rpc as rpc
+from nailgun.rpc import utils
+from nailgun.test.base import BaseUnitTest
+
+
+class TestRPCCast(BaseUnitTest):
+
+    @mock.patch('nailgun.rpc.settings.RPC_CAST_MAX_RETRIES', 2)
+    @mock.patch('nailgun.rpc.pools')
+    def test_cast_retries_are_limited(self, mock_pools):
+        rpc.cast('naily', {'method': 'deploy'})
+
+        producer = mock_pools.producers.__getitem__.return_value.\
+            acquire.return_value.__enter__.return_value
+        kwargs = producer.publish.call_args[1]
+        self.assertTrue(kwargs['retry'])
+        self.assertEqual(kwargs['retry_policy'], {'max_retries': 2})
+
+    def test_delete_entities(self):
+        conn = mock.Mock()
+        conn.declared_entities = set(['naily'])
+        entities = [mock.Mock(), mock.Mock()]
+
+        utils.delete_entities(conn, *entities)
+
+        for entity in entities:
+            entity.return_value.delete.assert_called_once_with()
+        self.assertEqual(conn.channel.return_value.close.call_count, 2)
+        self.assertEqual(conn.declared_entities, set())
@@ -18,6 +18,7 @@ import os
 
 from nailgun.test.base import BaseIntegrationTest
 from nailgun.utils import dict_merge
+from nailgun.utils import dict_merge_shared
 from nailgun.utils import extract_env_version
 from nailgun.utils import migration
 
@@ -43,6 +44,23 @@ class TestUtils(BaseIntegrationTest):
                                            "dict": {"stuff": "hz",
                                                     "another_stuff": "hz"}}})
 
+    def test_dict_merge_shared(self):
+        custom = {"coord": [10, 10],
+                  "dict": {"body": "solid",
+                           "dict": {"stuff": "hz"}}}
+        common = {"nodes": [{"uid": 1}, {"uid": 2}],
+                  "coord": [0, 0],
+                  "dict": {"transparency": 100,
+                           "dict": {"another_stuff": "hz"}}}
+        result = dict_merge_shared(custom, common)
+        self.assertEqual(result, dict_merge(custom, common))
+        # values which aren't merged are shared, not copied
+        self.assertIs(result["nodes"], common["nodes"])
+        self.assertIs(result["coord"], common["coord"])
+        # merged dicts are new ones, operands stay untouched
+        self.assertNotIn("transparency", custom["dict"])
+        self.assertNotIn("body", common["dict"])
+
     def test_upgrade_wizard_data(self):
         fixture_path = os.path.join(os.path.dirname(__file__), '..', '..',
                                     'fixtures', 'openstack.yaml')
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nailgun.network import vlan_ranges
+from nailgun.test.base import BaseUnitTest
+
+
+class TestVlanRanges(BaseUnitTest):
+
+    def test_compress(self):
+        self.assertEqual(
+            vlan_ranges.compress([2100, 0] + range(1000, 2001) + [1500]),
+            [0, [1000, 2000], 2100])
+        self.assertEqual(
+            vlan_ranges.compress([[1000, 1010], 1011, [1005, 1020], 7]),
+            [7, [1000, 1020]])
+        self.assertEqual(vlan_ranges.compress([]), [])
+
+    def test_expand(self):
+        self.assertEqual(
+            vlan_ranges.expand([0, [100, 103], 101, 200]),
+            [0, 100, 101, 102, 103, 200])
+        self.assertEqual(vlan_ranges.expand([3, 1, 2]), [1, 2, 3])
+
+    def test_difference(self):
+        self.assertEqual(
+            vlan_ranges.difference(
+                [0, [1000, 1010], 2100], [[1002, 1008], 1010, 2100]),
+            [0, 1000, 1001, 1009])
+        self.assertEqual(
+            vlan_ranges.difference([[100, 104]], range(100, 104)), [104])
+        self.assertEqual(
+            vlan_ranges.difference(range(100, 105), [[0, 4094]]), [])
+        self.assertEqual(
+            vlan_ranges.difference([[10, 20]], [[0, 11], [13, 30]]),
+            [12])
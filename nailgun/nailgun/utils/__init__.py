@@ -37,6 +37,24 @@ def dict_merge(a, b):
     return result
 
 
+def dict_merge_shared(a, b):
+    '''merges dict's the same way as dict_merge, but without copying:
+    only dicts present in both a and b are rebuilt, all other values
+    are shared with a and b. The result should be treated as read-only
+    below the top level, since nested values may be referenced by
+    another merged dicts.
+    '''
+    if not isinstance(b, dict):
+        return b
+    result = dict(a)
+    for k, v in b.iteritems():
+        if k in result and isinstance(result[k], dict):
+            result[k] = dict_merge_shared(result[k], v)
+        else:
+            result[k] = v
+    return result
+
+
 def traverse(cdict, generator_class):
     new_dict = {}
     if cdict:
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import atexit
+import threading
+import time
+import traceback
+
+from datetime import datetime
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import select
+
+from nailgun import consts
+from nailgun.db import db
+from nailgun.db import engine
+from nailgun.db.sqlalchemy.models import Node
+from nailgun.logger import logger
+from nailgun.settings import settings
+
+
+class HeartbeatsBuffer(object):
+    """Timestamps of agents requests which didn't change nodes.
+
+    Timestamps are kept in memory of the process and written by one
+    statement for all nodes once in KEEPALIVE['flush_interval']
+    seconds in own transaction, instead of updating row of node on
+    every request of its agent. Newer timestamp which is already in db
+    isn't overwritten. Buffer is flushed by its own thread, which is
+    started on first heartbeat, so heartbeats are written even if the
+    process doesn't get requests anymore, and on process exit.
+
+    Ids of nodes found by MACs sent by agents are remembered too, so
+    heartbeat of node which data weren't changed is registered without
+    loading the node (see register).
+    """
+
+    def __init__(self):
+        self._timestamps = {}
+        self._node_ids = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, node_id, timestamp):
+        if settings.KEEPALIVE.get('flush_interval', 0) <= 0:
+            with self._lock:
+                self._timestamps[node_id] = timestamp
+            self.flush()
+            return
+
+        with self._lock:
+            self._timestamps[node_id] = timestamp
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.KEEPALIVE.get('flush_interval', 0) or 1)
+            self.flush()
+
+    def discard(self, node_id):
+        """Forgets timestamp of node, which is written to db directly
+        """
+        with self._lock:
+            self._timestamps.pop(node_id, None)
+
+    def remember_node(self, mac, node_id):
+        """Remembers id of node found by request of its agent
+        """
+        self._node_ids[mac] = node_id
+
+    def _get_node_id(self, data):
+        if data.get('mac'):
+            return self._node_ids.get(data['mac'].lower())
+        if isinstance(data.get('id'), (int, long)):
+            return data['id']
+        return None
+
+    def register(self, data):
+        """Registers heartbeat of online node if agent data weren't
+        changed since the last request. Only mac, online and
+        agent_checksum columns of known node are selected.
+
+        :param data: dict with node data sent by agent
+        :returns: id of node or None if data should be processed
+            by the regular way
+        """
+        if not isinstance(data, dict) or 'agent_checksum' not in data or \
+                data.get('status', consts.NODE_STATUSES.discover) \
+                not in consts.NODE_STATUSES:
+            return None
+
+        node_id = self._get_node_id(data)
+        if node_id is None:
+            return None
+
+        nodes = Node.__table__
+        node = db().execute(
+            select([nodes.c.mac, nodes.c.online, nodes.c.agent_checksum])
+            .where(nodes.c.id == node_id)
+        ).first()
+        if node is None or not node.online or \
+                node.agent_checksum != data['agent_checksum'] or \
+                data.get('mac') and node.mac != data['mac'].lower():
+            return None
+
+        self.add(node_id, datetime.now())
+        return node_id
+
+    def flush(self):
+        """Writes buffered heartbeats. Failures are logged only, since
+        flush isn't related to request which could trigger it.
+        """
+        with self._lock:
+            timestamps, self._timestamps = self._timestamps, {}
+
+        if not timestamps:
+            return
+
+        # rows are updated in order of ids in separate transaction, which
+        # is committed at once, so node rows aren't kept locked until
+        # request is finished and concurrent flushes don't deadlock
+        nodes = Node.__table__
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    nodes.update().where(and_(
+                        nodes.c.id == bindparam('node_id'),
+                        nodes.c.timestamp < bindparam('heartbeat')
+                    )).values(timestamp=bindparam('heartbeat')),
+                    [{'node_id': node_id, 'heartbeat': timestamp}
+                     for node_id, timestamp in sorted(timestamps.items())]
+                )
+        except Exception:
+            # keep heartbeats for the next flush unless newer ones came
+            with self._lock:
+                for node_id, timestamp in timestamps.iteritems():
+                    self._timestamps.setdefault(node_id, timestamp)
+            logger.error(
+                u"Failed to write heartbeats of %d nodes: %s",
+                len(timestamps), traceback.format_exc())
+            return
+        logger.debug(u"Heartbeats of %d nodes were written", len(timestamps))
+
+
+heartbeats = HeartbeatsBuffer()
+atexit.register(heartbeats.flush)
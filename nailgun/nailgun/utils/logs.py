@@ -0,0 +1,676 @@
+# -*- coding: utf-8 -*-
+
+#    Copyright 2014 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Indexed reading of log files shown in UI.
+
+Log file is split into blocks of about BLOCK_SIZE bytes, every block
+starts with log entry. For every block index keeps its byte offsets,
+timestamps of its first and last entries and mask of levels of its
+entries. Index is stored in sidecar file in LOG_INDEX_DIR and is updated
+incrementally as log file grows, so only new data is parsed on every
+request and requests filtered by date or level parse only blocks which
+can contain matching entries.
+
+Blocks are parsed as a whole: regular expression is searched over
+mmap'ed block instead of matching it line by line.
+
+Followed log files are watched by single LogWatcher thread which stats
+them periodically and parses appended entries once per file, so any
+number of clients following the same file share one reader.
+"""
+
+import calendar
+import collections
+import fcntl
+from itertools import chain
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import traceback
+
+from nailgun.logger import logger
+
+
+BLOCK_SIZE = 64 * 1024
+# new data is indexed by chunks of this size to bound memory usage
+CHUNK_SIZE = 16 * 1024 * 1024
+# larger not indexed part of file is indexed in background thread,
+# requests read it from the end without index meanwhile
+SYNC_INDEX_LIMIT = 64 * 1024 * 1024
+# max number of log files which readers are kept in memory
+MAX_READERS = 64
+UNKNOWN_TS = -1.0
+# bit for levels which are not listed in log config
+OTHER_LEVEL_BIT = 1 << 31
+ALL_LEVELS_MASK = (1 << 32) - 1
+
+
+def to_timestamp(struct_time):
+    return float(calendar.timegm(struct_time))
+
+
+class LogFormat(object):
+    """Compiled log format of LOGS config entry
+    """
+
+    def __init__(self, log_config):
+        self.regexp = re.compile(log_config['regexp'], re.M)
+        skip_regexp = log_config.get('skip_regexp')
+        self.skip_regexp = re.compile(skip_regexp) if skip_regexp else None
+        self.date_format = log_config['date_format']
+        self.levels = list(log_config.get('levels') or [])
+        self.multiline = bool(log_config.get('multiline'))
+        self.signature = hashlib.md5(repr((
+            log_config['regexp'],
+            skip_regexp,
+            self.date_format,
+            self.levels
+        ))).hexdigest()
+
+    def level_bit(self, level):
+        try:
+            index = self.levels.index(level)
+        except ValueError:
+            return OTHER_LEVEL_BIT
+        return 1 << min(index, 31)
+
+    def levels_mask(self, levels):
+        mask = 0
+        for level in levels:
+            mask |= self.level_bit(level)
+        return mask
+
+    def parse_date(self, date):
+        try:
+            return time.strptime(date, self.date_format)
+        except ValueError:
+            return None
+
+    def is_skipped(self, text, start):
+        if self.skip_regexp is None:
+            return False
+        end = text.find('\n', start)
+        line = text[start:end] if end != -1 else text[start:]
+        return self.skip_regexp.match(line) is not None
+
+    def iter_matches(self, text):
+        """Yields matches of log entries in text. Regular expression
+        is searched over the whole text, match is retried within single
+        line if whitespace pattern crossed the line end.
+        """
+        pos = 0
+        length = len(text)
+        while pos < length:
+            m = self.regexp.search(text, pos)
+            if m is None:
+                return
+            line_end = text.find('\n', m.start())
+            if line_end == -1:
+                line_end = length
+            if m.start() and text[m.start() - 1] != '\n':
+                # entries are matched from the line start only, leftmost
+                # match means that line start doesn't match
+                pos = line_end + 1
+                continue
+            if m.end() > line_end:
+                m = self.regexp.match(text, m.start(), line_end)
+                if m is None:
+                    pos = line_end + 1
+                    continue
+            pos = max(m.end(), m.start() + 1)
+            yield m
+
+
+class Block(object):
+
+    RECORD = struct.Struct('<QQddI')
+
+    def __init__(self, start, end=None, first_ts=UNKNOWN_TS,
+                 last_ts=UNKNOWN_TS, levels_mask=0):
+        self.start = start
+        self.end = end if end is not None else start
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+        self.levels_mask = levels_mask
+        self.last_date = None
+
+    def add(self, log_format, m):
+        self.levels_mask |= log_format.level_bit(
+            m.group('level').upper() or 'INFO')
+        if self.first_ts == UNKNOWN_TS:
+            date = log_format.parse_date(m.group('date'))
+            if date is not None:
+                self.first_ts = to_timestamp(date)
+        self.last_date = m.group('date')
+
+    def close(self, log_format, end):
+        self.end = end
+        if self.last_date is not None:
+            date = log_format.parse_date(self.last_date)
+            if date is not None:
+                self.last_ts = to_timestamp(date)
+            self.last_date = None
+        if self.last_ts == UNKNOWN_TS:
+            self.last_ts = self.first_ts
+
+    def may_contain(self, levels_mask, after_ts, before_ts):
+        if levels_mask is not None and not self.levels_mask & levels_mask:
+            return False
+        if after_ts is not None and \
+                self.last_ts != UNKNOWN_TS and self.last_ts < after_ts:
+            return False
+        if before_ts is not None and \
+                self.first_ts != UNKNOWN_TS and self.first_ts >= before_ts:
+            return False
+        return True
+
+    def pack(self):
+        return self.RECORD.pack(self.start, self.end, self.first_ts,
+                                self.last_ts, self.levels_mask)
+
+
+class LogIndex(object):
+    """Sparse index of log file blocks
+    """
+
+    HEADER = struct.Struct('<4sIQQ32s')
+    MAGIC = 'NGLI'
+    VERSION = 1
+
+    def __init__(self, path, log_format, index_dir=None):
+        self.path = path
+        self.format = log_format
+        self.index_path = None
+        if index_dir:
+            self.index_path = os.path.join(
+                index_dir,
+                hashlib.md5(os.path.abspath(path)).hexdigest() + '.idx'
+            )
+        self.reset(None)
+
+    def reset(self, inode):
+        self.inode = inode
+        self.indexed_size = 0
+        self.blocks = []
+        self.dirty_from = 0
+
+    def load(self, f):
+        data = f.read()
+        if len(data) < self.HEADER.size:
+            return
+        magic, version, inode, indexed_size, signature = \
+            self.HEADER.unpack_from(data)
+        if (magic, version, signature) != \
+                (self.MAGIC, self.VERSION, self.format.signature):
+            return
+        self.inode = inode
+        self.indexed_size = indexed_size
+        self.blocks = [
+            Block(*Block.RECORD.unpack_from(data, offset))
+            for offset in xrange(
+                self.HEADER.size,
+                len(data) - Block.RECORD.size + 1,
+                Block.RECORD.size
+            )
+        ]
+        self.dirty_from = len(self.blocks)
+
+    def save(self, f):
+        f.seek(0)
+        f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.inode,
+                                 self.indexed_size, self.format.signature))
+        f.seek(self.HEADER.size + self.dirty_from * Block.RECORD.size)
+        f.write(''.join(b.pack() for b in self.blocks[self.dirty_from:]))
+        f.truncate()
+        self.dirty_from = len(self.blocks)
+
+    def unindexed_size(self, inode, size):
+        if inode != self.inode or size < self.indexed_size:
+            return size
+        return size - self.indexed_size
+
+    def update(self, mm, inode, size, limit=None):
+        """Loads index from sidecar file (if any), indexes data
+        appended to log file since last update and saves index back.
+        Index is rebuilt if log file was rotated or truncated.
+
+        :param limit: index isn't updated if size of not indexed part
+            of file is larger than limit
+        :returns: False if index wasn't updated because of limit
+        """
+        if self.index_path is None:
+            if limit is not None and \
+                    self.unindexed_size(inode, size) > limit:
+                return False
+            self.reindex(mm, inode, size)
+            return True
+
+        try:
+            if not os.path.isdir(os.path.dirname(self.index_path)):
+                os.makedirs(os.path.dirname(self.index_path))
+            f = os.fdopen(
+                os.open(self.index_path, os.O_RDWR | os.O_CREAT, 0o644),
+                'r+b')
+        except (IOError, OSError) as exc:
+            logger.debug("Unable to open log index %s: %s",
+                         self.index_path, exc)
+            self.index_path = None
+            return self.update(mm, inode, size, limit)
+
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                self.load(f)
+                if limit is not None and \
+                        self.unindexed_size(inode, size) > limit:
+                    return False
+                if self.reindex(mm, inode, size):
+                    self.save(f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return True
+
+    def reindex(self, mm, inode, size):
+        if inode != self.inode or size < self.indexed_size:
+            self.reset(inode)
+
+        end = mm.rfind('\n', self.indexed_size, size) + 1
+        if end <= self.indexed_size:
+            return self.dirty_from < len(self.blocks)
+
+        if self.blocks:
+            # last block is replaced by its copy, since blocks could be
+            # used by readers while index is updated
+            last = self.blocks.pop()
+            block = Block(last.start, last.end, last.first_ts,
+                          last.last_ts, last.levels_mask)
+        else:
+            block = Block(0)
+        self.dirty_from = min(self.dirty_from, len(self.blocks))
+
+        pos = self.indexed_size
+        while pos < end:
+            chunk_end = end
+            if pos + CHUNK_SIZE < end:
+                chunk_end = mm.find('\n', pos + CHUNK_SIZE, end) + 1 or end
+            chunk = mm[pos:chunk_end]
+            for m in self.format.iter_matches(chunk):
+                start = pos + m.start()
+                if start - block.start >= BLOCK_SIZE:
+                    block.close(self.format, start)
+                    self.blocks.append(block)
+                    block = Block(start)
+                if not self.format.is_skipped(chunk, m.start()):
+                    block.add(self.format, m)
+            pos = chunk_end
+
+        block.close(self.format, end)
+        self.blocks.append(block)
+        self.indexed_size = end
+        return True
+
+
+class LogReader(object):
+    """Reads entries of log file newest first using LogIndex.
+
+    Readers are shared by requests of the process (see get_reader), so
+    index is kept in memory between requests if it can't be saved in
+    index dir. Large not indexed part of file (e.g. on the first read of
+    big file) is indexed in background thread, and is read from the end
+    without index meanwhile.
+    """
+
+    def __init__(self, path, log_config, index_dir=None):
+        self.path = path
+        self.format = LogFormat(log_config)
+        self.index = LogIndex(path, self.format, index_dir)
+        self.lock = threading.Lock()
+        self.indexing = None
+
+    def parse_block(self, text, offset):
+        """Parses block of log file.
+
+        :returns: list of [offset, date, level, text lines] in file order
+        """
+        entries = []
+        prev_end = 0
+        for m in self.format.iter_matches(text):
+            self._add_continuation(entries, text[prev_end:m.start()])
+            prev_end = m.end()
+            if self.format.is_skipped(text, m.start()):
+                continue
+            entries.append([
+                offset + m.start(),
+                m.group('date'),
+                m.group('level').upper() or 'INFO',
+                [m.group('text')]
+            ])
+        self._add_continuation(entries, text[prev_end:])
+        return entries
+
+    def _add_continuation(self, entries, text):
+        lines = [
+            line for line in text.split('\n')
+            if line and not self.format.is_skipped(line, 0)
+        ]
+        if not lines:
+            return
+        if self.format.multiline and entries:
+            entries[-1][3].extend(lines)
+        else:
+            logger.debug("Unable to parse %d log lines from %s",
+                         len(lines), self.path)
+
+    def read(self, size=None, to_byte=0, truncate=False, max_entries=None,
+             levels=None, date_after=None, date_before=None):
+        """Reads log entries newest first.
+
+        :param size: read log file up to this size
+        :param to_byte: read entries which start at or after this offset
+            (ignored if truncate is set)
+        :param truncate: read not more than max_entries entries
+        :param levels: list of allowed levels, all levels if None
+        :param date_after: struct_time, read entries not older than it
+        :param date_before: struct_time, read entries older than it
+        :returns: tuple of entries list and has_more flag
+        """
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = min(size or stat.st_size, stat.st_size)
+            if not size:
+                return [], False
+            # whole file is indexed even if it's read up to smaller size,
+            # otherwise index would be rebuilt as for truncated file
+            mm = mmap.mmap(f.fileno(), stat.st_size,
+                           access=mmap.ACCESS_READ)
+            try:
+                blocks, indexed_size = self.update_index(
+                    mm, stat.st_ino, stat.st_size)
+                return self._read(mm, size, blocks, indexed_size, to_byte,
+                                  truncate, max_entries, levels,
+                                  date_after, date_before)
+            finally:
+                mm.close()
+
+    def update_index(self, mm, inode, size):
+        """Updates index unless it's being updated in background.
+
+        :returns: tuple of indexed blocks and indexed size
+        """
+        with self.lock:
+            if self.indexing is None and not self.index.update(
+                    mm, inode, size, SYNC_INDEX_LIMIT):
+                self.indexing = threading.Thread(
+                    target=self.update_index_in_background)
+                self.indexing.daemon = True
+                self.indexing.start()
+            if self.indexing is not None:
+                # index is being changed by thread
+                return [], 0
+            return list(self.index.blocks), self.index.indexed_size
+
+    def update_index_in_background(self):
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size:
+                    mm = mmap.mmap(f.fileno(), stat.st_size,
+                                   access=mmap.ACCESS_READ)
+                    try:
+                        self.index.update(mm, stat.st_ino, stat.st_size)
+                    finally:
+                        mm.close()
+        except Exception:
+            logger.error("Failed to index log file %s: %s",
+                         self.path, traceback.format_exc())
+        finally:
+            with self.lock:
+                self.indexing = None
+
+    def iter_tail_blocks(self, mm, start, end):
+        """Splits not indexed part of file between start and end offsets
+        into blocks starting with log entries. Blocks are yielded from
+        the end, so reading of last entries doesn't parse the whole part.
+        """
+        block_end = end
+        while block_end > start:
+            block_start = start
+            search_end = block_end
+            while search_end > start:
+                pos = max(start, search_end - BLOCK_SIZE)
+                if pos > start:
+                    pos = mm.rfind('\n', start, pos) + 1 or start
+                m = next(self.format.iter_matches(mm[pos:search_end]), None)
+                if m is not None:
+                    block_start = pos + m.start()
+                    break
+                search_end = pos
+            yield Block(block_start, block_end, levels_mask=ALL_LEVELS_MASK)
+            block_end = block_start
+
+    def _read(self, mm, size, blocks, indexed_size, to_byte, truncate,
+              max_entries, levels, date_after, date_before):
+        blocks = chain(
+            self.iter_tail_blocks(mm, indexed_size, size),
+            (block for block in reversed(blocks) if block.start < size)
+        )
+
+        levels_mask = None
+        if levels is not None:
+            levels_mask = self.format.levels_mask(levels)
+        after_ts = to_timestamp(date_after) if date_after else None
+        before_ts = to_timestamp(date_before) if date_before else None
+
+        entries = []
+        for block in blocks:
+            if not truncate and block.end <= to_byte:
+                return entries, block.end > 0
+            if after_ts is not None and \
+                    block.last_ts != UNKNOWN_TS and block.last_ts < after_ts:
+                # blocks are ordered by time, older ones can't match
+                break
+            if not block.may_contain(levels_mask, after_ts, before_ts):
+                continue
+
+            parsed = self.parse_block(
+                mm[block.start:min(block.end, size)], block.start)
+            for offset, date, level, lines in reversed(parsed):
+                if not truncate and offset < to_byte:
+                    return entries, True
+                if levels is not None and level not in levels:
+                    continue
+                entry_date = self.format.parse_date(date)
+                if entry_date is None:
+                    logger.debug("Unable to parse date from log entry."
+                                 " Date format: %r, date part of entry: %r",
+                                 self.format.date_format, date)
+                    continue
+                if date_after and entry_date < date_after or \
+                        date_before and entry_date >= date_before:
+                    continue
+                entries.append([entry_date, level, '\n'.join(lines)])
+                if truncate and len(entries) >= max_entries:
+                    return entries, True
+        return entries, False
+
+
+_readers = collections.OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def get_reader(path, log_config, index_dir=None):
+    """Returns reader of log file shared by requests of the process.
+    Readers of MAX_READERS recently read files are kept.
+    """
+    key = (path, log_config['id'], index_dir)
+    with _readers_lock:
+        reader = _readers.pop(key, None)
+        if reader is None:
+            reader = LogReader(path, log_config, index_dir)
+        _readers[key] = reader
+        while len(_readers) > MAX_READERS:
+            _readers.popitem(last=False)
+    return reader
+
+
+class LogTail(object):
+    """Shared incremental reader of growing log file.
+
+    Keeps last batches of appended entries, every batch is a tuple
+    of start and end offsets and entries (newest first) between them.
+    """
+
+    def __init__(self, path, log_config, index_dir=None, max_batches=100):
+        self.path = path
+        self.reader = get_reader(path, log_config, index_dir)
+        self.condition = threading.Condition()
+        self.batches = collections.deque(maxlen=max_batches)
+        self.inode = None
+        self.size = None
+        self.waiters = 0
+        self.last_access = time.time()
+
+    def _lines_end(self, start, size):
+        """Returns offset just after the last complete line written
+        between start and size offsets or start if there is no such line
+        """
+        if size <= start:
+            return start
+        try:
+            with open(self.path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+                try:
+                    return mm.rfind('\n', start, size) + 1 or start
+                finally:
+                    mm.close()
+        except (EnvironmentError, ValueError):
+            # log file was truncated meanwhile
+            return start
+
+    def check(self):
+        """Reads entries appended since previous check. Incomplete
+        last line is left until it's written up to the end.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+
+        with self.condition:
+            if self.size is None or stat.st_ino != self.inode or \
+                    stat.st_size < self.size:
+                # first check or log file was rotated
+                self.inode = stat.st_ino
+                self.size = self._lines_end(0, stat.st_size)
+                self.batches.clear()
+                self.condition.notify_all()
+                return
+            if stat.st_size == self.size:
+                return
+            start = self.size
+
+        end = self._lines_end(start, stat.st_size)
+        if end == start:
+            return
+        entries, _ = self.reader.read(size=end, to_byte=start)
+
+        with self.condition:
+            self.batches.append((start, end, entries))
+            self.size = end
+            self.condition.notify_all()
+
+    def entries_since(self, to_byte):
+        """Returns tuple of entries (newest first) appended after
+        to_byte and new end offset or None if they aren't buffered.
+        """
+        with self.condition:
+            if to_byte == self.size:
+                return [], self.size
+            entries = []
+            for start, end, batch in reversed(self.batches):
+                entries.extend(batch)
+                if start == to_byte:
+                    return entries, self.size
+            return None
+
+    def wait(self, to_byte, timeout):
+        """Waits up to timeout seconds for entries appended after to_byte
+        """
+        deadline = time.time() + timeout
+        with self.condition:
+            self.waiters += 1
+            try:
+                while self.size == to_byte:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            finally:
+                self.waiters -= 1
+                self.last_access = time.time()
+            return self.entries_since(to_byte)
+
+
+class LogWatcher(object):
+    """Watches followed log files by stat'ing them every interval
+    """
+
+    def __init__(self, interval=1, idle_timeout=300):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.tails = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def get_tail(self, path, log_config, index_dir=None):
+        key = (path, log_config['id'])
+        with self.lock:
+            tail = self.tails.get(key)
+            if tail is None:
+                tail = LogTail(path, log_config, index_dir)
+                tail.check()
+                self.tails[key] = tail
+            tail.last_access = time.time()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+        return tail
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                now = time.time()
+                for key, tail in self.tails.items():
+                    if not tail.waiters and \
+                            now - tail.last_access > self.idle_timeout:
+                        del self.tails[key]
+                if not self.tails:
+                    # thread is started again by next get_tail call
+                    self.thread = None
+                    return
+                tails = self.tails.values()
+            for tail in tails:
+                try:
+                    tail.check()
+                except Exception:
+                    logger.exception("Failed to read log file %s", tail.path)
@@ -19,11 +19,20 @@ Classes for working with disks and volumes.
 All sizes in megabytes.
 '''
 
+from collections import defaultdict
+from collections import OrderedDict
 from copy import deepcopy
 from functools import partial
+from functools import wraps
+import hashlib
+import marshal
+import threading
+import time
+
 from nailgun.errors import errors
 from nailgun.logger import logger
 from nailgun.openstack.common import jsonutils
+from nailgun.settings import settings
 
 
 def is_service(space):
@@ -568,12 +577,101 @@ class Disk(object):
         return jsonutils.dumps(self.render(), indent=4)
 
 
+class LayoutsCache(object):
+    """LRU cache of generated volumes layouts keyed by fingerprint
+    of node (see VolumeManager.get_fingerprint).
+
+    Layouts are kept marshalled, so every node gets its own copy.
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            data = self.cache.pop(key, None)
+            if data is None:
+                return None
+            self.cache[key] = data
+        return marshal.loads(data)
+
+    def put(self, key, volumes):
+        data = marshal.dumps(volumes)
+        with self.lock:
+            self.cache.pop(key, None)
+            self.cache[key] = data
+            while len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+layouts_cache = LayoutsCache()
+
+
+class VolumeManagerTracer(object):
+    """Timings of VolumeManager operations and counters of generators
+    calls for one node. Collected only if VOLUME_MANAGER_TRACING
+    setting is enabled, trace is logged after every operation.
+    """
+
+    def __init__(self, node_name):
+        self.node_name = node_name
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.generators = defaultdict(int)
+
+    def register(self, operation, started_at):
+        self.timings[operation] += time.time() - started_at
+        self.calls[operation] += 1
+        logger.info(u"VolumeManager trace: %s", self)
+
+    def register_generator(self, generator):
+        self.generators[generator] += 1
+
+    def to_dict(self):
+        return {
+            'node': self.node_name,
+            'timings': dict(self.timings),
+            'calls': dict(self.calls),
+            'generators': dict(self.generators)
+        }
+
+    def __str__(self):
+        return jsonutils.dumps(self.to_dict())
+
+
+def traced(operation):
+    """Registers timing of VolumeManager method in its tracer
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.tracer is None:
+                return func(self, *args, **kwargs)
+            started_at = time.time()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self.tracer.register(operation, started_at)
+        return wrapper
+    return decorator
+
+
 class VolumeManager(object):
     def __init__(self, node):
         """Disks and volumes will be set according to node attributes.
         VolumeManager should not make any updates in database.
         """
+        started_at = time.time()
         self.node_name = node.name
+        self.tracer = None
+        if settings.VOLUME_MANAGER_TRACING:
+            self.tracer = VolumeManagerTracer(self.node_name)
 
         # Make sure that we don't change volumes directly from manager
         self.volumes = deepcopy(node.attributes.volumes) or []
@@ -586,8 +684,9 @@ class VolumeManager(object):
         if node.cluster:
             self.allowed_volumes = get_node_spaces(node)
 
+        self.disks_meta = sorted(node.meta['disks'], key=lambda i: i['name'])
         self.disks = []
-        for d in sorted(node.meta['disks'], key=lambda i: i['name']):
+        for d in self.disks_meta:
             disks_count = len(node.meta["disks"])
             boot_is_raid = True if disks_count > 1 else False
 
@@ -611,15 +710,18 @@ class VolumeManager(object):
 
             self.disks.append(disk)
 
-        self.__logger('Initialized with node: %s' % node.full_name)
-        self.__logger('Initialized with volumes: %s' % self.volumes)
-        self.__logger('Initialized with disks: %s' % self.disks)
+        self.__logger('Initialized with node: %s', node.full_name)
+        self.__logger('Initialized with volumes: %s', self.volumes)
+        self.__logger('Initialized with disks: %s', self.disks)
+        if self.tracer is not None:
+            self.tracer.register('init', started_at)
 
+    @traced('set_volume_size')
     def set_volume_size(self, disk_id, volume_name, size):
         """Set size of volume
         """
-        self.__logger('Update volume size for disk=%s volume_name=%s size=%s' %
-                      (disk_id, volume_name, size))
+        self.__logger('Update volume size for disk=%s volume_name=%s size=%s',
+                      disk_id, volume_name, size)
 
         disk = filter(lambda disk: disk.id == disk_id, self.disks)[0]
 
@@ -645,7 +747,7 @@ class VolumeManager(object):
 
                 self.volumes[idx] = self.expand_generators(vg_template)
 
-        self.__logger('Updated volume size %s' % self.volumes)
+        self.__logger('Updated volume size %s', self.volumes)
         return self.volumes
 
     def get_space_type(self, volume_name):
@@ -720,8 +822,10 @@ class VolumeManager(object):
                 u'Cannot find generator %s' % generator)
 
         result = generators[generator](*args)
-        self.__logger('Generator %s with args %s returned result: %s' %
-                      (generator, args, result))
+        if self.tracer is not None:
+            self.tracer.register_generator(generator)
+        self.__logger('Generator %s with args %s returned result: %s',
+                      generator, args, result)
         return result
 
     def _calc_root_size(self):
@@ -772,28 +876,27 @@ class VolumeManager(object):
 
     def _allocate_all_free_space_for_volume(self, volume_info):
         """Allocate all existing space on all disks."""
-        self.__logger('Allocate all free space for volume %s ' % (volume_info))
+        self.__logger('Allocate all free space for volume %s ', volume_info)
 
         for disk in self.disks:
             if disk.free_space > 0:
                 self.__logger('Allocating all available space for volume: '
-                              'disk: %s volume: %s' %
-                              (disk.id, volume_info))
+                              'disk: %s volume: %s', disk.id, volume_info)
                 self._get_allocator(disk, volume_info)(volume_info)
             else:
                 self.__logger('Not enough free space for volume '
-                              'allocation: disk: %s volume: %s' %
-                              (disk.id, volume_info))
+                              'allocation: disk: %s volume: %s',
+                              disk.id, volume_info)
                 self._get_allocator(disk, volume_info)(volume_info, 0)
 
     def _allocate_size_for_volume(self, volume_info, size):
         """Allocate volumes with particaular size."""
-        self.__logger('Allocate volume %s with size %s ' % (volume_info, size))
+        self.__logger('Allocate volume %s with size %s ', volume_info, size)
 
         not_allocated_size = size
         for disk in self.disks:
-            self.__logger('Creating volume: disk: %s, vg: %s' %
-                          (disk.id, volume_info))
+            self.__logger('Creating volume: disk: %s, vg: %s',
+                          disk.id, volume_info)
 
             if disk.free_space >= not_allocated_size:
                 # if we can allocate all required size
@@ -812,7 +915,7 @@ class VolumeManager(object):
 
     def _allocate_full_disk(self, volume_info):
         """Allocate full disks for a volume."""
-        self.__logger('Allocate full disk for volume %s ' % (volume_info))
+        self.__logger('Allocate full disk for volume %s ', volume_info)
 
         for disk in self.disks:
             existing_volumes = [v for v in disk.volumes if not is_service(v)
@@ -832,7 +935,36 @@ class VolumeManager(object):
         elif volume_info['type'] == 'raid':
             return partial(disk.create_partition, ptype='raid')
 
+    def get_fingerprint(self):
+        """Digest of everything generated layout depends on: disks, RAM
+        and spaces allowed for node, which are defined by node roles,
+        volumes metadata of release and cluster attributes
+        """
+        return hashlib.md5(jsonutils.dumps(
+            [self.disks_meta, self.ram, self.allowed_volumes],
+            sort_keys=True)).digest()
+
+    @traced('gen_volumes_info')
     def gen_volumes_info(self):
+        """Generate volumes layout or take it from layouts cache,
+        if layout for the same fingerprint was already generated
+        """
+        fingerprint = self.get_fingerprint()
+        volumes = layouts_cache.get(fingerprint)
+        if volumes is None:
+            volumes = self._gen_volumes_info()
+            layouts_cache.put(fingerprint, volumes)
+            return volumes
+
+        self.__logger('Took volumes info from cache: %s', volumes)
+        self.volumes = volumes
+        disks = dict((d['id'], d) for d in only_disks(volumes))
+        for disk in self.disks:
+            disk.free_space = disk.size
+            disk.set_volumes(disks[disk.id]['volumes'])
+        return self.volumes
+
+    def _gen_volumes_info(self):
         self.__logger('Generating volumes info for node')
         self.__logger('Purging volumes info for all node disks')
 
@@ -840,7 +972,7 @@ class VolumeManager(object):
         self.volumes = [d.render() for d in self.disks]
 
         if not self.allowed_volumes:
-            self.__logger('Role is None return volumes: %s' % self.volumes)
+            self.__logger('Role is None return volumes: %s', self.volumes)
             return self.volumes
 
         self.volumes.extend(only_vg(self.allowed_volumes))
@@ -874,7 +1006,7 @@ class VolumeManager(object):
 
         self.volumes = self.expand_generators(self.volumes)
 
-        self.__logger('Generated volumes: %s' % self.volumes)
+        self.__logger('Generated volumes: %s', self.volumes)
         return self.volumes
 
     @property
@@ -908,9 +1040,8 @@ class VolumeManager(object):
             if generator is not None:
                 genval = self.call_generator(
                     generator, *generator_args)
-                self.__logger(
-                    'Generator {0} with args {1} expanded to: {2}'.format(
-                        generator, generator_args, genval))
+                self.__logger('Generator %s with args %s expanded to: %s',
+                              generator, generator_args, genval)
                 return genval
             else:
                 return dict((k, self.expand_generators(v))
@@ -929,10 +1060,9 @@ class VolumeManager(object):
         minimal_installation_size = self.__calc_minimal_installation_size()
 
         self.__logger(
-            'Checking disks space: disks space {0}, minimal size {1}'.format(
-                disks_space,
-                minimal_installation_size
-            )
+            'Checking disks space: disks space %s, minimal size %s',
+            disks_space,
+            minimal_installation_size
         )
 
         if disks_space < minimal_installation_size:
@@ -966,5 +1096,6 @@ class VolumeManager(object):
 
         return min_installation_size
 
-    def __logger(self, message):
-        logger.debug('VolumeManager %s: %s', id(self), message)
+    def __logger(self, message, *args):
+        # arguments are formatted by logger only if debug level is enabled
+        logger.debug('VolumeManager %s: ' + message, id(self), *args)